@@ -0,0 +1,65 @@
+"""Add daily stats rollup tables
+
+Revision ID: 3f6c2a9d8b14
+Revises: 1c93d15527cb
+Create Date: 2026-10-17 09:10:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3f6c2a9d8b14'
+down_revision: Union[str, Sequence[str], None] = '1c93d15527cb'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('daily_stats_rollup',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('stat_date', sa.Date(), nullable=False),
+    sa.Column('doctor_id', sa.Integer(), nullable=False),
+    sa.Column('status', sa.String(), nullable=False),
+    sa.Column('appointments_count', sa.Integer(), nullable=False),
+    sa.Column('cost_count', sa.Integer(), nullable=False),
+    sa.Column('cost_sum', sa.Numeric(precision=14, scale=2), nullable=False),
+    sa.ForeignKeyConstraint(['doctor_id'], ['users.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('stat_date', 'doctor_id', 'status', name='uq_daily_stats_rollup_key')
+    )
+    op.create_index(op.f('ix_daily_stats_rollup_id'), 'daily_stats_rollup', ['id'], unique=False)
+    op.create_index('ix_daily_stats_rollup_doctor_date', 'daily_stats_rollup', ['doctor_id', 'stat_date'], unique=False)
+    op.create_table('daily_patients_rollup',
+    sa.Column('stat_date', sa.Date(), nullable=False),
+    sa.Column('new_patients_count', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('stat_date')
+    )
+
+    # Заполняем сводки по существующим данным
+    op.execute("""
+        INSERT INTO daily_stats_rollup (stat_date, doctor_id, status, appointments_count, cost_count, cost_sum)
+        SELECT date(date), doctor_id, COALESCE(status, 'scheduled'), count(id), count(cost), COALESCE(sum(cost), 0)
+        FROM appointments
+        WHERE date IS NOT NULL AND doctor_id IS NOT NULL
+        GROUP BY date(date), doctor_id, COALESCE(status, 'scheduled');
+    """)
+    op.execute("""
+        INSERT INTO daily_patients_rollup (stat_date, new_patients_count)
+        SELECT date(created_at), count(id)
+        FROM patients
+        WHERE created_at IS NOT NULL
+        GROUP BY date(created_at);
+    """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('daily_patients_rollup')
+    op.drop_index('ix_daily_stats_rollup_doctor_date', table_name='daily_stats_rollup')
+    op.drop_index(op.f('ix_daily_stats_rollup_id'), table_name='daily_stats_rollup')
+    op.drop_table('daily_stats_rollup')
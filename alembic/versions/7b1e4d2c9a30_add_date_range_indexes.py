@@ -0,0 +1,63 @@
+"""Add date range indexes, rebucket rollup in clinic timezone
+
+Revision ID: 7b1e4d2c9a30
+Revises: 3f6c2a9d8b14
+Create Date: 2026-10-17 11:40:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from app.core.config import settings
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7b1e4d2c9a30'
+down_revision: Union[str, Sequence[str], None] = '3f6c2a9d8b14'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Индексы строятся без блокировки записи в таблицы
+    with op.get_context().autocommit_block():
+        op.create_index('ix_appointments_date', 'appointments', ['date'], unique=False,
+                        postgresql_concurrently=True, if_not_exists=True)
+        op.create_index('ix_appointments_doctor_id_date', 'appointments', ['doctor_id', 'date'], unique=False,
+                        postgresql_concurrently=True, if_not_exists=True)
+        op.create_index('ix_patients_created_at', 'patients', ['created_at'], unique=False,
+                        postgresql_concurrently=True, if_not_exists=True)
+
+    # Сводки были разбиты по дням в UTC - пересчитываем в таймзоне клиники
+    op.execute("DELETE FROM daily_stats_rollup;")
+    op.execute("DELETE FROM daily_patients_rollup;")
+    if op.get_bind().dialect.name != "postgresql":
+        # На SQLite нет timezone() - пустые сводки пересоберет ensure_rollup при старте (clinic_day_expr)
+        return
+
+    op.execute(sa.text("""
+        INSERT INTO daily_stats_rollup (stat_date, doctor_id, status, appointments_count, cost_count, cost_sum)
+        SELECT date(timezone(:tz, date)), doctor_id, COALESCE(status, 'scheduled'),
+               count(id), count(cost), COALESCE(sum(cost), 0)
+        FROM appointments
+        WHERE date IS NOT NULL AND doctor_id IS NOT NULL
+        GROUP BY date(timezone(:tz, date)), doctor_id, COALESCE(status, 'scheduled');
+    """).bindparams(tz=settings.clinic_timezone))
+    op.execute(sa.text("""
+        INSERT INTO daily_patients_rollup (stat_date, new_patients_count)
+        SELECT date(timezone(:tz, timezone('UTC', created_at))), count(id)
+        FROM patients
+        WHERE created_at IS NOT NULL
+        GROUP BY date(timezone(:tz, timezone('UTC', created_at)));
+    """).bindparams(tz=settings.clinic_timezone))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_patients_created_at', table_name='patients', postgresql_concurrently=True)
+        op.drop_index('ix_appointments_doctor_id_date', table_name='appointments', postgresql_concurrently=True)
+        op.drop_index('ix_appointments_date', table_name='appointments', postgresql_concurrently=True)
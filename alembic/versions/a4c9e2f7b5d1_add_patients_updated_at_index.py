@@ -0,0 +1,39 @@
+"""Add patients.updated_at index for suggest index sync
+
+Revision ID: a4c9e2f7b5d1
+Revises: f2b8d4a6c1e3
+Create Date: 2026-10-17 22:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a4c9e2f7b5d1'
+down_revision: Union[str, Sequence[str], None] = 'f2b8d4a6c1e3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    if op.get_bind().dialect.name != "postgresql":
+        op.create_index(op.f('ix_patients_updated_at'), 'patients', ['updated_at'], unique=False)
+        return
+
+    with op.get_context().autocommit_block():
+        op.create_index(op.f('ix_patients_updated_at'), 'patients', ['updated_at'], unique=False,
+                        postgresql_concurrently=True, if_not_exists=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    if op.get_bind().dialect.name != "postgresql":
+        op.drop_index(op.f('ix_patients_updated_at'), table_name='patients')
+        return
+
+    with op.get_context().autocommit_block():
+        op.drop_index(op.f('ix_patients_updated_at'), table_name='patients', postgresql_concurrently=True)
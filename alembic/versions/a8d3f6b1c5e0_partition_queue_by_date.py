@@ -0,0 +1,123 @@
+"""Partition queue by queue_date, add partitioned queue_archive
+
+Revision ID: a8d3f6b1c5e0
+Revises: f4b7c2e9a1d3
+Create Date: 2026-10-17 18:10:00.000000
+
+"""
+from datetime import date, timedelta
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a8d3f6b1c5e0'
+down_revision: Union[str, Sequence[str], None] = 'f4b7c2e9a1d3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Как QUEUE_PARTITION_DAYS_AHEAD в app/utils/queue_archive.py
+PARTITION_DAYS_AHEAD = 7
+
+QUEUE_COLUMNS = "id, patient_id, doctor_id, ticket_number, queue_date, created_at"
+
+
+def _create_archive_table() -> None:
+    op.create_table('queue_archive',
+    sa.Column('id', sa.Integer(), autoincrement=False, nullable=False),
+    sa.Column('patient_id', sa.Integer(), nullable=False),
+    sa.Column('doctor_id', sa.Integer(), nullable=False),
+    sa.Column('ticket_number', sa.Integer(), nullable=False),
+    sa.Column('queue_date', sa.Date(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id', 'queue_date'),
+    postgresql_partition_by='RANGE (queue_date)'
+    )
+    op.create_index('ix_queue_archive_doctor_date', 'queue_archive', ['doctor_id', 'queue_date'], unique=False)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    if op.get_bind().dialect.name != "postgresql":
+        # Без секционирования: архив - обычная таблица, строки переносятся копированием
+        _create_archive_table()
+        return
+
+    today = date.today()
+
+    # Архив: прошлые очереди одной секцией, дальше дневные секции присоединяются планировщиком
+    _create_archive_table()
+    op.execute("CREATE TABLE queue_archive_default PARTITION OF queue_archive DEFAULT;")
+    op.execute(f"CREATE TABLE queue_archive_initial PARTITION OF queue_archive FOR VALUES FROM (MINVALUE) TO ('{today}');")
+    op.execute(f"""
+        INSERT INTO queue_archive ({QUEUE_COLUMNS})
+        SELECT {QUEUE_COLUMNS} FROM queue WHERE queue_date < '{today}';
+    """)
+
+    op.execute("""
+        CREATE TABLE queue_partitioned (
+            id integer NOT NULL,
+            patient_id integer NOT NULL REFERENCES patients (id) ON DELETE CASCADE,
+            doctor_id integer NOT NULL REFERENCES users (id) ON DELETE CASCADE,
+            ticket_number integer NOT NULL,
+            queue_date date NOT NULL,
+            created_at timestamp without time zone
+        ) PARTITION BY RANGE (queue_date);
+    """)
+    op.execute("CREATE TABLE queue_default PARTITION OF queue_partitioned DEFAULT;")
+    for offset in range(PARTITION_DAYS_AHEAD):
+        day = today + timedelta(days=offset)
+        op.execute(
+            f"CREATE TABLE queue_p{day:%Y%m%d} PARTITION OF queue_partitioned "
+            f"FOR VALUES FROM ('{day}') TO ('{day + timedelta(days=1)}');"
+        )
+    op.execute(f"""
+        INSERT INTO queue_partitioned ({QUEUE_COLUMNS})
+        SELECT {QUEUE_COLUMNS} FROM queue WHERE queue_date >= '{today}';
+    """)
+
+    # Последовательность id переходит к новой таблице, имена индексов освобождаются вместе со старой
+    op.execute("ALTER SEQUENCE queue_id_seq OWNED BY NONE;")
+    op.execute("DROP TABLE queue;")
+    op.execute("ALTER TABLE queue_partitioned RENAME TO queue;")
+    op.execute("ALTER TABLE queue ALTER COLUMN id SET DEFAULT nextval('queue_id_seq');")
+    op.execute("ALTER SEQUENCE queue_id_seq OWNED BY queue.id;")
+
+    # Ключ секционированной таблицы обязан включать queue_date
+    op.execute("ALTER TABLE queue ADD CONSTRAINT queue_pkey PRIMARY KEY (id, queue_date);")
+    op.create_unique_constraint('uq_queue_doctor_date_ticket', 'queue', ['doctor_id', 'queue_date', 'ticket_number'])
+    op.create_index('ix_queue_id', 'queue', ['id'], unique=False)
+    op.create_index('ix_queue_doctor_date_patient', 'queue', ['doctor_id', 'queue_date', 'patient_id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    if op.get_bind().dialect.name != "postgresql":
+        op.drop_index('ix_queue_archive_doctor_date', table_name='queue_archive')
+        op.drop_table('queue_archive')
+        return
+
+    # Обратно в обычную таблицу переносятся только текущие очереди, архив удаляется
+    op.execute("""
+        CREATE TABLE queue_plain (
+            id integer NOT NULL,
+            patient_id integer NOT NULL REFERENCES patients (id) ON DELETE CASCADE,
+            doctor_id integer NOT NULL REFERENCES users (id) ON DELETE CASCADE,
+            ticket_number integer NOT NULL,
+            queue_date date NOT NULL,
+            created_at timestamp without time zone
+        );
+    """)
+    op.execute(f"INSERT INTO queue_plain ({QUEUE_COLUMNS}) SELECT {QUEUE_COLUMNS} FROM queue;")
+    op.execute("ALTER SEQUENCE queue_id_seq OWNED BY NONE;")
+    op.execute("DROP TABLE queue;")
+    op.execute("DROP TABLE queue_archive;")
+    op.execute("ALTER TABLE queue_plain RENAME TO queue;")
+    op.execute("ALTER TABLE queue ALTER COLUMN id SET DEFAULT nextval('queue_id_seq');")
+    op.execute("ALTER SEQUENCE queue_id_seq OWNED BY queue.id;")
+    op.execute("ALTER TABLE queue ADD CONSTRAINT queue_pkey PRIMARY KEY (id);")
+    op.create_unique_constraint('uq_queue_doctor_date_ticket', 'queue', ['doctor_id', 'queue_date', 'ticket_number'])
+    op.create_index('ix_queue_id', 'queue', ['id'], unique=False)
+    op.create_index('ix_queue_doctor_date_patient', 'queue', ['doctor_id', 'queue_date', 'patient_id'], unique=False)
@@ -0,0 +1,43 @@
+"""Add queue called-in/finished timestamps and doctor service times
+
+Revision ID: b6e1d9f4c2a7
+Revises: a8d3f6b1c5e0
+Create Date: 2026-10-17 19:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b6e1d9f4c2a7'
+down_revision: Union[str, Sequence[str], None] = 'a8d3f6b1c5e0'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Время вызова и завершения приема хранится и в архиве - для отчетов по ожиданию
+    for table in ('queue', 'queue_archive'):
+        op.add_column(table, sa.Column('called_in_at', sa.DateTime(), nullable=True))
+        op.add_column(table, sa.Column('finished_at', sa.DateTime(), nullable=True))
+
+    op.create_table('queue_service_times',
+    sa.Column('doctor_id', sa.Integer(), nullable=False),
+    sa.Column('mean_seconds', sa.Float(), nullable=False),
+    sa.Column('samples', sa.Integer(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['doctor_id'], ['users.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('doctor_id')
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('queue_service_times')
+    for table in ('queue_archive', 'queue'):
+        op.drop_column(table, 'finished_at')
+        op.drop_column(table, 'called_in_at')
@@ -0,0 +1,43 @@
+"""Drop foreign keys inherited by archived queue partitions
+
+Revision ID: b7d2f5a9c3e8
+Revises: a4c9e2f7b5d1
+Create Date: 2026-10-17 23:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b7d2f5a9c3e8'
+down_revision: Union[str, Sequence[str], None] = 'a4c9e2f7b5d1'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Секции, уже перенесенные в архив, сохранили ON DELETE CASCADE от queue -
+    # удаление пациента стирало его архивную историю
+    bind = op.get_bind()
+    if bind.dialect.name != "postgresql":
+        return
+
+    constraints = bind.execute(sa.text("""
+        SELECT child.relname, pg_constraint.conname
+        FROM pg_inherits
+        JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+        JOIN pg_constraint ON pg_constraint.conrelid = child.oid AND pg_constraint.contype = 'f'
+        WHERE pg_inherits.inhparent = to_regclass('queue_archive')
+    """)).fetchall()
+    for table, name in constraints:
+        op.execute(f'ALTER TABLE {table} DROP CONSTRAINT "{name}";')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # Внешние ключи архива не восстанавливаются: строки удаленных пациентов их нарушили бы
+    pass
@@ -0,0 +1,55 @@
+"""Add queue counters, unique queue number per doctor and date
+
+Revision ID: c5d8e1f4a7b2
+Revises: 7b1e4d2c9a30
+Create Date: 2026-10-17 14:05:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c5d8e1f4a7b2'
+down_revision: Union[str, Sequence[str], None] = '7b1e4d2c9a30'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('queue_counters',
+    sa.Column('doctor_id', sa.Integer(), nullable=False),
+    sa.Column('queue_date', sa.Date(), nullable=False),
+    sa.Column('last_number', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['doctor_id'], ['users.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('doctor_id', 'queue_date')
+    )
+
+    # Дубли номеров (гонка max + 1) перенумеровываем по порядку добавления
+    op.execute("""
+        UPDATE queue SET queue_number = ranked.new_number
+        FROM (
+            SELECT id, ROW_NUMBER() OVER (
+                PARTITION BY doctor_id, queue_date ORDER BY queue_number, created_at, id
+            ) AS new_number
+            FROM queue
+        ) AS ranked
+        WHERE queue.id = ranked.id AND queue.queue_number <> ranked.new_number;
+    """)
+    op.create_unique_constraint('uq_queue_doctor_date_number', 'queue', ['doctor_id', 'queue_date', 'queue_number'])
+
+    op.execute("""
+        INSERT INTO queue_counters (doctor_id, queue_date, last_number)
+        SELECT doctor_id, queue_date, max(queue_number)
+        FROM queue
+        GROUP BY doctor_id, queue_date;
+    """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_constraint('uq_queue_doctor_date_number', 'queue', type_='unique')
+    op.drop_table('queue_counters')
@@ -0,0 +1,31 @@
+"""Add queue priority
+
+Revision ID: c9f2a4e7b3d8
+Revises: b6e1d9f4c2a7
+Create Date: 2026-10-17 19:40:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c9f2a4e7b3d8'
+down_revision: Union[str, Sequence[str], None] = 'b6e1d9f4c2a7'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Существующие записи получают обычный приоритет 0; колонка нужна и архиву, куда переходят секции queue
+    for table in ('queue', 'queue_archive'):
+        op.add_column(table, sa.Column('priority', sa.Integer(), server_default='0', nullable=False))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for table in ('queue_archive', 'queue'):
+        op.drop_column(table, 'priority')
@@ -0,0 +1,44 @@
+"""Add pg_trgm GIN indexes for patient name and phone search
+
+Revision ID: d1a5c8f3e6b9
+Revises: c9f2a4e7b3d8
+Create Date: 2026-10-17 20:30:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd1a5c8f3e6b9'
+down_revision: Union[str, Sequence[str], None] = 'c9f2a4e7b3d8'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Только PostgreSQL; индексы не объявлены в модели, чтобы create_all не требовал pg_trgm
+    if op.get_bind().dialect.name != "postgresql":
+        return
+
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm;")
+    with op.get_context().autocommit_block():
+        op.create_index('ix_patients_full_name_trgm', 'patients', ['full_name'], unique=False,
+                        postgresql_using='gin', postgresql_ops={'full_name': 'gin_trgm_ops'},
+                        postgresql_concurrently=True, if_not_exists=True)
+        op.create_index('ix_patients_phone_trgm', 'patients', ['phone'], unique=False,
+                        postgresql_using='gin', postgresql_ops={'phone': 'gin_trgm_ops'},
+                        postgresql_concurrently=True, if_not_exists=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    if op.get_bind().dialect.name != "postgresql":
+        return
+
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_patients_phone_trgm', table_name='patients', postgresql_concurrently=True)
+        op.drop_index('ix_patients_full_name_trgm', table_name='patients', postgresql_concurrently=True)
@@ -0,0 +1,46 @@
+"""Queue: immutable ticket numbers, position computed on read
+
+Revision ID: e2a6b9c3d1f7
+Revises: c5d8e1f4a7b2
+Create Date: 2026-10-17 15:20:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e2a6b9c3d1f7'
+down_revision: Union[str, Sequence[str], None] = 'c5d8e1f4a7b2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Текущие номера уже идут по порядку добавления - становятся номерами талонов
+    op.alter_column('queue', 'queue_number', new_column_name='ticket_number')
+    op.execute("ALTER TABLE queue RENAME CONSTRAINT uq_queue_doctor_date_number TO uq_queue_doctor_date_ticket;")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_constraint('uq_queue_doctor_date_ticket', 'queue', type_='unique')
+    op.alter_column('queue', 'ticket_number', new_column_name='queue_number')
+    # Возвращаем сплошную нумерацию позиций
+    op.execute("""
+        UPDATE queue SET queue_number = ranked.position
+        FROM (
+            SELECT id, ROW_NUMBER() OVER (PARTITION BY doctor_id, queue_date ORDER BY queue_number) AS position
+            FROM queue
+        ) AS ranked
+        WHERE queue.id = ranked.id AND queue.queue_number <> ranked.position;
+    """)
+    op.execute("""
+        UPDATE queue_counters SET last_number = counts.total
+        FROM (SELECT doctor_id, queue_date, count(*) AS total FROM queue GROUP BY doctor_id, queue_date) AS counts
+        WHERE queue_counters.doctor_id = counts.doctor_id AND queue_counters.queue_date = counts.queue_date;
+    """)
+    op.create_unique_constraint('uq_queue_doctor_date_number', 'queue', ['doctor_id', 'queue_date', 'queue_number'])
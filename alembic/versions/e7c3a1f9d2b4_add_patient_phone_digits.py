@@ -0,0 +1,51 @@
+"""Add patients.phone_digits with reversed index for phone suffix search
+
+Revision ID: e7c3a1f9d2b4
+Revises: d1a5c8f3e6b9
+Create Date: 2026-10-17 21:00:00.000000
+
+"""
+import re
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e7c3a1f9d2b4'
+down_revision: Union[str, Sequence[str], None] = 'd1a5c8f3e6b9'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('patients', sa.Column('phone_digits', sa.String(), nullable=True))
+
+    bind = op.get_bind()
+    if bind.dialect.name != "postgresql":
+        # На SQLite нет regexp_replace - заполняем из Python
+        rows = bind.execute(sa.text("SELECT id, phone FROM patients")).fetchall()
+        for patient_id, phone in rows:
+            bind.execute(
+                sa.text("UPDATE patients SET phone_digits = :digits WHERE id = :id"),
+                {"digits": re.sub(r"\D", "", phone or ""), "id": patient_id}
+            )
+        return
+
+    op.execute(r"UPDATE patients SET phone_digits = regexp_replace(phone, '\D', '', 'g');")
+    # Индекс по выражению не объявлен в модели: на SQLite нет reverse()
+    with op.get_context().autocommit_block():
+        op.execute(
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_patients_phone_digits_reverse "
+            "ON patients (reverse(phone_digits) text_pattern_ops);"
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    if op.get_bind().dialect.name == "postgresql":
+        with op.get_context().autocommit_block():
+            op.execute("DROP INDEX CONCURRENTLY IF EXISTS ix_patients_phone_digits_reverse;")
+    op.drop_column('patients', 'phone_digits')
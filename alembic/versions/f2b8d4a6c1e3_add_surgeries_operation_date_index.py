@@ -0,0 +1,39 @@
+"""Add surgeries (operation_date, id) index for keyset pagination
+
+Revision ID: f2b8d4a6c1e3
+Revises: e7c3a1f9d2b4
+Create Date: 2026-10-17 21:30:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f2b8d4a6c1e3'
+down_revision: Union[str, Sequence[str], None] = 'e7c3a1f9d2b4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    if op.get_bind().dialect.name != "postgresql":
+        op.create_index('ix_surgeries_operation_date_id', 'surgeries', ['operation_date', 'id'], unique=False)
+        return
+
+    with op.get_context().autocommit_block():
+        op.create_index('ix_surgeries_operation_date_id', 'surgeries', ['operation_date', 'id'], unique=False,
+                        postgresql_concurrently=True, if_not_exists=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    if op.get_bind().dialect.name != "postgresql":
+        op.drop_index('ix_surgeries_operation_date_id', table_name='surgeries')
+        return
+
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_surgeries_operation_date_id', table_name='surgeries', postgresql_concurrently=True)
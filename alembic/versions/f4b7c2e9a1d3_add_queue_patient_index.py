@@ -0,0 +1,31 @@
+"""Add queue (doctor_id, queue_date, patient_id) index
+
+Revision ID: f4b7c2e9a1d3
+Revises: e2a6b9c3d1f7
+Create Date: 2026-10-17 17:20:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f4b7c2e9a1d3'
+down_revision: Union[str, Sequence[str], None] = 'e2a6b9c3d1f7'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    with op.get_context().autocommit_block():
+        op.create_index('ix_queue_doctor_date_patient', 'queue', ['doctor_id', 'queue_date', 'patient_id'], unique=False,
+                        postgresql_concurrently=True, if_not_exists=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_queue_doctor_date_patient', table_name='queue', postgresql_concurrently=True)
@@ -1,4 +1,5 @@
 from pydantic_settings import BaseSettings
+from typing import Optional
 import os
 
 class Settings(BaseSettings):
@@ -6,6 +7,28 @@ class Settings(BaseSettings):
     secret_key: str = "your-secret-key-here"
     algorithm: str = "HS256"
     access_token_expire_minutes: int = 30
+    clinic_timezone: str = "Asia/Tashkent"  # Границы дней в статистике считаются в этой таймзоне
+    stats_cache_ttl_seconds: float = 60
+    stats_cache_max_entries: int = 256
+    stats_overview_timeout_seconds: float = 10  # Таймаут каждого раздела /stats/overview
+    stats_overview_workers: int = 8
+    stats_snapshot_max_bytes: int = 64 * 1024 * 1024  # Бюджет памяти колоночного снимка записей
+    stats_snapshot_refresh_seconds: float = 5  # Как часто планировщик догружает изменения в снимок
+    stats_snapshot_max_staleness_seconds: float = 60  # Старше - ответ считается в SQL
+    stats_snapshot_reconcile_seconds: float = 3600  # Сверка числа строк снимка с таблицей (удаления в других воркерах)
+    # LISTEN/NOTIFY для событий очереди между воркерами; LISTEN не работает через
+    # pooler в режиме транзакций - здесь нужен прямой адрес БД (по умолчанию database_url)
+    queue_events_database_url: Optional[str] = None
+    queue_service_time_alpha: float = 0.2  # Вес нового приема в скользящем среднем времени приема врача
+    queue_default_service_minutes: float = 15  # Время приема, пока у врача нет завершенных приемов
+    queue_service_time_persist_seconds: float = 300  # Как часто сохранять средние в БД
+    queue_engine_check_seconds: float = 60  # Сверка очередей в памяти с таблицей queue (пропущенные события)
+    queue_cleanup_in_scheduler: bool = True  # False - очистка очередей запускается из cron (app/utils/queue_cleanup.py)
+    queue_cleanup_batch_size: int = 5000  # Строк на транзакцию при переносе в архив
+    queue_cleanup_batch_pause_seconds: float = 0.05  # Пауза между пачками
+    patient_suggest_max_bytes: int = 256 * 1024 * 1024  # Бюджет памяти индекса подсказок; больше - подсказки из БД
+    patient_suggest_sync_seconds: float = 30  # Как часто индекс подсказок пациентов догружает изменения других воркеров
+    patient_suggest_reconcile_seconds: float = 3600  # Как часто индекс ищет пациентов, удаленных в других воркерах
 
     class Config:
         env_file = ".env"
@@ -3,4 +3,5 @@ from app.models.user import User
 from app.models.patient import Patient
 from app.models.appointment import Appointment
 from app.models.surgery import Surgery
-from app.models.queue import Queue
\ No newline at end of file
+from app.models.queue import Queue, QueueArchive, QueueCounter, QueueServiceTime
+from app.models.stats_rollup import DailyStatsRollup, DailyPatientsRollup
\ No newline at end of file
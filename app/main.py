@@ -2,9 +2,15 @@ from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from app.routes import auth, patients, appointments, stats, surgeries
 from app.routes import queue as queue_router
-from app.models import user, patient, appointment, surgery, queue
+from app.models import user, patient, appointment, surgery, queue, stats_rollup
 from app.db.session import engine, Base
 from app.utils.scheduler import start_scheduler
+from app.utils.stats_rollup import ensure_rollup
+from app.utils.queue_events import start_queue_event_listener
+from app.utils.queue_engine import queue_engine
+from app.utils.queue_eta import service_time_estimator
+from app.utils.queue_archive import prepare_queue_partitions
+from app.utils.patient_suggest import patient_suggest_index
 
 app = FastAPI(
     title="Medical Information System",
@@ -19,6 +25,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],  # Курсор следующей страницы списков приемов
 )
 
 # Include routers
@@ -35,9 +42,25 @@ def on_startup():
     Base.metadata.create_all(bind=engine)
     print(">>> Tables created")
 
+    # Заполнение дневных сводок статистики, если они еще пустые
+    ensure_rollup()
+
+    # Дневные секции очереди на ближайшие дни (PostgreSQL)
+    prepare_queue_partitions()
+
     # Запуск планировщика для автоматического сброса очередей
     start_scheduler()
 
+    # События очереди от других воркеров (PostgreSQL LISTEN/NOTIFY)
+    start_queue_event_listener()
+
+    # Сегодняшние очереди в памяти воркера и средние времени приема врачей
+    queue_engine.rebuild()
+    service_time_estimator.load()
+
+    # Индекс подсказок для строки поиска пациентов - в фоне, до готовности подсказки из БД
+    patient_suggest_index.start_rebuild()
+
 @app.get("/")
 def read_root():
     return {"message": "Medical Information System API"}
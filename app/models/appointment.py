@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, Text, ForeignKey, Numeric
+from sqlalchemy import Column, Integer, String, DateTime, Text, ForeignKey, Numeric, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from app.db.session import Base
@@ -9,7 +9,7 @@ class Appointment(Base):
     id = Column(Integer, primary_key=True, index=True)
     doctor_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"))
     patient_id = Column(Integer, ForeignKey("patients.id", ondelete="CASCADE"))
-    date = Column(DateTime(timezone=True))
+    date = Column(DateTime(timezone=True), index=True)
     status = Column(String, default="scheduled")
     notes = Column(Text, nullable=True)
     cost = Column(Numeric(10, 2), nullable=True, default=0.00)  # Стоимость приема
@@ -19,5 +19,9 @@ class Appointment(Base):
     doctor = relationship("User", back_populates="appointments")
     patient = relationship("Patient", back_populates="appointments")
 
+    __table_args__ = (
+        Index("ix_appointments_doctor_id_date", "doctor_id", "date"),
+    )
+
     def __repr__(self):
         return f"Appointment(id={self.id}, doctor_id={self.doctor_id}, patient_id={self.patient_id})"
@@ -14,10 +14,11 @@ class Patient(Base):
     birth_date = Column(Date, nullable=False)
     gender = Column(String, nullable=False)
     phone = Column(String, index=True, nullable=False)
+    phone_digits = Column(String, nullable=True)  # Только цифры телефона для поиска (app/utils/patient_search.py)
     passport = Column(String, nullable=True)
     address = Column(String, nullable=True)
-    created_at = Column(DateTime, default=datetime.utcnow)
-    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)  # UTC без таймзоны
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)  # Синхронизация подсказок (app/utils/patient_suggest.py)
 
     # Relationships
     appointments = relationship("Appointment", back_populates="patient", cascade="all, delete-orphan")
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, ForeignKey, DateTime, Date
+from sqlalchemy import Column, Integer, ForeignKey, DateTime, Date, UniqueConstraint, Index, Float
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from datetime import datetime, date
@@ -10,10 +10,61 @@ class Queue(Base):
     id = Column(Integer, primary_key=True, index=True)
     patient_id = Column(Integer, ForeignKey("patients.id", ondelete="CASCADE"), nullable=False)
     doctor_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
-    queue_number = Column(Integer, nullable=False)  # Номер в очереди (1, 2, 3...)
+    ticket_number = Column(Integer, nullable=False)  # Номер талона, не меняется (позиция считается при чтении)
+    priority = Column(Integer, nullable=False, default=0, server_default="0")  # Больше - раньше (экстренные, пожилые)
     queue_date = Column(Date, nullable=False, default=date.today)  # Дата очереди
     created_at = Column(DateTime, default=datetime.utcnow)
+    called_in_at = Column(DateTime, nullable=True)  # Врач вызвал пациента (UTC)
+    finished_at = Column(DateTime, nullable=True)  # Прием завершен (UTC)
 
     # Relationships
     patient = relationship("Patient", backref="queue_entries")
     doctor = relationship("User", backref="queue_entries")
+
+    __table_args__ = (
+        UniqueConstraint("doctor_id", "queue_date", "ticket_number", name="uq_queue_doctor_date_ticket"),
+        # Номер в очереди врача для списка пациентов (GET /patients/?doctor_id=)
+        Index("ix_queue_doctor_date_patient", "doctor_id", "queue_date", "patient_id"),
+    )
+
+
+class QueueArchive(Base):
+    """
+    Очереди прошедших дней для отчетов по ожиданию.
+    На PostgreSQL queue и queue_archive секционированы по queue_date: ночью дневные секции
+    отсоединяются от queue и присоединяются сюда (см. app/utils/queue_archive.py)
+    """
+    __tablename__ = "queue_archive"
+
+    id = Column(Integer, primary_key=True, autoincrement=False)
+    patient_id = Column(Integer, nullable=False)
+    doctor_id = Column(Integer, nullable=False)
+    ticket_number = Column(Integer, nullable=False)
+    priority = Column(Integer, nullable=False, default=0, server_default="0")
+    queue_date = Column(Date, primary_key=True)
+    created_at = Column(DateTime)
+    called_in_at = Column(DateTime)
+    finished_at = Column(DateTime)
+
+    __table_args__ = (
+        Index("ix_queue_archive_doctor_date", "doctor_id", "queue_date"),
+    )
+
+
+class QueueCounter(Base):
+    """Последний выданный номер талона врача на дату (выдается атомарно, см. app/utils/queue_counter.py)"""
+    __tablename__ = "queue_counters"
+
+    doctor_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    queue_date = Column(Date, primary_key=True)
+    last_number = Column(Integer, nullable=False, default=0)
+
+
+class QueueServiceTime(Base):
+    """Скользящее среднее времени приема врача (см. app/utils/queue_eta.py)"""
+    __tablename__ = "queue_service_times"
+
+    doctor_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    mean_seconds = Column(Float, nullable=False)
+    samples = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow)
@@ -0,0 +1,28 @@
+from sqlalchemy import Column, Integer, String, Date, ForeignKey, Numeric, UniqueConstraint, Index
+from app.db.session import Base
+
+
+class DailyStatsRollup(Base):
+    """Дневная сводка по записям: дата × врач × статус"""
+    __tablename__ = "daily_stats_rollup"
+
+    id = Column(Integer, primary_key=True, index=True)
+    stat_date = Column(Date, nullable=False)
+    doctor_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    status = Column(String, nullable=False)
+    appointments_count = Column(Integer, nullable=False, default=0)
+    cost_count = Column(Integer, nullable=False, default=0)  # Записи с указанной стоимостью (для среднего)
+    cost_sum = Column(Numeric(14, 2), nullable=False, default=0)
+
+    __table_args__ = (
+        UniqueConstraint("stat_date", "doctor_id", "status", name="uq_daily_stats_rollup_key"),
+        Index("ix_daily_stats_rollup_doctor_date", "doctor_id", "stat_date"),
+    )
+
+
+class DailyPatientsRollup(Base):
+    """Дневная сводка по новым пациентам"""
+    __tablename__ = "daily_patients_rollup"
+
+    stat_date = Column(Date, primary_key=True)
+    new_patients_count = Column(Integer, nullable=False, default=0)
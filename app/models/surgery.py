@@ -2,7 +2,7 @@
 Operations Models
 """
 from sqlalchemy.orm import Mapped, mapped_column, relationship
-from sqlalchemy import String, Date, DateTime, Text, ForeignKey, JSON
+from sqlalchemy import String, Date, DateTime, Text, ForeignKey, JSON, Index
 from sqlalchemy.sql import func
 from app.db.session import Base
 
@@ -45,5 +45,10 @@ class Surgery(Base):
     surgeon = relationship("User", foreign_keys=[surgeon_id], backref="surgeries_performed")
     creator = relationship("User", foreign_keys=[created_by], backref="surgeries_created")
 
+    __table_args__ = (
+        # Список операций: ORDER BY operation_date DESC, id DESC с keyset-пагинацией
+        Index("ix_surgeries_operation_date_id", "operation_date", "id"),
+    )
+
     def __repr__(self):
         return f"<Surgery(id={self.id}, patient_id={self.patient_id}, operation_name={self.operation_name})>"
\ No newline at end of file
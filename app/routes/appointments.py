@@ -1,8 +1,8 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
 from sqlalchemy.orm import Session
-from sqlalchemy import and_, func
+from sqlalchemy import and_
 from typing import List, Optional
-from datetime import date as date_type
+from datetime import date as date_type, datetime
 from app.db.session import get_db
 from app.schemas.appointment import AppointmentCreate, Appointment, AppointmentWithDoctor, AppointmentCostUpdate
 from app.schemas.patient import Patient
@@ -11,6 +11,12 @@ from app.models.appointment import Appointment as AppointmentModel
 from app.models.patient import Patient as PatientModel
 from app.models.queue import Queue as QueueModel
 from app.utils.dependencies import get_current_user
+from app.utils.stats_rollup import rollup_add_appointment, rollup_remove_appointment
+from app.utils.stats_cache import invalidate_stats_cache
+from app.utils.queue_counter import allocate_queue_number
+from app.utils.queue_position import queue_position
+from app.utils.queue_events import emit_queue_event, queue_entry_event, queue_finish_event
+from app.utils.pagination import NEXT_CURSOR_HEADER, after_cursor, decode_cursor, next_cursor, split_page
 from app.models.user import User
 import logging
 import traceback
@@ -24,6 +30,8 @@ logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
+APPOINTMENTS_PAGE_SIZE = 100
+
 @router.post("/", response_model=Appointment)
 def create_appointment(appointment: AppointmentCreate, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
     """
@@ -117,6 +125,9 @@ def create_appointment(appointment: AppointmentCreate, db: Session = Depends(get
         try:
             db.add(db_appointment)
             logger.info("   Appointment added to session")
+            db.flush()
+            rollup_add_appointment(db, db_appointment)
+            logger.info("   Daily stats rollup updated")
             logger.info("✅ Прием добавлен в сессию")
         except Exception as e:
             logger.error(f"❌ Ошибка при добавлении в сессию: {str(e)}")
@@ -127,6 +138,7 @@ def create_appointment(appointment: AppointmentCreate, db: Session = Depends(get
         logger.info("💾 Шаг 7: Коммит изменений в БД...")
         try:
             db.commit()
+            invalidate_stats_cache()
             logger.info("   Commit successful")
             logger.info("✅ Изменения сохранены в БД")
         except Exception as e:
@@ -151,28 +163,22 @@ def create_appointment(appointment: AppointmentCreate, db: Session = Depends(get
             ).first()
 
             if not existing_queue:
-                # Находим максимальный номер в очереди этого врача
-                max_queue = db.query(func.max(QueueModel.queue_number)).filter(
-                    and_(
-                        QueueModel.doctor_id == appointment.doctor_id,
-                        QueueModel.queue_date == today
-                    )
-                ).scalar()
-
-                # Новый пациент получает следующий номер (max + 1, или 1 если очередь пустая)
-                next_queue_number = (max_queue or 0) + 1
+                # Следующий номер талона из счетчика врача (атомарно, без гонок)
+                ticket_number = allocate_queue_number(db, appointment.doctor_id, today)
 
                 new_queue_entry = QueueModel(
                     patient_id=appointment.patient_id,
                     doctor_id=appointment.doctor_id,
-                    queue_number=next_queue_number,
+                    ticket_number=ticket_number,
                     queue_date=today
                 )
                 db.add(new_queue_entry)
+                db.flush()
+                emit_queue_event(db, queue_entry_event(new_queue_entry, queue_position(db, new_queue_entry), patient))
                 db.commit()
-                logger.info(f"✅ Пациент добавлен в очередь с номером {next_queue_number}")
+                logger.info(f"✅ Пациент добавлен в очередь, талон {ticket_number}")
             else:
-                logger.info(f"ℹ️ Пациент уже в очереди с номером {existing_queue.queue_number}")
+                logger.info(f"ℹ️ Пациент уже в очереди, талон {existing_queue.ticket_number}")
         except Exception as e:
             logger.error(f"❌ Ошибка при добавлении в очередь: {str(e)}")
             logger.error(f"Traceback: {traceback.format_exc()}")
@@ -226,9 +232,30 @@ def get_doctors(
     doctors = db.query(User).filter(User.role == "doctor").all()
     return doctors
 
+def paginate_appointments(query, response: Response, limit: Optional[int], cursor: Optional[str]) -> list:
+    """
+    Без limit и cursor - весь список, как раньше. Иначе страница по (date, id) от новых к старым,
+    курсор следующей страницы - в заголовке X-Next-Cursor.
+    """
+    if limit is None and cursor is None:
+        return query.all()
+    limit = limit or APPOINTMENTS_PAGE_SIZE
+    query = query.order_by(AppointmentModel.date.desc(), AppointmentModel.id.desc())
+    if cursor:
+        last_date, last_id = decode_cursor(cursor, datetime, int)
+        query = query.filter(after_cursor([AppointmentModel.date, AppointmentModel.id], [last_date, last_id]))
+    results, has_more = split_page(query.limit(limit + 1).all(), limit)
+    cursor = next_cursor(results, has_more, lambda row: (row[0].date, row[0].id))
+    if cursor:
+        response.headers[NEXT_CURSOR_HEADER] = cursor
+    return results
+
 @router.get("/my", response_model=List[AppointmentWithDoctor])
 def get_my_appointments(
+    response: Response,
     status: Optional[str] = Query(None, description="Filter by status"),
+    limit: Optional[int] = Query(None, ge=1, le=500, description="Page size (cursor pagination)"),
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor of the previous page"),
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
@@ -239,7 +266,7 @@ def get_my_appointments(
     ).filter(AppointmentModel.doctor_id == current_user.id)
     if status:
         query = query.filter(AppointmentModel.status == status)
-    results = query.all()
+    results = paginate_appointments(query, response, limit, cursor)
     appointments = []
     for appointment, patient_full_name in results:
         appointment_data = AppointmentWithDoctor(
@@ -267,13 +294,28 @@ def finish_appointment(
     appointment = db.query(AppointmentModel).filter(
         AppointmentModel.id == appointment_id,
         AppointmentModel.doctor_id == current_user.id
-    ).first()
+    ).with_for_update().first()
 
     if not appointment:
         raise HTTPException(status_code=404, detail="Appointment not found")
 
+    rollup_remove_appointment(db, appointment)
     appointment.status = "done"
+    rollup_add_appointment(db, appointment)
+
+    # Прием в сегодняшней очереди врача завершен - его длительность идет в оценку ожидания
+    queue_entry = db.query(QueueModel).filter(
+        QueueModel.patient_id == appointment.patient_id,
+        QueueModel.doctor_id == current_user.id,
+        QueueModel.queue_date == date_type.today(),
+        QueueModel.finished_at.is_(None)
+    ).order_by(QueueModel.ticket_number).first()
+    if queue_entry:
+        queue_entry.finished_at = datetime.utcnow()
+        emit_queue_event(db, queue_finish_event(queue_entry))
+
     db.commit()
+    invalidate_stats_cache()
     db.refresh(appointment)
     return appointment
 
@@ -290,19 +332,25 @@ def update_appointment_cost(
     appointment = db.query(AppointmentModel).filter(
         AppointmentModel.id == appointment_id,
         AppointmentModel.doctor_id == current_user.id
-    ).first()
+    ).with_for_update().first()
 
     if not appointment:
         raise HTTPException(status_code=404, detail="Appointment not found")
 
+    rollup_remove_appointment(db, appointment)
     appointment.cost = cost_update.cost
+    rollup_add_appointment(db, appointment)
     db.commit()
+    invalidate_stats_cache()
     db.refresh(appointment)
     return appointment
 
 
 @router.get("/reception/done", response_model=List[AppointmentWithDoctor])
 def get_done_appointments(
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=500, description="Page size (cursor pagination)"),
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor of the previous page"),
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
@@ -311,7 +359,7 @@ def get_done_appointments(
     query = db.query(AppointmentModel, PatientModel.full_name.label("patient_full_name")).join(
         PatientModel, AppointmentModel.patient_id == PatientModel.id
     ).filter(AppointmentModel.status == "done")
-    results = query.all()
+    results = paginate_appointments(query, response, limit, cursor)
     appointments = []
     for appointment, patient_full_name in results:
         appointment_data = AppointmentWithDoctor(
@@ -336,7 +384,7 @@ def pay_appointment(
     if current_user.role != "reception":
         raise HTTPException(status_code=403, detail="Not authorized")
 
-    appointment = db.query(AppointmentModel).filter(AppointmentModel.id == appointment_id).first()
+    appointment = db.query(AppointmentModel).filter(AppointmentModel.id == appointment_id).with_for_update().first()
 
     if not appointment:
         raise HTTPException(status_code=404, detail="Appointment not found")
@@ -344,8 +392,11 @@ def pay_appointment(
     if appointment.status != "done":
         raise HTTPException(status_code=400, detail="Appointment must be done before payment")
 
+    rollup_remove_appointment(db, appointment)
     appointment.status = "paid"
+    rollup_add_appointment(db, appointment)
     db.commit()
+    invalidate_stats_cache()
     db.refresh(appointment)
     return appointment
 
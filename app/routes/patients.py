@@ -1,16 +1,23 @@
 from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.orm import Session
-from sqlalchemy import and_, func
+from sqlalchemy import func
 from typing import List, Optional
 import uuid
 import logging
 import traceback
 from datetime import date
 from app.db.session import get_db
-from app.schemas.patient import PatientCreate, Patient, PatientUpdate, PatientListResponse
+from app.schemas.patient import PatientCreate, Patient, PatientUpdate, PatientListResponse, PatientSuggestion
 from app.models.patient import Patient as PatientModel
-from app.models.queue import Queue as QueueModel
+from app.utils.queue_position import patient_queue_positions
+from app.utils.patient_search import name_search, phone_search, normalize_phone
+from app.utils.patient_suggest import patient_suggest_index, suggest_from_db
+from app.utils.queue_events import emit_patient_queue_events
 from app.utils.dependencies import get_current_user
+from app.utils.list_count import COUNT_MODE_PATTERN, list_total_count
+from app.utils.pagination import after_cursor, decode_cursor, next_cursor, split_page
+from app.utils.stats_rollup import rollup_add_patient, rollup_remove_patient
+from app.utils.stats_cache import invalidate_stats_cache
 from app.models.user import User
 
 logger = logging.getLogger(__name__)
@@ -35,41 +42,86 @@ def create_patient(
         raise HTTPException(status_code=400, detail="Patient already exists")
 
     # UUID генерируется автоматически в модели
-    db_patient = PatientModel(**patient.dict())
+    db_patient = PatientModel(**patient.dict(), phone_digits=normalize_phone(patient.phone))
     db.add(db_patient)
+    db.flush()
+    rollup_add_patient(db, db_patient)
     db.commit()
+    invalidate_stats_cache()
     db.refresh(db_patient)
+    patient_suggest_index.upsert(db_patient.id, db_patient.full_name, db_patient.phone)
     return db_patient
 
+@router.get("/suggest", response_model=List[PatientSuggestion])
+def suggest_patients(
+    q: str = Query(..., min_length=1, max_length=100, description="Beginning of any word of the name or digits of the phone"),
+    limit: int = Query(10, ge=1, le=50),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Подсказки для строки поиска из индекса в памяти воркера; пока индекс строится - из БД"""
+    suggestions = patient_suggest_index.suggest(q, limit)
+    if suggestions is None:
+        suggestions = suggest_from_db(db, q, limit)
+    return suggestions
+
 @router.get("/", response_model=PatientListResponse)
 def search_patients(
     search: Optional[str] = Query(None, description="Search by name"),
-    phone: Optional[str] = Query(None, description="Search by phone"),
+    fuzzy: bool = Query(False, description="Typo-tolerant name search ranked by similarity (PostgreSQL)"),
+    phone: Optional[str] = Query(None, description="Search by the last digits of the phone"),
     doctor_id: Optional[int] = Query(None, description="Filter by doctor queue"),
     skip: int = Query(0, ge=0),
     limit: int = Query(100, ge=1, le=100),
+    cursor: Optional[str] = Query(None, description="next_cursor of the previous page (instead of skip)"),
+    count: str = Query("exact", pattern=COUNT_MODE_PATTERN,
+                       description="total_count: exact, estimate (PostgreSQL statistics) or none"),
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
     query = db.query(PatientModel)
+    ranking = None
 
     if search:
-        query = query.filter(PatientModel.full_name.ilike(f"%{search}%"))
+        name_filter, ranking = name_search(db, search, fuzzy)
+        query = query.filter(name_filter)
     if phone:
-        query = query.filter(PatientModel.phone.contains(phone))
-
-    # LIFO - сортируем по ID в обратном порядке (последний зарегистрированный первым)
-    query = query.order_by(PatientModel.id.desc())
-
-    total_count = query.count()
-    patients_db = query.offset(skip).limit(limit).all()
+        query = query.filter(phone_search(db, phone))
+
+    # LIFO - сортируем по ID в обратном порядке (последний зарегистрированный первым);
+    # в нечетком поиске сначала самые похожие
+    if ranking is not None:
+        query = query.order_by(ranking.desc(), PatientModel.id.desc())
+    else:
+        query = query.order_by(PatientModel.id.desc())
+
+    total_count, count_mode = list_total_count(db, query, count, "patients", filtered=bool(search or phone))
+
+    # Номер в очереди врача на сегодня (если указан doctor_id) - LEFT JOIN в том же запросе;
+    # join строится до OFFSET/LIMIT
+    if doctor_id:
+        positions = patient_queue_positions(db, doctor_id, date.today())
+        query = query.add_columns(positions.c.queue_number).outerjoin(
+            positions, positions.c.patient_id == PatientModel.id
+        )
+
+    # Keyset-пагинация по id; в нечетком поиске порядок по сходству - только skip
+    if cursor:
+        if ranking is not None:
+            raise HTTPException(status_code=400, detail="Cursor pagination is not available for fuzzy search")
+        (last_id,) = decode_cursor(cursor, int)
+        query = query.filter(after_cursor([PatientModel.id], [last_id]))
+    else:
+        query = query.offset(skip)
+
+    rows = query.limit(limit + 1).all()
+    if not doctor_id:
+        rows = [(patient, None) for patient in rows]
+    rows, has_more = split_page(rows, limit)
 
-    # Получаем информацию об очереди для каждого пациента (если указан doctor_id)
     patients = []
-    today = date.today()
-
-    for patient in patients_db:
-        patient_dict = {
+    for patient, queue_number in rows:
+        patients.append({
             "id": patient.id,
             "patient_uid": patient.patient_uid,
             "full_name": patient.full_name,
@@ -79,25 +131,15 @@ def search_patients(
             "passport": patient.passport,
             "address": patient.address,
             "created_at": patient.created_at,
-            "queue_number": None
-        }
-
-        # Если указан doctor_id, получаем номер очереди пациента у этого врача
-        if doctor_id:
-            queue_entry = db.query(QueueModel).filter(
-                and_(
-                    QueueModel.patient_id == patient.id,
-                    QueueModel.doctor_id == doctor_id,
-                    QueueModel.queue_date == today
-                )
-            ).first()
-
-            if queue_entry:
-                patient_dict["queue_number"] = queue_entry.queue_number
+            "queue_number": queue_number
+        })
 
-        patients.append(patient_dict)
-
-    return PatientListResponse(patients=patients, total_count=total_count)
+    return PatientListResponse(
+        patients=patients,
+        total_count=total_count,
+        count_mode=count_mode,
+        next_cursor=None if ranking is not None else next_cursor(rows, has_more, lambda row: (row[0].id,))
+    )
 
 @router.get("/{patient_id}", response_model=Patient)
 def get_patient(
@@ -127,9 +169,17 @@ def update_patient(
     update_data = patient_update.dict(exclude_unset=True)
     for field, value in update_data.items():
         setattr(patient, field, value)
+    if "phone" in update_data:
+        patient.phone_digits = normalize_phone(patient.phone)
+
+    # ФИО и телефон показываются в живой очереди
+    if "full_name" in update_data or "phone" in update_data:
+        emit_patient_queue_events(db, patient)
 
     db.commit()
     db.refresh(patient)
+    if "full_name" in update_data or "phone" in update_data:
+        patient_suggest_index.upsert(patient.id, patient.full_name, patient.phone)
     return patient
 
 @router.delete("/{patient_id}")
@@ -153,8 +203,13 @@ def delete_patient(
         patient_name = patient.full_name
         logger.info(f"📝 Deleting patient: {patient_name} (ID: {patient_id})")
 
+        # Записи и очередь пациента удаляются каскадом - убираем их из дневных сводок и живой очереди
+        rollup_remove_patient(db, patient)
+        emit_patient_queue_events(db, patient, removed=True)
         db.delete(patient)
         db.commit()
+        invalidate_stats_cache()
+        patient_suggest_index.remove(patient_id)
 
         logger.info(f"✅ Patient {patient_id} deleted successfully")
         return {"message": "Patient deleted successfully", "patient_id": patient_id}
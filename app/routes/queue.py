@@ -1,17 +1,39 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, WebSocket, WebSocketDisconnect, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
-from sqlalchemy import func, and_
+from sqlalchemy import and_
 from typing import List, Optional
 from datetime import date, datetime
-from app.db.session import get_db
-from app.schemas.queue import QueueCreate, Queue as QueueSchema, QueueListResponse, QueueWithPatient
+import asyncio
+import json
+from app.db.session import get_db, SessionLocal
+from app.schemas.queue import (
+    QueueCreate, Queue as QueueSchema, QueueListResponse, QueueWithPatient,
+    QueueBulkCreate, QueueBulkItemResult, QueueBulkResponse, QueuePriorityUpdate
+)
 from app.models.queue import Queue as QueueModel
 from app.models.patient import Patient as PatientModel
 from app.models.user import User
-from app.utils.dependencies import get_current_user
+from app.utils.dependencies import get_current_user, get_stream_user, user_from_token
+from app.utils.queue_counter import (
+    allocate_queue_number, allocate_queue_numbers, reset_queue_counter
+)
+from app.utils.queue_position import (
+    queue_position_column, queue_order, queue_position, queue_positions, queue_entry_data
+)
+from app.utils.queue_events import (
+    queue_broker, QueueSubscription, emit_queue_event, queue_entry_event, queue_remove_event, queue_clear_event,
+    queue_call_event, queue_priority_event
+)
+from app.utils.queue_engine import queue_engine
+from app.utils.queue_eta import service_time_estimator, add_wait_estimates
+from app.utils.queue_cleanup import cleanup_metrics, run_queue_cleanup
 
 router = APIRouter()
 
+QUEUE_STREAM_KEEPALIVE_SECONDS = 15
+
 
 @router.post("/", response_model=QueueSchema)
 def add_patient_to_queue(
@@ -20,7 +42,8 @@ def add_patient_to_queue(
     current_user: User = Depends(get_current_user)
 ):
     """
-    Добавление пациента в очередь врача (FIFO - новые пациенты добавляются в конец).
+    Добавление пациента в очередь врача (FIFO - новые пациенты добавляются в конец
+    своего приоритета: с priority > 0 пациент встает перед всеми с меньшим приоритетом).
     """
     today = date.today()
 
@@ -46,29 +69,103 @@ def add_patient_to_queue(
     if existing:
         raise HTTPException(status_code=400, detail="Patient already in queue for this doctor today")
 
-    # FIFO: Находим максимальный номер в очереди
-    max_queue = db.query(func.max(QueueModel.queue_number)).filter(
-        and_(
-            QueueModel.doctor_id == queue_data.doctor_id,
-            QueueModel.queue_date == today
-        )
-    ).scalar()
-
-    # Новый пациент получает следующий номер (max + 1, или 1 если очередь пустая)
-    next_queue_number = (max_queue or 0) + 1
+    # FIFO: следующий номер талона из счетчика врача (атомарно, без гонок между регистраторами)
+    ticket_number = allocate_queue_number(db, queue_data.doctor_id, today)
 
     new_queue_entry = QueueModel(
         patient_id=queue_data.patient_id,
         doctor_id=queue_data.doctor_id,
-        queue_number=next_queue_number,
+        ticket_number=ticket_number,
+        priority=queue_data.priority,
         queue_date=today
     )
 
     db.add(new_queue_entry)
+    db.flush()
+    position = queue_position(db, new_queue_entry)
+    emit_queue_event(db, queue_entry_event(new_queue_entry, position, patient))
     db.commit()
     db.refresh(new_queue_entry)
 
-    return new_queue_entry
+    return queue_entry_data(new_queue_entry, position)
+
+
+@router.post("/bulk", response_model=QueueBulkResponse)
+def add_patients_to_queue_bulk(
+    bulk_data: QueueBulkCreate,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Добавление списка пациентов в очереди врачей одним запросом (утренний прием по записи).
+    Проверки те же, что у POST /queue/, но наборами: пациенты, врачи и дубли - по одному запросу,
+    номера талонов - одним запросом на врача, коммит - один.
+    Ошибочные элементы не мешают остальным: результат возвращается по каждому элементу.
+    """
+    today = date.today()
+    items = bulk_data.items
+
+    patients = {
+        patient.id: patient
+        for patient in db.query(PatientModel).filter(
+            PatientModel.id.in_({item.patient_id for item in items})
+        ).all()
+    }
+    doctor_ids = {
+        doctor_id
+        for (doctor_id,) in db.query(User.id).filter(User.id.in_({item.doctor_id for item in items})).all()
+    }
+    # Уже в очереди сегодня (индекс ix_queue_doctor_date_patient)
+    queued = set(db.query(QueueModel.doctor_id, QueueModel.patient_id).filter(
+        QueueModel.doctor_id.in_(doctor_ids),
+        QueueModel.queue_date == today,
+        QueueModel.patient_id.in_(patients.keys())
+    ).all()) if doctor_ids and patients else set()
+
+    results = []
+    accepted = {}  # doctor_id -> [индексы элементов] в порядке запроса
+    for index, item in enumerate(items):
+        result = QueueBulkItemResult(index=index, patient_id=item.patient_id, doctor_id=item.doctor_id, status="error")
+        results.append(result)
+        if item.patient_id not in patients:
+            result.detail = "Patient not found"
+        elif item.doctor_id not in doctor_ids:
+            result.detail = "Doctor not found"
+        elif (item.doctor_id, item.patient_id) in queued:
+            result.detail = "Patient already in queue for this doctor today"
+        else:
+            # Повтор внутри запроса тоже считается дублем
+            queued.add((item.doctor_id, item.patient_id))
+            accepted.setdefault(item.doctor_id, []).append(index)
+
+    # FIFO: номера талонов врача выдаются подряд в порядке элементов запроса
+    new_entries = {}
+    for doctor_id, indexes in accepted.items():
+        last_number = allocate_queue_numbers(db, doctor_id, today, count=len(indexes))
+        for ticket_number, index in enumerate(indexes, start=last_number - len(indexes) + 1):
+            new_entries[index] = QueueModel(
+                patient_id=items[index].patient_id,
+                doctor_id=doctor_id,
+                ticket_number=ticket_number,
+                priority=items[index].priority,
+                queue_date=today
+            )
+
+    db.add_all(new_entries.values())
+    db.flush()
+    positions = queue_positions(db, list(new_entries.values()))
+    for index, new_queue_entry in sorted(new_entries.items()):
+        position = positions[new_queue_entry.id]
+        emit_queue_event(db, queue_entry_event(new_queue_entry, position, patients[new_queue_entry.patient_id]))
+        results[index].status = "added"
+        results[index].entry = QueueSchema(**queue_entry_data(new_queue_entry, position))
+    db.commit()
+
+    return QueueBulkResponse(
+        results=results,
+        added_count=len(new_entries),
+        failed_count=len(results) - len(new_entries)
+    )
 
 
 @router.get("/doctor/{doctor_id}", response_model=QueueListResponse)
@@ -85,9 +182,35 @@ def get_doctor_queue(
     if queue_date is None:
         queue_date = date.today()
 
-    # Получаем очередь с информацией о пациентах
+    return doctor_queue_response(db, doctor_id, queue_date)
+
+
+def doctor_queue_response(db: Session, doctor_id: int, queue_date: date) -> QueueListResponse:
+    """
+    Сегодняшняя очередь - из памяти (app/utils/queue_engine.py) с ожидаемым временем ожидания,
+    остальные даты - из БД
+    """
+    if queue_date != date.today():
+        return load_doctor_queue(db, doctor_id, queue_date)
+
+    queue_list = queue_engine.doctor_queue(doctor_id)
+    if queue_list is None:
+        queue_list = load_doctor_queue_list(db, doctor_id, queue_date)
+    add_wait_estimates(queue_list, service_time_estimator.mean_seconds(doctor_id))
+    return QueueListResponse(queue=queue_list, total_count=len(queue_list))
+
+
+def load_doctor_queue(db: Session, doctor_id: int, queue_date: date) -> QueueListResponse:
+    """Очередь врача на дату с информацией о пациентах"""
+    queue_list = load_doctor_queue_list(db, doctor_id, queue_date)
+    return QueueListResponse(queue=queue_list, total_count=len(queue_list))
+
+
+def load_doctor_queue_list(db: Session, doctor_id: int, queue_date: date) -> List[dict]:
+    # Позиция - по порядку талонов
     queue_entries = db.query(
         QueueModel,
+        queue_position_column(),
         PatientModel.full_name,
         PatientModel.phone
     ).join(
@@ -97,23 +220,155 @@ def get_doctor_queue(
             QueueModel.doctor_id == doctor_id,
             QueueModel.queue_date == queue_date
         )
-    ).order_by(QueueModel.queue_number).all()
+    ).order_by(*queue_order()).all()
 
     # Формируем ответ
     queue_list = []
-    for queue_entry, patient_name, patient_phone in queue_entries:
+    for queue_entry, position, patient_name, patient_phone in queue_entries:
         queue_list.append({
-            "id": queue_entry.id,
-            "patient_id": queue_entry.patient_id,
-            "doctor_id": queue_entry.doctor_id,
-            "queue_number": queue_entry.queue_number,
-            "queue_date": queue_entry.queue_date,
-            "created_at": queue_entry.created_at,
+            **queue_entry_data(queue_entry, position),
             "patient_full_name": patient_name,
             "patient_phone": patient_phone
         })
 
-    return QueueListResponse(queue=queue_list, total_count=len(queue_list))
+    return queue_list
+
+
+def _queue_snapshot(doctor_id: int) -> dict:
+    """Сегодняшняя очередь для первого сообщения потока (в отдельной сессии)"""
+    db = SessionLocal()
+    try:
+        snapshot = doctor_queue_response(db, doctor_id, date.today())
+        return {"type": "snapshot", "doctor_id": doctor_id, **snapshot.model_dump(mode="json")}
+    finally:
+        db.close()
+
+
+async def _queue_stream_events(doctor_id: int, subscription: QueueSubscription):
+    """
+    Снимок очереди, затем события за сегодня; None - пора отправить keepalive.
+    Подписка оформляется до снимка, поэтому изменения между ними не теряются
+    (в худшем случае клиент получит событие, уже учтенное в снимке).
+    """
+    yield await run_in_threadpool(_queue_snapshot, doctor_id)
+    while True:
+        try:
+            queue_event = await asyncio.wait_for(subscription.get(), timeout=QUEUE_STREAM_KEEPALIVE_SECONDS)
+        except asyncio.TimeoutError:
+            yield None
+            continue
+        if queue_event["type"] == "resync":
+            yield await run_in_threadpool(_queue_snapshot, doctor_id)
+        elif queue_event["queue_date"] == date.today().isoformat():
+            yield queue_event
+
+
+@router.get("/doctor/{doctor_id}/stream")
+async def stream_doctor_queue(
+    doctor_id: int,
+    request: Request,
+    current_user: User = Depends(get_stream_user)
+):
+    """
+    Server-Sent Events для табло и консоли врача: сначала событие snapshot
+    (сегодняшняя очередь, как в GET /queue/doctor/{doctor_id}), затем add / remove / clear.
+    Токен можно передать параметром ?token= (EventSource не умеет заголовки).
+    """
+    subscription = queue_broker.subscribe(doctor_id)
+
+    async def event_stream():
+        try:
+            async for queue_event in _queue_stream_events(doctor_id, subscription):
+                if await request.is_disconnected():
+                    break
+                if queue_event is None:
+                    yield ": keepalive\n\n"
+                else:
+                    yield f"event: {queue_event['type']}\ndata: {json.dumps(queue_event, ensure_ascii=False)}\n\n"
+        finally:
+            queue_broker.unsubscribe(subscription)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@router.websocket("/doctor/{doctor_id}/ws")
+async def websocket_doctor_queue(
+    websocket: WebSocket,
+    doctor_id: int,
+    token: str = Query(..., description="JWT (браузер не передает заголовки в WebSocket)")
+):
+    """WebSocket-аналог /stream: JSON-сообщения snapshot / add / remove / clear / ping"""
+    db = SessionLocal()
+    try:
+        user_from_token(db, token)
+    except HTTPException:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+    finally:
+        db.close()
+
+    await websocket.accept()
+    subscription = queue_broker.subscribe(doctor_id)
+    try:
+        async for queue_event in _queue_stream_events(doctor_id, subscription):
+            await websocket.send_json(queue_event if queue_event is not None else {"type": "ping"})
+    except WebSocketDisconnect:
+        pass
+    finally:
+        queue_broker.unsubscribe(subscription)
+
+
+@router.patch("/{queue_id}/priority", response_model=QueueSchema)
+def update_queue_priority(
+    queue_id: int,
+    priority_update: QueuePriorityUpdate,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Смена приоритета записи (экстренный случай, пожилой пациент).
+    Меняется одна строка: номер талона остается, позиции пересчитываются при чтении.
+    """
+    queue_entry = db.query(QueueModel).filter(QueueModel.id == queue_id).with_for_update().first()
+    if not queue_entry:
+        raise HTTPException(status_code=404, detail="Queue entry not found")
+
+    if queue_entry.priority != priority_update.priority:
+        queue_entry.priority = priority_update.priority
+        emit_queue_event(db, queue_priority_event(queue_entry))
+        db.commit()
+        db.refresh(queue_entry)
+
+    return queue_entry_data(queue_entry, queue_position(db, queue_entry))
+
+
+@router.post("/{queue_id}/call", response_model=QueueSchema)
+def call_patient(
+    queue_id: int,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Врач вызывает пациента на прием: фиксируется called_in_at.
+    Время приема (до finished_at при завершении приема) идет в оценку времени ожидания.
+    """
+    queue_entry = db.query(QueueModel).filter(QueueModel.id == queue_id).with_for_update().first()
+    if not queue_entry:
+        raise HTTPException(status_code=404, detail="Queue entry not found")
+    if current_user.role == "doctor" and queue_entry.doctor_id != current_user.id:
+        raise HTTPException(status_code=403, detail="Not authorized")
+
+    if queue_entry.called_in_at is None:
+        queue_entry.called_in_at = datetime.utcnow()
+        emit_queue_event(db, queue_call_event(queue_entry))
+        db.commit()
+        db.refresh(queue_entry)
+
+    return queue_entry_data(queue_entry, queue_position(db, queue_entry))
 
 
 @router.delete("/{queue_id}")
@@ -124,28 +379,14 @@ def remove_from_queue(
 ):
     """
     Удаление пациента из очереди.
-    После удаления номера всех следующих пациентов уменьшаются на 1.
+    Номера талонов не меняются - позиции следующих пациентов сдвигаются сами при чтении.
     """
     queue_entry = db.query(QueueModel).filter(QueueModel.id == queue_id).first()
     if not queue_entry:
         raise HTTPException(status_code=404, detail="Queue entry not found")
 
-    removed_number = queue_entry.queue_number
-    doctor_id = queue_entry.doctor_id
-    queue_date = queue_entry.queue_date
-
-    # Удаляем запись
+    emit_queue_event(db, queue_remove_event(queue_entry))
     db.delete(queue_entry)
-
-    # Пересчитываем номера для всех, кто был после удаленного
-    db.query(QueueModel).filter(
-        and_(
-            QueueModel.doctor_id == doctor_id,
-            QueueModel.queue_date == queue_date,
-            QueueModel.queue_number > removed_number
-        )
-    ).update({"queue_number": QueueModel.queue_number - 1})
-
     db.commit()
 
     return {"message": "Patient removed from queue successfully"}
@@ -173,12 +414,46 @@ def clear_doctor_queue(
             QueueModel.queue_date == queue_date
         )
     ).delete()
+    reset_queue_counter(db, doctor_id, queue_date)
+    emit_queue_event(db, queue_clear_event(doctor_id, queue_date))
 
     db.commit()
 
     return {"message": f"Queue cleared successfully. Removed {deleted_count} entries."}
 
 
+@router.get("/engine/check")
+def check_queue_engine(
+    repair: bool = Query(False, description="Rebuild the in-memory queues from the database"),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Сверка очередей в памяти воркера с таблицей queue за сегодня.
+    repair=true - перестроить движок из БД и проверить снова.
+    Доступно только для администраторов.
+    """
+    if current_user.role != "admin":
+        raise HTTPException(status_code=403, detail="Not authorized")
+
+    if repair:
+        queue_engine.rebuild(db)
+    return queue_engine.check(db)
+
+
+@router.get("/cleanup/metrics")
+def get_queue_cleanup_metrics(
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Итог последней ночной очистки в этом воркере: длительность, перенесенные строки, пачки, ошибка.
+    Доступно только для администраторов.
+    """
+    if current_user.role != "admin":
+        raise HTTPException(status_code=403, detail="Not authorized")
+    return cleanup_metrics()
+
+
 @router.post("/reset-all")
 def reset_all_queues(
     db: Session = Depends(get_db),
@@ -191,9 +466,11 @@ def reset_all_queues(
     if current_user.role != "admin":
         raise HTTPException(status_code=403, detail="Not authorized")
 
-    today = date.today()
-    deleted_count = db.query(QueueModel).filter(QueueModel.queue_date < today).delete()
-
-    db.commit()
+    result = run_queue_cleanup()
+    if result is None:
+        raise HTTPException(status_code=409, detail="Queue cleanup is already running")
 
-    return {"message": f"All old queues cleared successfully. Removed {deleted_count} entries."}
+    return {
+        "message": f"All old queues cleared successfully. Archived {result.archived} entries.",
+        **result._asdict()
+    }
@@ -1,20 +1,35 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
-from sqlalchemy import func, and_, or_
-from typing import List, Optional
+from sqlalchemy import text
+from typing import List, Optional, Tuple
 from datetime import datetime, date, timedelta
-from app.db.session import get_db
-from app.models.appointment import Appointment
-from app.models.patient import Patient
+from concurrent.futures import ThreadPoolExecutor, wait
+import logging
+from app.core.config import settings
+from app.db.session import get_db, SessionLocal
 from app.models.user import User
 from app.schemas.stats import (
     GeneralStats, AppointmentStats, PatientStats, DoctorStats,
     DailyStats, WeeklyStats, MonthlyStats, TimeRangeStats,
     DoctorPerformanceStats, StatsResponse, FinancialStats,
     DoctorFinancialStats, DailyFinancialStats, WeeklyFinancialStats,
-    MonthlyFinancialStats, TimeRangeFinancialStats, DoctorPerformanceFinancialStats
+    MonthlyFinancialStats, TimeRangeFinancialStats, DoctorPerformanceFinancialStats, AnalyticsSlice
 )
 from app.utils.dependencies import get_current_user
+from app.utils.date_buckets import clinic_today
+from app.utils.stats_cache import stats_cache, cached_stats
+from app.utils.stats_snapshot import stats_snapshot, analytics_slice
+from app.utils.stats_export import export_appointments, export_financial, export_filename, EXPORT_MEDIA_TYPES
+from app.utils.stats_aggregation import (
+    build_daily_stats, summarize_daily_stats, appointment_totals, appointment_totals_by_day,
+    appointment_totals_by_doctor, sum_revenue_by_doctor, new_patients_count, add_totals,
+    build_daily_financial_stats, build_weekly_stats, build_weekly_financial_stats,
+    build_monthly_stats, build_monthly_financial_stats, rank_doctor_days, top_doctor_days, doctor_day_stats,
+    build_doctor_day_series
+)
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
@@ -26,7 +41,7 @@ def calculate_completion_rate(completed: int, total: int) -> float:
 
 def get_date_range(days: int) -> tuple[date, date]:
     """Возвращает диапазон дат для последних N дней"""
-    end_date = date.today()
+    end_date = clinic_today()
     start_date = end_date - timedelta(days=days-1)
     return start_date, end_date
 
@@ -38,36 +53,30 @@ def get_general_stats(
     """Общая статистика системы"""
     if current_user.role != "admin":
         raise HTTPException(status_code=403, detail="Only admins can access statistics")
-    today = date.today()
+    today = clinic_today()
     
     # Общее количество пациентов
-    total_patients = db.query(Patient).count()
+    total_patients = new_patients_count(db)
     
     # Общее количество записей
-    total_appointments = db.query(Appointment).count()
+    totals = appointment_totals(db)
+    total_appointments = totals.appointments_count
     
     # Общее количество врачей
     total_doctors = db.query(User).filter(User.role == "doctor").count()
     
     # Записи на сегодня
-    appointments_today = db.query(Appointment).filter(
-        func.date(Appointment.date) == today
-    ).count()
+    today_totals = appointment_totals(db, today, today)
+    appointments_today = today_totals.appointments_count
     
     # Завершенные записи на сегодня
-    completed_today = db.query(Appointment).filter(
-        func.date(Appointment.date) == today,
-        Appointment.status == "done"
-    ).count()
+    completed_today = today_totals.completed_count
     
     # Новые пациенты сегодня
-    new_patients_today = db.query(Patient).filter(
-        func.date(Patient.created_at) == today
-    ).count()
+    new_patients_today = new_patients_count(db, today, today)
     
     # Общий процент завершения
-    completed_total = db.query(Appointment).filter(Appointment.status == "done").count()
-    completion_rate = calculate_completion_rate(completed_total, total_appointments)
+    completion_rate = calculate_completion_rate(totals.completed_count, total_appointments)
     
     return GeneralStats(
         total_patients=total_patients,
@@ -87,9 +96,10 @@ def get_appointment_stats(
     """Статистика по записям"""
     if current_user.role != "admin":
         raise HTTPException(status_code=403, detail="Only admins can access statistics")
-    total_appointments = db.query(Appointment).count()
-    completed_appointments = db.query(Appointment).filter(Appointment.status == "done").count()
-    pending_appointments = db.query(Appointment).filter(Appointment.status == "scheduled").count()
+    totals = appointment_totals(db)
+    total_appointments = totals.appointments_count
+    completed_appointments = totals.completed_count
+    pending_appointments = totals.pending_count
     completion_rate = calculate_completion_rate(completed_appointments, total_appointments)
     
     return AppointmentStats(
@@ -107,20 +117,14 @@ def get_patient_stats(
     """Статистика по пациентам"""
     if current_user.role != "admin":
         raise HTTPException(status_code=403, detail="Only admins can access statistics")
-    today = date.today()
+    today = clinic_today()
     week_ago = today - timedelta(days=7)
     month_ago = today - timedelta(days=30)
     
-    total_patients = db.query(Patient).count()
-    new_patients_today = db.query(Patient).filter(
-        func.date(Patient.created_at) == today
-    ).count()
-    new_patients_this_week = db.query(Patient).filter(
-        func.date(Patient.created_at) >= week_ago
-    ).count()
-    new_patients_this_month = db.query(Patient).filter(
-        func.date(Patient.created_at) >= month_ago
-    ).count()
+    total_patients = new_patients_count(db)
+    new_patients_today = new_patients_count(db, today, today)
+    new_patients_this_week = new_patients_count(db, week_ago)
+    new_patients_this_month = new_patients_count(db, month_ago)
     
     return PatientStats(
         total_patients=total_patients,
@@ -137,27 +141,17 @@ def get_doctors_stats(
     """Статистика по врачам"""
     if current_user.role != "admin":
         raise HTTPException(status_code=403, detail="Only admins can access statistics")
-    doctors = db.query(User).filter(User.role == "doctor").all()
     stats = []
     
-    for doctor in doctors:
-        total_appointments = db.query(Appointment).filter(Appointment.doctor_id == doctor.id).count()
-        completed_appointments = db.query(Appointment).filter(
-            Appointment.doctor_id == doctor.id,
-            Appointment.status == "done"
-        ).count()
-        pending_appointments = db.query(Appointment).filter(
-            Appointment.doctor_id == doctor.id,
-            Appointment.status == "scheduled"
-        ).count()
-        completion_rate = calculate_completion_rate(completed_appointments, total_appointments)
+    for doctor_id, doctor_name, totals in appointment_totals_by_doctor(db):
+        completion_rate = calculate_completion_rate(totals.completed_count, totals.appointments_count)
         
         stats.append(DoctorStats(
-            doctor_id=doctor.id,
-            doctor_name=doctor.full_name,
-            total_appointments=total_appointments,
-            completed_appointments=completed_appointments,
-            pending_appointments=pending_appointments,
+            doctor_id=doctor_id,
+            doctor_name=doctor_name,
+            total_appointments=totals.appointments_count,
+            completed_appointments=totals.completed_count,
+            pending_appointments=totals.pending_count,
             completion_rate=completion_rate
         ))
     
@@ -174,34 +168,7 @@ def get_daily_stats(
         raise HTTPException(status_code=403, detail="Only admins can access statistics")
     start_date, end_date = get_date_range(days)
     
-    # Получаем все даты в диапазоне
-    current_date = start_date
-    daily_stats = []
-    
-    while current_date <= end_date:
-        appointments_count = db.query(Appointment).filter(
-            func.date(Appointment.date) == current_date
-        ).count()
-        
-        completed_count = db.query(Appointment).filter(
-            func.date(Appointment.date) == current_date,
-            Appointment.status == "done"
-        ).count()
-        
-        new_patients_count = db.query(Patient).filter(
-            func.date(Patient.created_at) == current_date
-        ).count()
-        
-        daily_stats.append(DailyStats(
-            date=current_date,
-            appointments_count=appointments_count,
-            completed_count=completed_count,
-            new_patients_count=new_patients_count
-        ))
-        
-        current_date += timedelta(days=1)
-    
-    return daily_stats
+    return build_daily_stats(db, start_date, end_date)
 
 @router.get("/weekly", response_model=List[WeeklyStats])
 def get_weekly_stats(
@@ -212,66 +179,32 @@ def get_weekly_stats(
     """Недельная статистика"""
     if current_user.role != "admin":
         raise HTTPException(status_code=403, detail="Only admins can access statistics")
-    today = date.today()
+    today = clinic_today()
+    
+    # Все недели покрываются одним непрерывным диапазоном дней
+    range_start = today - timedelta(weeks=weeks - 1, days=6)
+    daily_by_date = {day.date: day for day in build_daily_stats(db, range_start, today)}
     weekly_stats = []
     
     for i in range(weeks):
         week_end = today - timedelta(weeks=i)
         week_start = week_end - timedelta(days=6)
-        
-        appointments_count = db.query(Appointment).filter(
-            func.date(Appointment.date) >= week_start,
-            func.date(Appointment.date) <= week_end
-        ).count()
-        
-        completed_count = db.query(Appointment).filter(
-            func.date(Appointment.date) >= week_start,
-            func.date(Appointment.date) <= week_end,
-            Appointment.status == "done"
-        ).count()
-        
-        new_patients_count = db.query(Patient).filter(
-            func.date(Patient.created_at) >= week_start,
-            func.date(Patient.created_at) <= week_end
-        ).count()
-        
-        # Детализация по дням недели
-        daily_breakdown = []
-        current_date = week_start
-        while current_date <= week_end:
-            day_appointments = db.query(Appointment).filter(
-                func.date(Appointment.date) == current_date
-            ).count()
-            
-            day_completed = db.query(Appointment).filter(
-                func.date(Appointment.date) == current_date,
-                Appointment.status == "done"
-            ).count()
-            
-            day_new_patients = db.query(Patient).filter(
-                func.date(Patient.created_at) == current_date
-            ).count()
-            
-            daily_breakdown.append(DailyStats(
-                date=current_date,
-                appointments_count=day_appointments,
-                completed_count=day_completed,
-                new_patients_count=day_new_patients
-            ))
-            
-            current_date += timedelta(days=1)
-        
-        weekly_stats.append(WeeklyStats(
-            week_start=week_start,
-            week_end=week_end,
-            appointments_count=appointments_count,
-            completed_count=completed_count,
-            new_patients_count=new_patients_count,
-            daily_breakdown=daily_breakdown
-        ))
+        weekly_stats.append(build_weekly_stats(daily_by_date, week_start, week_end))
     
     return weekly_stats
 
+@router.get("/monthly", response_model=List[MonthlyStats])
+def get_monthly_stats(
+    months: int = Query(6, ge=1, le=60, description="Количество месяцев для анализа"),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Месячная статистика с детализацией по неделям и дням"""
+    if current_user.role != "admin":
+        raise HTTPException(status_code=403, detail="Only admins can access statistics")
+    
+    return build_monthly_stats(db, clinic_today(), months)
+
 @router.get("/time-range", response_model=TimeRangeStats)
 def get_time_range_stats(
     start_date: date = Query(..., description="Начальная дата"),
@@ -285,49 +218,10 @@ def get_time_range_stats(
     if start_date > end_date:
         raise HTTPException(status_code=400, detail="Start date must be before end date")
     
-    appointments_count = db.query(Appointment).filter(
-        func.date(Appointment.date) >= start_date,
-        func.date(Appointment.date) <= end_date
-    ).count()
-    
-    completed_count = db.query(Appointment).filter(
-        func.date(Appointment.date) >= start_date,
-        func.date(Appointment.date) <= end_date,
-        Appointment.status == "done"
-    ).count()
-    
-    new_patients_count = db.query(Patient).filter(
-        func.date(Patient.created_at) >= start_date,
-        func.date(Patient.created_at) <= end_date
-    ).count()
-    
-    completion_rate = calculate_completion_rate(completed_count, appointments_count)
-    
     # Детализация по дням
-    daily_breakdown = []
-    current_date = start_date
-    while current_date <= end_date:
-        day_appointments = db.query(Appointment).filter(
-            func.date(Appointment.date) == current_date
-        ).count()
-        
-        day_completed = db.query(Appointment).filter(
-            func.date(Appointment.date) == current_date,
-            Appointment.status == "done"
-        ).count()
-        
-        day_new_patients = db.query(Patient).filter(
-            func.date(Patient.created_at) == current_date
-        ).count()
-        
-        daily_breakdown.append(DailyStats(
-            date=current_date,
-            appointments_count=day_appointments,
-            completed_count=day_completed,
-            new_patients_count=day_new_patients
-        ))
-        
-        current_date += timedelta(days=1)
+    daily_breakdown = build_daily_stats(db, start_date, end_date)
+    appointments_count, completed_count, new_patients_count = summarize_daily_stats(daily_breakdown)
+    completion_rate = calculate_completion_rate(completed_count, appointments_count)
     
     return TimeRangeStats(
         start_date=start_date,
@@ -342,6 +236,8 @@ def get_time_range_stats(
 @router.get("/doctor-performance", response_model=List[DoctorPerformanceStats])
 def get_doctor_performance(
     days: int = Query(30, ge=1, le=365, description="Количество дней для анализа"),
+    top_n: Optional[int] = Query(None, ge=1, le=31, description="Вернуть N самых загруженных дней"),
+    include_series: bool = Query(False, description="Вернуть ряд по дням"),
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
@@ -349,138 +245,239 @@ def get_doctor_performance(
     if current_user.role != "admin":
         raise HTTPException(status_code=403, detail="Only admins can access statistics")
     start_date, end_date = get_date_range(days)
-    doctors = db.query(User).filter(User.role == "doctor").all()
+    
+    # Рейтинг дней всех врачей одним запросом (оконная функция)
+    days_by_doctor = rank_doctor_days(
+        db, start_date, end_date, order_by="appointments",
+        max_rank=None if include_series else (top_n or 1)
+    )
     performance_stats = []
     
-    for doctor in doctors:
-        total_appointments = db.query(Appointment).filter(
-            Appointment.doctor_id == doctor.id,
-            func.date(Appointment.date) >= start_date,
-            func.date(Appointment.date) <= end_date
-        ).count()
-        
-        completed_appointments = db.query(Appointment).filter(
-            Appointment.doctor_id == doctor.id,
-            func.date(Appointment.date) >= start_date,
-            func.date(Appointment.date) <= end_date,
-            Appointment.status == "done"
-        ).count()
+    for doctor_id, doctor_name, totals in appointment_totals_by_doctor(db, start_date, end_date):
+        total_appointments = totals.appointments_count
+        completed_appointments = totals.completed_count
         
         completion_rate = calculate_completion_rate(completed_appointments, total_appointments)
         average_per_day = round(total_appointments / days, 2) if days > 0 else 0
         
-        # Находим самый продуктивный день
-        daily_counts = db.query(
-            func.date(Appointment.date).label('appointment_date'),
-            func.count(Appointment.id).label('count')
-        ).filter(
-            Appointment.doctor_id == doctor.id,
-            func.date(Appointment.date) >= start_date,
-            func.date(Appointment.date) <= end_date
-        ).group_by(func.date(Appointment.date)).all()
-        
-        most_productive_day = None
-        max_count = 0
-        for day, count in daily_counts:
-            if count > max_count:
-                max_count = count
-                most_productive_day = day.strftime('%Y-%m-%d')
+        # Самый продуктивный день - первое место в рейтинге
+        doctor_days = days_by_doctor.get(doctor_id, [])
+        top_days = top_doctor_days(doctor_days, top_n or 1, order_by="appointments")
+        most_productive_day = top_days[0].stat_date.strftime('%Y-%m-%d') if top_days else None
         
         performance_stats.append(DoctorPerformanceStats(
-            doctor_id=doctor.id,
-            doctor_name=doctor.full_name,
+            doctor_id=doctor_id,
+            doctor_name=doctor_name,
             total_appointments=total_appointments,
             completed_appointments=completed_appointments,
             completion_rate=completion_rate,
             average_appointments_per_day=average_per_day,
-            most_productive_day=most_productive_day
+            most_productive_day=most_productive_day,
+            top_days=[doctor_day_stats(day) for day in top_days] if top_n else None,
+            daily_series=build_doctor_day_series(doctor_days, start_date, end_date) if include_series else None
         ))
     
     return performance_stats
 
+# Разделы /stats/overview выполняются параллельно, каждый на своем соединении из пула
+overview_executor = ThreadPoolExecutor(
+    max_workers=settings.stats_overview_workers,
+    thread_name_prefix="stats-overview"
+)
+
+def _run_sub_report(report, args: tuple, current_user: User):
+    """Выполняет раздел отчета в отдельной сессии"""
+    db = SessionLocal()
+    try:
+        if db.get_bind().dialect.name == "postgresql":
+            # БД сама прервет запрос, который не уложился в таймаут раздела
+            timeout_ms = int(settings.stats_overview_timeout_seconds * 1000)
+            db.execute(text(f"SET LOCAL statement_timeout = {timeout_ms}"))
+        return report(*args, db, current_user)
+    finally:
+        db.close()
+
+def run_sub_reports(sections: dict, current_user: User) -> Tuple[dict, List[str]]:
+    """
+    Параллельно выполняет разделы {имя: (функция, аргументы)}.
+    Возвращает (результаты, имена разделов с таймаутом или ошибкой).
+    """
+    futures = {
+        name: overview_executor.submit(_run_sub_report, report, args, current_user)
+        for name, (report, args) in sections.items()
+    }
+    done, _ = wait(futures.values(), timeout=settings.stats_overview_timeout_seconds)
+    
+    results = {}
+    failed_sections = []
+    for name, future in futures.items():
+        if future not in done:
+            future.cancel()
+            logger.warning(f"⚠️ Stats overview section '{name}' timed out")
+            failed_sections.append(name)
+        elif future.exception() is not None:
+            logger.error(f"❌ Stats overview section '{name}' failed: {future.exception()}")
+            failed_sections.append(name)
+        else:
+            results[name] = future.result()
+    
+    return results, failed_sections
+
 @router.get("/overview", response_model=StatsResponse)
 def get_stats_overview(
+    request: Request,
+    response: Response,
     start_date: Optional[date] = Query(None, description="Начальная дата для детализации"),
     end_date: Optional[date] = Query(None, description="Конечная дата для детализации"),
-    db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
     """Общий обзор статистики"""
     if current_user.role != "admin":
         raise HTTPException(status_code=403, detail="Only admins can access statistics")
-    # Получаем общую статистику
-    general_stats = get_general_stats(db, current_user)
-    appointment_stats = get_appointment_stats(db, current_user)
-    patient_stats = get_patient_stats(db, current_user)
-    doctor_stats = get_doctors_stats(db, current_user)
-    
-    # Если указан диапазон дат, добавляем детализацию
-    time_range_stats = None
-    if start_date and end_date:
-        time_range_stats = get_time_range_stats(start_date, end_date, db, current_user)
-    
-    return StatsResponse(
-        general=general_stats,
-        appointments=appointment_stats,
-        patients=patient_stats,
-        doctors=doctor_stats,
-        time_range=time_range_stats
+    
+    def compute():
+        sections = {
+            "general": (get_general_stats, ()),
+            "appointments": (get_appointment_stats, ()),
+            "patients": (get_patient_stats, ()),
+            "doctors": (get_doctors_stats, ()),
+        }
+        
+        # Если указан диапазон дат, добавляем детализацию
+        if start_date and end_date:
+            sections["time_range"] = (get_time_range_stats, (start_date, end_date))
+        
+        results, failed_sections = run_sub_reports(sections, current_user)
+        return StatsResponse(**results, failed_sections=failed_sections)
+    
+    # Неполный ответ не кэшируется
+    return cached_stats(
+        request, response, ("overview", clinic_today(), start_date, end_date), compute,
+        should_cache=lambda stats: not stats.failed_sections
+    )
+
+@router.get("/cache")
+def get_stats_cache_metrics(
+    current_user: User = Depends(get_current_user)
+):
+    """Метрики кэша статистики (попадания, промахи, вытеснения)"""
+    if current_user.role != "admin":
+        raise HTTPException(status_code=403, detail="Only admins can access statistics")
+    return stats_cache.metrics()
+
+@router.get("/analytics/slice", response_model=AnalyticsSlice)
+def get_analytics_slice(
+    start_date: Optional[date] = Query(None, description="Начальная дата"),
+    end_date: Optional[date] = Query(None, description="Конечная дата"),
+    doctor_id: Optional[int] = Query(None, description="Только записи врача"),
+    status: Optional[str] = Query(None, description="Только записи со статусом"),
+    group_by: Optional[str] = Query(None, pattern="^(day|doctor|status)$", description="Группировка: day, doctor, status"),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Произвольный срез записей и выручки (из снимка в памяти или дневной сводки)"""
+    if current_user.role != "admin":
+        raise HTTPException(status_code=403, detail="Only admins can access statistics")
+    if start_date and end_date and start_date > end_date:
+        raise HTTPException(status_code=400, detail="Start date must be before end date")
+    
+    return analytics_slice(db, start_date, end_date, doctor_id, status, group_by)
+
+@router.get("/analytics/snapshot")
+def get_analytics_snapshot_metrics(
+    current_user: User = Depends(get_current_user)
+):
+    """Состояние колоночного снимка (строки, память, возраст, водяной знак)"""
+    if current_user.role != "admin":
+        raise HTTPException(status_code=403, detail="Only admins can access statistics")
+    return stats_snapshot.metrics()
+
+# Выгрузки (потоковые, память не зависит от размера)
+
+EXPORT_ROLES = ("admin", "reception")
+
+def _export_response(content, name: str, export_format: str, start_date: Optional[date], end_date: Optional[date]):
+    filename = export_filename(name, export_format, start_date, end_date)
+    return StreamingResponse(
+        content,
+        media_type=EXPORT_MEDIA_TYPES[export_format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+@router.get("/export/appointments")
+def export_appointments_ledger(
+    format: str = Query("csv", pattern="^(csv|ndjson)$", description="Формат: csv или ndjson"),
+    start_date: Optional[date] = Query(None, description="Начальная дата"),
+    end_date: Optional[date] = Query(None, description="Конечная дата"),
+    doctor_id: Optional[int] = Query(None, description="Только записи врача"),
+    status: Optional[str] = Query(None, description="Только записи со статусом"),
+    current_user: User = Depends(get_current_user)
+):
+    """Выгрузка записей (id, дата, врач, пациент, статус, стоимость)"""
+    if current_user.role not in EXPORT_ROLES:
+        raise HTTPException(status_code=403, detail="Not authorized")
+    if start_date and end_date and start_date > end_date:
+        raise HTTPException(status_code=400, detail="Start date must be before end date")
+    
+    return _export_response(
+        export_appointments(format, start_date, end_date, doctor_id, status),
+        "appointments", format, start_date, end_date
+    )
+
+@router.get("/export/financial")
+def export_financial_stats(
+    format: str = Query("csv", pattern="^(csv|ndjson)$", description="Формат: csv или ndjson"),
+    start_date: Optional[date] = Query(None, description="Начальная дата"),
+    end_date: Optional[date] = Query(None, description="Конечная дата"),
+    doctor_id: Optional[int] = Query(None, description="Только выручка врача"),
+    current_user: User = Depends(get_current_user)
+):
+    """Выгрузка дневной выручки по врачам"""
+    if current_user.role not in EXPORT_ROLES:
+        raise HTTPException(status_code=403, detail="Not authorized")
+    if start_date and end_date and start_date > end_date:
+        raise HTTPException(status_code=400, detail="Start date must be before end date")
+    
+    return _export_response(
+        export_financial(format, start_date, end_date, doctor_id),
+        "financial", format, start_date, end_date
     )
 
 # Финансовые эндпоинты
 
 @router.get("/financial", response_model=FinancialStats)
 def get_financial_stats(
+    request: Request,
+    response: Response,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
     """Общая финансовая статистика"""
     if current_user.role != "admin":
         raise HTTPException(status_code=403, detail="Only admins can access statistics")
-    today = date.today()
+    today = clinic_today()
     week_ago = today - timedelta(days=7)
     month_ago = today - timedelta(days=30)
     
-    # Общая выручка
-    total_revenue = db.query(func.coalesce(func.sum(Appointment.cost), 0)).scalar()
-    
-    # Выручка от завершенных записей
-    completed_revenue = db.query(func.coalesce(func.sum(Appointment.cost), 0)).filter(
-        Appointment.status == "done"
-    ).scalar()
-    
-    # Выручка от ожидающих записей
-    pending_revenue = db.query(func.coalesce(func.sum(Appointment.cost), 0)).filter(
-        Appointment.status == "scheduled"
-    ).scalar()
-    
-    # Средняя стоимость приема
-    avg_cost = db.query(func.coalesce(func.avg(Appointment.cost), 0)).scalar()
-    
-    # Выручка сегодня
-    revenue_today = db.query(func.coalesce(func.sum(Appointment.cost), 0)).filter(
-        func.date(Appointment.date) == today
-    ).scalar()
-    
-    # Выручка за неделю
-    revenue_this_week = db.query(func.coalesce(func.sum(Appointment.cost), 0)).filter(
-        func.date(Appointment.date) >= week_ago
-    ).scalar()
-    
-    # Выручка за месяц
-    revenue_this_month = db.query(func.coalesce(func.sum(Appointment.cost), 0)).filter(
-        func.date(Appointment.date) >= month_ago
-    ).scalar()
-    
-    return FinancialStats(
-        total_revenue=total_revenue,
-        completed_revenue=completed_revenue,
-        pending_revenue=pending_revenue,
-        average_appointment_cost=avg_cost,
-        revenue_today=revenue_today,
-        revenue_this_week=revenue_this_week,
-        revenue_this_month=revenue_this_month
-    )
+    def compute():
+        totals = appointment_totals(db)
+        
+        # Выручка сегодня, за неделю, за месяц
+        revenue_today = appointment_totals(db, today, today).revenue
+        revenue_this_week = appointment_totals(db, week_ago).revenue
+        revenue_this_month = appointment_totals(db, month_ago).revenue
+        
+        return FinancialStats(
+            total_revenue=totals.revenue,
+            completed_revenue=totals.completed_revenue,
+            pending_revenue=totals.pending_revenue,
+            average_appointment_cost=totals.average_cost,
+            revenue_today=revenue_today,
+            revenue_this_week=revenue_this_week,
+            revenue_this_month=revenue_this_month
+        )
+    
+    return cached_stats(request, response, ("financial", today), compute)
 
 @router.get("/financial/doctors", response_model=List[DoctorFinancialStats])
 def get_doctors_financial_stats(
@@ -490,65 +487,23 @@ def get_doctors_financial_stats(
     """Финансовая статистика по врачам"""
     if current_user.role != "admin":
         raise HTTPException(status_code=403, detail="Only admins can access statistics")
-    today = date.today()
+    today = clinic_today()
     week_ago = today - timedelta(days=7)
     month_ago = today - timedelta(days=30)
     
-    doctors = db.query(User).filter(User.role == "doctor").all()
     stats = []
     
-    for doctor in doctors:
-        # Общая выручка врача
-        total_revenue = db.query(func.coalesce(func.sum(Appointment.cost), 0)).filter(
-            Appointment.doctor_id == doctor.id
-        ).scalar()
-        
-        # Выручка от завершенных записей
-        completed_revenue = db.query(func.coalesce(func.sum(Appointment.cost), 0)).filter(
-            Appointment.doctor_id == doctor.id,
-            Appointment.status == "done"
-        ).scalar()
-        
-        # Выручка от ожидающих записей
-        pending_revenue = db.query(func.coalesce(func.sum(Appointment.cost), 0)).filter(
-            Appointment.doctor_id == doctor.id,
-            Appointment.status == "scheduled"
-        ).scalar()
-        
-        # Средняя стоимость приема
-        avg_cost = db.query(func.coalesce(func.avg(Appointment.cost), 0)).filter(
-            Appointment.doctor_id == doctor.id
-        ).scalar()
-        
-        # Количество записей
-        appointments_count = db.query(Appointment).filter(Appointment.doctor_id == doctor.id).count()
-        
-        # Выручка сегодня
-        revenue_today = db.query(func.coalesce(func.sum(Appointment.cost), 0)).filter(
-            Appointment.doctor_id == doctor.id,
-            func.date(Appointment.date) == today
-        ).scalar()
-        
-        # Выручка за неделю
-        revenue_this_week = db.query(func.coalesce(func.sum(Appointment.cost), 0)).filter(
-            Appointment.doctor_id == doctor.id,
-            func.date(Appointment.date) >= week_ago
-        ).scalar()
-        
-        # Выручка за месяц
-        revenue_this_month = db.query(func.coalesce(func.sum(Appointment.cost), 0)).filter(
-            Appointment.doctor_id == doctor.id,
-            func.date(Appointment.date) >= month_ago
-        ).scalar()
-        
+    # Все показатели всех врачей - одним сгруппированным запросом
+    for doctor_id, doctor_name, totals, revenue_today, revenue_this_week, revenue_this_month in sum_revenue_by_doctor(
+            db, today, week_ago, month_ago):
         stats.append(DoctorFinancialStats(
-            doctor_id=doctor.id,
-            doctor_name=doctor.full_name,
-            total_revenue=total_revenue,
-            completed_revenue=completed_revenue,
-            pending_revenue=pending_revenue,
-            average_appointment_cost=avg_cost,
-            appointments_count=appointments_count,
+            doctor_id=doctor_id,
+            doctor_name=doctor_name,
+            total_revenue=totals.revenue,
+            completed_revenue=totals.completed_revenue,
+            pending_revenue=totals.pending_revenue,
+            average_appointment_cost=totals.average_cost,
+            appointments_count=totals.appointments_count,
             revenue_today=revenue_today,
             revenue_this_week=revenue_this_week,
             revenue_this_month=revenue_this_month
@@ -567,42 +522,9 @@ def get_daily_financial_stats(
         raise HTTPException(status_code=403, detail="Only admins can access statistics")
     start_date, end_date = get_date_range(days)
     
-    current_date = start_date
-    daily_stats = []
-    
-    while current_date <= end_date:
-        # Общая выручка за день
-        revenue = db.query(func.coalesce(func.sum(Appointment.cost), 0)).filter(
-            func.date(Appointment.date) == current_date
-        ).scalar()
-        
-        # Выручка от завершенных записей
-        completed_revenue = db.query(func.coalesce(func.sum(Appointment.cost), 0)).filter(
-            func.date(Appointment.date) == current_date,
-            Appointment.status == "done"
-        ).scalar()
-        
-        # Количество записей
-        appointments_count = db.query(Appointment).filter(
-            func.date(Appointment.date) == current_date
-        ).count()
-        
-        # Средняя стоимость
-        avg_cost = db.query(func.coalesce(func.avg(Appointment.cost), 0)).filter(
-            func.date(Appointment.date) == current_date
-        ).scalar()
-        
-        daily_stats.append(DailyFinancialStats(
-            date=current_date,
-            revenue=revenue,
-            completed_revenue=completed_revenue,
-            appointments_count=appointments_count,
-            average_cost=avg_cost
-        ))
-        
-        current_date += timedelta(days=1)
+    totals_by_day = appointment_totals_by_day(db, start_date, end_date)
     
-    return daily_stats
+    return build_daily_financial_stats(totals_by_day, start_date, end_date)
 
 @router.get("/financial/weekly", response_model=List[WeeklyFinancialStats])
 def get_weekly_financial_stats(
@@ -613,81 +535,32 @@ def get_weekly_financial_stats(
     """Недельная финансовая статистика"""
     if current_user.role != "admin":
         raise HTTPException(status_code=403, detail="Only admins can access statistics")
-    today = date.today()
+    today = clinic_today()
+    
+    # Все недели покрываются одним непрерывным диапазоном дней
+    range_start = today - timedelta(weeks=weeks - 1, days=6)
+    totals_by_day = appointment_totals_by_day(db, range_start, today)
     weekly_stats = []
     
     for i in range(weeks):
         week_end = today - timedelta(weeks=i)
         week_start = week_end - timedelta(days=6)
-        
-        # Общая выручка за неделю
-        total_revenue = db.query(func.coalesce(func.sum(Appointment.cost), 0)).filter(
-            func.date(Appointment.date) >= week_start,
-            func.date(Appointment.date) <= week_end
-        ).scalar()
-        
-        # Выручка от завершенных записей
-        completed_revenue = db.query(func.coalesce(func.sum(Appointment.cost), 0)).filter(
-            func.date(Appointment.date) >= week_start,
-            func.date(Appointment.date) <= week_end,
-            Appointment.status == "done"
-        ).scalar()
-        
-        # Количество записей
-        appointments_count = db.query(Appointment).filter(
-            func.date(Appointment.date) >= week_start,
-            func.date(Appointment.date) <= week_end
-        ).count()
-        
-        # Средняя стоимость
-        avg_cost = db.query(func.coalesce(func.avg(Appointment.cost), 0)).filter(
-            func.date(Appointment.date) >= week_start,
-            func.date(Appointment.date) <= week_end
-        ).scalar()
-        
-        # Детализация по дням недели
-        daily_breakdown = []
-        current_date = week_start
-        while current_date <= week_end:
-            day_revenue = db.query(func.coalesce(func.sum(Appointment.cost), 0)).filter(
-                func.date(Appointment.date) == current_date
-            ).scalar()
-            
-            day_completed_revenue = db.query(func.coalesce(func.sum(Appointment.cost), 0)).filter(
-                func.date(Appointment.date) == current_date,
-                Appointment.status == "done"
-            ).scalar()
-            
-            day_appointments = db.query(Appointment).filter(
-                func.date(Appointment.date) == current_date
-            ).count()
-            
-            day_avg_cost = db.query(func.coalesce(func.avg(Appointment.cost), 0)).filter(
-                func.date(Appointment.date) == current_date
-            ).scalar()
-            
-            daily_breakdown.append(DailyFinancialStats(
-                date=current_date,
-                revenue=day_revenue,
-                completed_revenue=day_completed_revenue,
-                appointments_count=day_appointments,
-                average_cost=day_avg_cost
-            ))
-            
-            current_date += timedelta(days=1)
-        
-        weekly_stats.append(WeeklyFinancialStats(
-            week_start=week_start,
-            week_end=week_end,
-            total_revenue=total_revenue,
-            completed_revenue=completed_revenue,
-            appointments_count=appointments_count,
-            average_cost=avg_cost,
-            daily_breakdown=daily_breakdown
-        ))
+        weekly_stats.append(build_weekly_financial_stats(totals_by_day, week_start, week_end))
     
     return weekly_stats
 
+@router.get("/financial/monthly", response_model=List[MonthlyFinancialStats])
+def get_monthly_financial_stats(
+    months: int = Query(6, ge=1, le=60, description="Количество месяцев для анализа"),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Месячная финансовая статистика с детализацией по неделям и дням"""
+    if current_user.role != "admin":
+        raise HTTPException(status_code=403, detail="Only admins can access statistics")
+    
+    return build_monthly_financial_stats(db, clinic_today(), months)
+
 @router.get("/financial/time-range", response_model=TimeRangeFinancialStats)
 def get_time_range_financial_stats(
     start_date: date = Query(..., description="Начальная дата"),
@@ -701,83 +574,28 @@ def get_time_range_financial_stats(
     if start_date > end_date:
         raise HTTPException(status_code=400, detail="Start date must be before end date")
     
-    # Общая выручка за период
-    total_revenue = db.query(func.coalesce(func.sum(Appointment.cost), 0)).filter(
-        func.date(Appointment.date) >= start_date,
-        func.date(Appointment.date) <= end_date
-    ).scalar()
-    
-    # Выручка от завершенных записей
-    completed_revenue = db.query(func.coalesce(func.sum(Appointment.cost), 0)).filter(
-        func.date(Appointment.date) >= start_date,
-        func.date(Appointment.date) <= end_date,
-        Appointment.status == "done"
-    ).scalar()
-    
-    # Выручка от ожидающих записей
-    pending_revenue = db.query(func.coalesce(func.sum(Appointment.cost), 0)).filter(
-        func.date(Appointment.date) >= start_date,
-        func.date(Appointment.date) <= end_date,
-        Appointment.status == "scheduled"
-    ).scalar()
-    
-    # Количество записей
-    appointments_count = db.query(Appointment).filter(
-        func.date(Appointment.date) >= start_date,
-        func.date(Appointment.date) <= end_date
-    ).count()
-    
-    # Средняя стоимость
-    avg_cost = db.query(func.coalesce(func.avg(Appointment.cost), 0)).filter(
-        func.date(Appointment.date) >= start_date,
-        func.date(Appointment.date) <= end_date
-    ).scalar()
+    totals_by_day = appointment_totals_by_day(db, start_date, end_date)
+    totals = add_totals(totals_by_day.values())
     
     # Детализация по дням
-    daily_breakdown = []
-    current_date = start_date
-    while current_date <= end_date:
-        day_revenue = db.query(func.coalesce(func.sum(Appointment.cost), 0)).filter(
-            func.date(Appointment.date) == current_date
-        ).scalar()
-        
-        day_completed_revenue = db.query(func.coalesce(func.sum(Appointment.cost), 0)).filter(
-            func.date(Appointment.date) == current_date,
-            Appointment.status == "done"
-        ).scalar()
-        
-        day_appointments = db.query(Appointment).filter(
-            func.date(Appointment.date) == current_date
-        ).count()
-        
-        day_avg_cost = db.query(func.coalesce(func.avg(Appointment.cost), 0)).filter(
-            func.date(Appointment.date) == current_date
-        ).scalar()
-        
-        daily_breakdown.append(DailyFinancialStats(
-            date=current_date,
-            revenue=day_revenue,
-            completed_revenue=day_completed_revenue,
-            appointments_count=day_appointments,
-            average_cost=day_avg_cost
-        ))
-        
-        current_date += timedelta(days=1)
+    daily_breakdown = build_daily_financial_stats(totals_by_day, start_date, end_date)
     
     return TimeRangeFinancialStats(
         start_date=start_date,
         end_date=end_date,
-        total_revenue=total_revenue,
-        completed_revenue=completed_revenue,
-        pending_revenue=pending_revenue,
-        appointments_count=appointments_count,
-        average_cost=avg_cost,
+        total_revenue=totals.revenue,
+        completed_revenue=totals.completed_revenue,
+        pending_revenue=totals.pending_revenue,
+        appointments_count=totals.appointments_count,
+        average_cost=totals.average_cost,
         daily_breakdown=daily_breakdown
     )
 
 @router.get("/financial/doctor-performance", response_model=List[DoctorPerformanceFinancialStats])
 def get_doctor_performance_financial(
     days: int = Query(30, ge=1, le=365, description="Количество дней для анализа"),
+    top_n: Optional[int] = Query(None, ge=1, le=31, description="Вернуть N самых прибыльных дней"),
+    include_series: bool = Query(False, description="Вернуть ряд выручки по дням"),
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
@@ -785,71 +603,42 @@ def get_doctor_performance_financial(
     if current_user.role != "admin":
         raise HTTPException(status_code=403, detail="Only admins can access statistics")
     start_date, end_date = get_date_range(days)
-    doctors = db.query(User).filter(User.role == "doctor").all()
+    
+    # Рейтинг дней всех врачей по выручке одним запросом (оконная функция)
+    days_by_doctor = rank_doctor_days(
+        db, start_date, end_date, order_by="revenue",
+        max_rank=None if include_series else (top_n or 1)
+    )
     performance_stats = []
     
-    for doctor in doctors:
-        # Общая выручка врача за период
-        total_revenue = db.query(func.coalesce(func.sum(Appointment.cost), 0)).filter(
-            Appointment.doctor_id == doctor.id,
-            func.date(Appointment.date) >= start_date,
-            func.date(Appointment.date) <= end_date
-        ).scalar()
-        
-        # Выручка от завершенных записей
-        completed_revenue = db.query(func.coalesce(func.sum(Appointment.cost), 0)).filter(
-            Appointment.doctor_id == doctor.id,
-            func.date(Appointment.date) >= start_date,
-            func.date(Appointment.date) <= end_date,
-            Appointment.status == "done"
-        ).scalar()
-        
-        # Количество записей
-        appointments_count = db.query(Appointment).filter(
-            Appointment.doctor_id == doctor.id,
-            func.date(Appointment.date) >= start_date,
-            func.date(Appointment.date) <= end_date
-        ).count()
-        
-        # Средняя стоимость приема
-        avg_appointment_value = db.query(func.coalesce(func.avg(Appointment.cost), 0)).filter(
-            Appointment.doctor_id == doctor.id,
-            func.date(Appointment.date) >= start_date,
-            func.date(Appointment.date) <= end_date
-        ).scalar()
+    for doctor_id, doctor_name, totals in appointment_totals_by_doctor(db, start_date, end_date):
+        # Выручка, количество записей и средняя стоимость врача за период
+        total_revenue = totals.revenue
+        completed_revenue = totals.completed_revenue
+        appointments_count = totals.appointments_count
+        avg_appointment_value = totals.average_cost
         
         # Средняя дневная выручка
         average_daily_revenue = round(float(total_revenue) / days, 2) if days > 0 else 0
         
-        # Самый прибыльный день
-        daily_revenue = db.query(
-            func.date(Appointment.date).label('appointment_date'),
-            func.coalesce(func.sum(Appointment.cost), 0).label('revenue')
-        ).filter(
-            Appointment.doctor_id == doctor.id,
-            func.date(Appointment.date) >= start_date,
-            func.date(Appointment.date) <= end_date
-        ).group_by(func.date(Appointment.date)).all()
-        
-        most_profitable_day = None
-        most_profitable_day_revenue = None
-        max_revenue = 0
-        for day, revenue in daily_revenue:
-            if revenue > max_revenue:
-                max_revenue = revenue
-                most_profitable_day = day.strftime('%Y-%m-%d')
-                most_profitable_day_revenue = revenue
+        # Самый прибыльный день - первое место в рейтинге
+        doctor_days = days_by_doctor.get(doctor_id, [])
+        top_days = top_doctor_days(doctor_days, top_n or 1, order_by="revenue")
+        most_profitable_day = top_days[0].stat_date.strftime('%Y-%m-%d') if top_days else None
+        most_profitable_day_revenue = top_days[0].revenue if top_days else None
         
         performance_stats.append(DoctorPerformanceFinancialStats(
-            doctor_id=doctor.id,
-            doctor_name=doctor.full_name,
+            doctor_id=doctor_id,
+            doctor_name=doctor_name,
             total_revenue=total_revenue,
             completed_revenue=completed_revenue,
             average_daily_revenue=average_daily_revenue,
             most_profitable_day=most_profitable_day,
             most_profitable_day_revenue=most_profitable_day_revenue,
             appointments_count=appointments_count,
-            average_appointment_value=avg_appointment_value
+            average_appointment_value=avg_appointment_value,
+            top_days=[doctor_day_stats(day) for day in top_days] if top_n else None,
+            daily_series=build_doctor_day_series(doctor_days, start_date, end_date) if include_series else None
         ))
     
     return performance_stats
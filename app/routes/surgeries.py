@@ -1,12 +1,15 @@
 from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.orm import Session
 from typing import List, Optional
+from datetime import date
 from app.db.session import get_db
 from app.schemas.surgery import SurgeryCreate, Surgery, SurgeryUpdate, SurgeryWithDetails, SurgeryListResponse
 from app.models.surgery import Surgery as SurgeryModel
 from app.models.patient import Patient as PatientModel
 from app.models.user import User
 from app.utils.dependencies import get_current_user
+from app.utils.list_count import COUNT_MODE_PATTERN, list_total_count
+from app.utils.pagination import after_cursor, decode_cursor, next_cursor, split_page
 import logging
 import traceback
 
@@ -96,11 +99,15 @@ def get_surgeries(
     surgeon_id: Optional[int] = Query(None, description="Filter by surgeon ID"),
     skip: int = Query(0, ge=0),
     limit: int = Query(100, ge=1, le=100),
+    cursor: Optional[str] = Query(None, description="next_cursor of the previous page (instead of skip)"),
+    count: str = Query("exact", pattern=COUNT_MODE_PATTERN,
+                       description="total_count: exact, estimate (PostgreSQL statistics) or none"),
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
     """
-    Получение списка операций (врачи видят свои операции, reception все)
+    Получение списка операций (врачи видят свои операции, reception все),
+    сначала последние по дате операции
     """
     if current_user.role not in ["doctor", "reception"]:
         raise HTTPException(status_code=403, detail="Not authorized")
@@ -126,9 +133,20 @@ def get_surgeries(
         query = query.filter(SurgeryModel.surgeon_id == current_user.id)
 
     # Получение общего количества
-    total_count = query.count()
+    total_count, count_mode = list_total_count(
+        db, query, count, "surgeries",
+        filtered=bool(patient_id or surgeon_id or current_user.role == "doctor")
+    )
+
+    # Keyset-пагинация по (operation_date, id) - индекс ix_surgeries_operation_date_id
+    query = query.order_by(SurgeryModel.operation_date.desc(), SurgeryModel.id.desc())
+    if cursor:
+        last_date, last_id = decode_cursor(cursor, date, int)
+        query = query.filter(after_cursor([SurgeryModel.operation_date, SurgeryModel.id], [last_date, last_id]))
+    else:
+        query = query.offset(skip)
 
-    results = query.offset(skip).limit(limit).all()
+    results, has_more = split_page(query.limit(limit + 1).all(), limit)
 
     surgeries = []
     for surgery, patient_full_name, surgeon_full_name in results:
@@ -154,7 +172,12 @@ def get_surgeries(
         )
         surgeries.append(surgery_data)
 
-    return SurgeryListResponse(data=surgeries, total_count=total_count)
+    return SurgeryListResponse(
+        data=surgeries,
+        total_count=total_count,
+        count_mode=count_mode,
+        next_cursor=next_cursor(results, has_more, lambda row: (row[0].operation_date, row[0].id))
+    )
 
 @router.get("/{surgery_id}", response_model=SurgeryWithDetails)
 def get_surgery(
@@ -34,9 +34,16 @@ class Patient(BaseModel):
     class Config:
         from_attributes = True
 
+class PatientSuggestion(BaseModel):
+    id: int
+    full_name: str
+    phone: str
+
 class PatientListResponse(BaseModel):
     patients: List[Patient]
-    total_count: int
+    total_count: Optional[int] = None  # None при count=none
+    count_mode: str = "exact"  # Как получен total_count: exact, estimate или none
+    next_cursor: Optional[str] = None  # Курсор следующей страницы (None - страница последняя)
 
 
 
@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from datetime import date, datetime
 from typing import Optional, List
 
@@ -7,13 +7,19 @@ class QueueBase(BaseModel):
     doctor_id: int
 
 class QueueCreate(QueueBase):
-    pass
+    priority: int = Field(0, ge=0, le=9)  # 0 - обычная очередь, больше - раньше
+
+class QueuePriorityUpdate(BaseModel):
+    priority: int = Field(..., ge=0, le=9)
 
 class Queue(QueueBase):
     id: int
     queue_number: int
+    priority: int = 0
     queue_date: date
     created_at: datetime
+    called_in_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
 
     class Config:
         from_attributes = True
@@ -21,7 +27,24 @@ class Queue(QueueBase):
 class QueueWithPatient(Queue):
     patient_full_name: str
     patient_phone: str
+    estimated_wait_minutes: Optional[int] = None  # Только для сегодняшней очереди
 
 class QueueListResponse(BaseModel):
     queue: List[QueueWithPatient]
     total_count: int
+
+class QueueBulkCreate(BaseModel):
+    items: List[QueueCreate] = Field(..., min_length=1, max_length=1000)
+
+class QueueBulkItemResult(BaseModel):
+    index: int  # Позиция элемента в запросе
+    patient_id: int
+    doctor_id: int
+    status: str  # "added" | "error"
+    detail: Optional[str] = None
+    entry: Optional[Queue] = None
+
+class QueueBulkResponse(BaseModel):
+    results: List[QueueBulkItemResult]
+    added_count: int
+    failed_count: int
@@ -63,6 +63,11 @@ class TimeRangeStats(BaseModel):
     completion_rate: float
     daily_breakdown: List[DailyStats]
 
+class DoctorDayStats(BaseModel):
+    date: date
+    appointments_count: int
+    revenue: Decimal
+
 class DoctorPerformanceStats(BaseModel):
     doctor_id: int
     doctor_name: str
@@ -71,6 +76,8 @@ class DoctorPerformanceStats(BaseModel):
     completion_rate: float
     average_appointments_per_day: float
     most_productive_day: Optional[str] = None
+    top_days: Optional[List[DoctorDayStats]] = None  # Только при top_n
+    daily_series: Optional[List[DoctorDayStats]] = None  # Только при include_series
 
 # Финансовые схемы
 class FinancialStats(BaseModel):
@@ -139,11 +146,31 @@ class DoctorPerformanceFinancialStats(BaseModel):
     most_profitable_day_revenue: Optional[Decimal] = None
     appointments_count: int
     average_appointment_value: Decimal
+    top_days: Optional[List[DoctorDayStats]] = None  # Только при top_n
+    daily_series: Optional[List[DoctorDayStats]] = None  # Только при include_series
+
+class AnalyticsSliceGroup(BaseModel):
+    key: str  # Дата (YYYY-MM-DD), id врача или статус - в зависимости от group_by
+    appointments_count: int
+    revenue: Decimal
+
+class AnalyticsSlice(BaseModel):
+    source: str  # "snapshot" - колоночный снимок в памяти, "sql" - дневная сводка в БД
+    start_date: Optional[date] = None
+    end_date: Optional[date] = None
+    doctor_id: Optional[int] = None
+    status: Optional[str] = None
+    group_by: Optional[str] = None
+    appointments_count: int
+    revenue: Decimal
+    groups: List[AnalyticsSliceGroup] = []
 
 class StatsResponse(BaseModel):
-    general: GeneralStats
-    appointments: AppointmentStats
-    patients: PatientStats
-    doctors: List[DoctorStats]
+    # Разделы, не успевшие за таймаут или завершившиеся ошибкой, равны None
+    general: Optional[GeneralStats] = None
+    appointments: Optional[AppointmentStats] = None
+    patients: Optional[PatientStats] = None
+    doctors: Optional[List[DoctorStats]] = None
     financial: Optional[FinancialStats] = None
     time_range: Optional[TimeRangeStats] = None
+    failed_sections: List[str] = []
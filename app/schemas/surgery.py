@@ -75,4 +75,6 @@ class SurgeryWithDetails(BaseModel):
 
 class SurgeryListResponse(BaseModel):
     data: List[SurgeryWithDetails]
-    total_count: int
\ No newline at end of file
+    total_count: Optional[int] = None  # None при count=none
+    count_mode: str = "exact"  # Как получен total_count: exact, estimate или none
+    next_cursor: Optional[str] = None  # Курсор следующей страницы (None - страница последняя)
\ No newline at end of file
@@ -0,0 +1,82 @@
+"""
+Границы дней, недель и месяцев в таймзоне клиники.
+
+Окна возвращаются полуоткрытыми диапазонами [start, end) в виде timestamp,
+поэтому фильтр `column >= start AND column < end` использует обычный B-tree индекс
+(в отличие от `func.date(column) == day`).
+"""
+from datetime import date, datetime, time, timedelta, timezone
+from typing import Tuple
+from zoneinfo import ZoneInfo
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from app.core.config import settings
+
+CLINIC_TZ = ZoneInfo(settings.clinic_timezone)
+
+
+def clinic_today() -> date:
+    """Сегодняшняя дата в таймзоне клиники"""
+    return datetime.now(CLINIC_TZ).date()
+
+
+def clinic_date(value: datetime) -> date:
+    """Дата момента времени в таймзоне клиники (naive значения считаются UTC)"""
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.astimezone(CLINIC_TZ).date()
+
+
+def day_start(day: date) -> datetime:
+    """Начало дня в таймзоне клиники (aware datetime)"""
+    return datetime.combine(day, time.min, tzinfo=CLINIC_TZ)
+
+
+def date_range_bounds(start_date: date, end_date: date) -> Tuple[datetime, datetime]:
+    """Дни [start_date, end_date] включительно -> [start, end) в timestamp"""
+    return day_start(start_date), day_start(end_date + timedelta(days=1))
+
+
+def day_bounds(day: date) -> Tuple[datetime, datetime]:
+    """Окно одного дня"""
+    return date_range_bounds(day, day)
+
+
+def week_bounds(day: date) -> Tuple[datetime, datetime]:
+    """Окно календарной недели (понедельник - воскресенье), содержащей day"""
+    week_start = day - timedelta(days=day.weekday())
+    return date_range_bounds(week_start, week_start + timedelta(days=6))
+
+
+def month_bounds(year: int, month: int) -> Tuple[datetime, datetime]:
+    """Окно календарного месяца"""
+    next_month = date(year + month // 12, month % 12 + 1, 1)
+    return day_start(date(year, month, 1)), day_start(next_month)
+
+
+def as_naive_utc(value: datetime) -> datetime:
+    """Граница для naive UTC колонок (Patient.created_at)"""
+    return value.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def in_range(column, bounds: Tuple[datetime, datetime], naive_utc: bool = False):
+    """Sargable предикат column ∈ [start, end)"""
+    start, end = bounds
+    if naive_utc:
+        start, end = as_naive_utc(start), as_naive_utc(end)
+    return (column >= start) & (column < end)
+
+
+def clinic_day_expr(db: Session, column, naive_utc: bool = False):
+    """
+    SQL выражение «дата в таймзоне клиники» для группировки.
+    PostgreSQL: timezone(tz, column); SQLite не знает таймзон - используется
+    текущее смещение клиники (точно для таймзон без перехода на летнее время).
+    """
+    if db.get_bind().dialect.name == "postgresql":
+        if naive_utc:
+            column = func.timezone("UTC", column)
+        return func.date(func.timezone(settings.clinic_timezone, column))
+
+    offset = datetime.now(CLINIC_TZ).utcoffset()
+    return func.date(column, f"{int(offset.total_seconds())} seconds")
@@ -0,0 +1,74 @@
+"""
+total_count для списков (пациенты, операции).
+
+COUNT(*) выполняется на каждый запрос страницы и без фильтров просматривает всю таблицу.
+Режимы (параметр count):
+- exact - точный COUNT(*), как раньше;
+- estimate - оценка PostgreSQL: без фильтров pg_class.reltuples (обновляется ANALYZE/autovacuum),
+  с фильтрами - число строк из плана EXPLAIN. Запрос не выполняется, поэтому оценка стоит
+  одинаково при любом размере таблицы. На SQLite и для таблицы без статистики - точный подсчет;
+- none - без подсчета, для бесконечной прокрутки (хватает next_cursor).
+
+В ответе count_mode - режим, которым получено число (estimate может стать exact).
+"""
+from typing import Optional, Tuple
+import json
+import logging
+from sqlalchemy import text
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.orm import Query, Session
+from sqlalchemy.sql.base import Executable
+from sqlalchemy.sql.elements import ClauseElement
+
+logger = logging.getLogger(__name__)
+
+COUNT_MODE_PATTERN = "^(exact|estimate|none)$"
+
+
+def _table_estimate(db: Session, table_name: str) -> Optional[int]:
+    reltuples = db.execute(
+        text("SELECT reltuples FROM pg_class WHERE oid = to_regclass(:table)"), {"table": table_name}
+    ).scalar()
+    # -1 - таблица еще ни разу не анализировалась
+    if reltuples is None or reltuples < 0:
+        return None
+    return int(reltuples)
+
+
+class _Explain(Executable, ClauseElement):
+    """EXPLAIN (FORMAT JSON) <запрос>: параметры (в том числе списки IN) связывает тот же компилятор"""
+    inherit_cache = False
+
+    def __init__(self, statement):
+        self.statement = statement
+
+
+@compiles(_Explain, "postgresql")
+def _compile_explain(element, compiler, **kw):
+    return f"EXPLAIN (FORMAT JSON) {compiler.process(element.statement, **kw)}"
+
+
+def _plan_estimate(db: Session, query: Query) -> Optional[int]:
+    """Оценка числа строк по плану; None - EXPLAIN не удался (точный подсчет)"""
+    try:
+        # Ошибка в savepoint не обрывает транзакцию запроса списка
+        with db.begin_nested():
+            plan = db.execute(_Explain(query.order_by(None).statement)).scalar()
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return int(plan[0]["Plan"]["Plan Rows"])
+    except (SQLAlchemyError, KeyError, IndexError, TypeError, ValueError) as e:
+        logger.warning(f"⚠️ Row estimate failed, counting exactly: {e}")
+        return None
+
+
+def list_total_count(db: Session, query: Query, mode: str, table_name: str, filtered: bool) -> Tuple[Optional[int], str]:
+    """(total_count, count_mode); query - запрос списка до пагинации, filtered - есть ли в нем фильтры"""
+    if mode == "none":
+        return None, "none"
+    if mode == "estimate" and db.get_bind().dialect.name == "postgresql":
+        estimate = _plan_estimate(db, query) if filtered else _table_estimate(db, table_name)
+        if estimate is not None:
+            return estimate, "estimate"
+    return query.count(), "exact"
@@ -0,0 +1,66 @@
+"""
+Keyset-пагинация списков.
+
+OFFSET читает и отбрасывает все строки до нужной страницы, поэтому глубокие страницы
+большой таблицы становятся все медленнее. Вместо этого следующая страница начинается
+после ключа последней строки предыдущей: ORDER BY date DESC, id DESC + WHERE (date, id) < (:date, :id).
+Сравнение строк (row value) PostgreSQL выполняет как диапазон по индексу (date, id),
+поэтому страница 5000 стоит столько же, сколько первая.
+
+Курсор для клиента непрозрачен: base64 от JSON со значениями ключа последней строки.
+"""
+from datetime import date, datetime
+from typing import Any, List, Optional, Sequence, Tuple
+import base64
+import json
+from fastapi import HTTPException
+from sqlalchemy import tuple_
+from sqlalchemy.sql.elements import ColumnElement
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def _dump(value: Any) -> Any:
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+
+def encode_cursor(*values: Any) -> str:
+    """Курсор из значений ключа сортировки последней строки страницы"""
+    payload = json.dumps([_dump(value) for value in values], separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, *types: type) -> Tuple:
+    """Значения ключа из курсора; types - тип каждого значения (int, date, datetime). 400 - курсор испорчен"""
+    try:
+        payload = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        values = json.loads(payload)
+        if not isinstance(values, list) or len(values) != len(types):
+            raise ValueError(cursor)
+        return tuple(
+            value_type.fromisoformat(value) if value_type in (date, datetime) else value_type(value)
+            for value_type, value in zip(types, values)
+        )
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def after_cursor(columns: Sequence[ColumnElement], values: Sequence[Any]) -> ColumnElement:
+    """Условие "строго после курсора" для сортировки по columns по убыванию"""
+    if len(columns) == 1:
+        return columns[0] < values[0]
+    return tuple_(*columns) < tuple_(*values)
+
+
+def split_page(rows: List, limit: int) -> Tuple[List, bool]:
+    """Запрос читает limit + 1 строк: лишняя строка означает, что есть следующая страница"""
+    return rows[:limit], len(rows) > limit
+
+
+def next_cursor(rows: List, has_more: bool, key) -> Optional[str]:
+    """Курсор следующей страницы по последней строке; key(row) -> значения ключа"""
+    if not has_more or not rows:
+        return None
+    return encode_cursor(*key(rows[-1]))
@@ -0,0 +1,48 @@
+"""
+Поиск пациентов по ФИО и телефону для строки поиска регистратуры.
+
+На PostgreSQL по patients.full_name и patients.phone построены GIN-индексы pg_trgm
+(миграция d1a5c8f3e6b9), поэтому ILIKE '%...%' не сканирует всю таблицу.
+Нечеткий режим ищет по сходству слов (оператор %>, word_similarity) - находит
+имя с опечаткой или по части слова - и сортирует по сходству.
+На SQLite нечеткий режим сводится к обычному ILIKE.
+
+Телефон ищется по последним цифрам: в patients.phone_digits хранятся только цифры
+("+998 90 123-45-67" -> "998901234567"), запрос "901234567" совпадает с концом номера.
+На PostgreSQL для этого есть B-tree индекс по reverse(phone_digits) text_pattern_ops -
+поиск по суффиксу становится поиском по префиксу перевернутой строки.
+"""
+from typing import Optional, Tuple
+import re
+from sqlalchemy import func, or_
+from sqlalchemy.orm import Session
+from sqlalchemy.sql.elements import ColumnElement
+from app.models.patient import Patient as PatientModel
+
+
+def name_search(db: Session, search: str, fuzzy: bool = False) -> Tuple[ColumnElement, Optional[ColumnElement]]:
+    """Условие фильтра по ФИО и выражение ранжирования (None - без ранжирования по сходству)"""
+    contains = PatientModel.full_name.ilike(f"%{search}%")
+    if not fuzzy or db.get_bind().dialect.name != "postgresql":
+        return contains, None
+
+    # full_name %> search: word_similarity(search, full_name) выше pg_trgm.word_similarity_threshold
+    similar = PatientModel.full_name.op("%>")(search)
+    return or_(contains, similar), func.word_similarity(search, PatientModel.full_name)
+
+
+def normalize_phone(phone: Optional[str]) -> Optional[str]:
+    """Только цифры номера; заполняется при создании и изменении пациента"""
+    if phone is None:
+        return None
+    return re.sub(r"\D", "", phone)
+
+
+def phone_search(db: Session, phone: str) -> ColumnElement:
+    """Условие поиска по последним цифрам номера; без цифр в запросе - прежний поиск по подстроке"""
+    digits = normalize_phone(phone)
+    if not digits:
+        return PatientModel.phone.contains(phone)
+    if db.get_bind().dialect.name == "postgresql":
+        return func.reverse(PatientModel.phone_digits).like(f"{digits[::-1]}%")
+    return PatientModel.phone_digits.like(f"%{digits}")
@@ -0,0 +1,260 @@
+"""
+Подсказки пациентов для строки поиска регистратуры (GET /patients/suggest?q=).
+
+Каждое нажатие клавиши не идет в БД: в памяти воркера - отсортированные списки ключей
+"ключ\\0id", поиск по префиксу - бинарным поиском (bisect) и чтение подряд,
+пока ключ начинается с запроса. Ключи - строки, а не кортежи: сортируются в разы быстрее
+и занимают меньше памяти.
+
+Ключи:
+- ФИО в нижнем регистре с одиночными пробелами, начиная с каждого слова -
+  "karimov aziz", "aziz": находится и по фамилии, и по имени;
+- цифры телефона, начиная с каждой позиции, пока остается не меньше PHONE_MIN_DIGITS
+  (номер без кода страны) - "90123" находит "+998 90 123-45-67".
+
+Индекс строится в фоновом потоке при старте, пока он не готов (или пациенты
+не помещаются в patient_suggest_max_bytes) - подсказки ищутся в БД прежними условиями поиска
+(suggest_from_db). Индекс обновляется в этом воркере при создании, изменении и удалении
+пациента. Изменения из других воркеров подхватывает планировщик: sync() - пациентов
+с updated_at после прошлой синхронизации (каждые patient_suggest_sync_seconds),
+reconcile() - удаленных, сверкой числа строк и id с таблицей (раз в patient_suggest_reconcile_seconds:
+удаление пациента - редкая операция администратора, а сверка читает всю таблицу).
+"""
+from bisect import bisect_left, insort
+from datetime import datetime, timedelta
+from threading import Lock, RLock, Thread
+from typing import Dict, List, Optional, Tuple
+import logging
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.db.session import SessionLocal
+from app.models.patient import Patient as PatientModel
+from app.utils.patient_search import name_search, normalize_phone, phone_search
+
+logger = logging.getLogger(__name__)
+
+PHONE_MIN_DIGITS = 7
+PHONE_QUERY_CHARS = " +-()"
+KEY_SEPARATOR = "\0"
+# Запас на расхождение часов воркеров: updated_at ставит приложение, а не БД
+SYNC_OVERLAP = timedelta(minutes=1)
+LOAD_BATCH_SIZE = 10000
+# Ключи ФИО и телефона, запись в словаре пациентов (замер benchmarks/patient_suggest.py)
+BYTES_PER_PATIENT = 800
+
+
+def normalize_name(full_name: str) -> str:
+    return " ".join(full_name.replace(KEY_SEPARATOR, "").casefold().split())
+
+
+def _name_keys(full_name: str) -> List[str]:
+    words = normalize_name(full_name).split(" ")
+    return [" ".join(words[i:]) for i in range(len(words)) if words[i]]
+
+
+def _phone_keys(phone: str) -> List[str]:
+    digits = normalize_phone(phone) or ""
+    return [digits[i:] for i in range(len(digits) - PHONE_MIN_DIGITS + 1)] or ([digits] if digits else [])
+
+
+def _index_keys(keys: List[str], patient_id: int) -> List[str]:
+    return [f"{key}{KEY_SEPARATOR}{patient_id}" for key in keys]
+
+
+def _is_phone_query(q: str) -> bool:
+    stripped = "".join(ch for ch in q if ch not in PHONE_QUERY_CHARS)
+    return stripped.isdigit()
+
+
+class PatientSuggestIndex:
+    def __init__(self, max_bytes: int):
+        self.max_patients = max_bytes // BYTES_PER_PATIENT
+        self.disabled_reason: Optional[str] = None
+        self._name_keys: List[str] = []
+        self._phone_keys: List[str] = []
+        self._patients: Dict[int, Tuple[str, str]] = {}  # id -> (ФИО, телефон)
+        self._synced_at: Optional[datetime] = None
+        self._ready = False
+        self._lock = RLock()
+        self._build_lock = Lock()
+
+    @property
+    def ready(self) -> bool:
+        return self._ready
+
+    @staticmethod
+    def _remove_keys(keys: List[str], patient_keys: List[str]):
+        for key in patient_keys:
+            index = bisect_left(keys, key)
+            if index < len(keys) and keys[index] == key:
+                del keys[index]
+
+    def upsert(self, patient_id: int, full_name: str, phone: str):
+        with self._lock:
+            self.remove(patient_id)
+            for key in _index_keys(_name_keys(full_name), patient_id):
+                insort(self._name_keys, key)
+            for key in _index_keys(_phone_keys(phone), patient_id):
+                insort(self._phone_keys, key)
+            self._patients[patient_id] = (full_name, phone)
+
+    def remove(self, patient_id: int):
+        with self._lock:
+            patient = self._patients.pop(patient_id, None)
+            if patient is None:
+                return
+            self._remove_keys(self._name_keys, _index_keys(_name_keys(patient[0]), patient_id))
+            self._remove_keys(self._phone_keys, _index_keys(_phone_keys(patient[1]), patient_id))
+
+    def load(self, rows: List[Tuple[int, str, str]]):
+        """Строит индекс из строк (id, ФИО, телефон) одной сортировкой и подменяет целиком"""
+        name_keys = [key for patient_id, full_name, _ in rows for key in _index_keys(_name_keys(full_name), patient_id)]
+        phone_keys = [key for patient_id, _, phone in rows for key in _index_keys(_phone_keys(phone), patient_id)]
+        name_keys.sort()
+        phone_keys.sort()
+        patients = {patient_id: (full_name, phone) for patient_id, full_name, phone in rows}
+        with self._lock:
+            self._name_keys, self._phone_keys, self._patients = name_keys, phone_keys, patients
+            self._ready = True
+
+    def rebuild(self, db: Optional[Session] = None):
+        """
+        Загружает всех пациентов (только id, ФИО, телефон). Больше max_patients - индекс выключается,
+        чтение прекращается, не дойдя до конца таблицы. Уже идущую перестройку не ждет
+        """
+        if not self._build_lock.acquire(blocking=False):
+            return
+        own_session = db is None
+        db = db or SessionLocal()
+        try:
+            synced_at = datetime.utcnow() - SYNC_OVERLAP
+            rows = []
+            for row in db.query(PatientModel.id, PatientModel.full_name, PatientModel.phone).yield_per(LOAD_BATCH_SIZE):
+                if len(rows) >= self.max_patients:
+                    self.disabled_reason = f"more than {self.max_patients} patients exceed patient_suggest_max_bytes"
+                    logger.warning(f"⚠️ Patient suggest index disabled: {self.disabled_reason}")
+                    return
+                rows.append(tuple(row))
+            self.load(rows)
+            self._synced_at = synced_at
+            self.disabled_reason = None
+            logger.info(f"✓ Patient suggest index rebuilt: {len(rows)} patients")
+        finally:
+            if own_session:
+                db.close()
+            self._build_lock.release()
+
+    def start_rebuild(self):
+        """Построение в фоновом потоке: старт воркера не ждет загрузки всех пациентов"""
+        def build():
+            try:
+                self.rebuild()
+            except Exception as e:
+                logger.error(f"✗ Error building patient suggest index: {e}")
+
+        Thread(target=build, name="patient-suggest-build", daemon=True).start()
+
+    def sync(self, db: Optional[Session] = None) -> int:
+        """Догружает изменения после прошлой синхронизации; возвращает число обновленных пациентов"""
+        if self.disabled_reason is not None:
+            return 0
+        if self._synced_at is None:
+            self.rebuild(db)
+            return len(self)
+
+        own_session = db is None
+        db = db or SessionLocal()
+        try:
+            synced_at = datetime.utcnow() - SYNC_OVERLAP
+            rows = db.query(PatientModel.id, PatientModel.full_name, PatientModel.phone).filter(
+                PatientModel.updated_at >= self._synced_at
+            ).all()
+            for patient_id, full_name, phone in rows:
+                if self._patients.get(patient_id) != (full_name, phone):
+                    self.upsert(patient_id, full_name, phone)
+            self._synced_at = synced_at
+            return len(rows)
+        finally:
+            if own_session:
+                db.close()
+
+    def reconcile(self, db: Optional[Session] = None) -> int:
+        """Убирает пациентов, которых уже нет в таблице; возвращает число удаленных из индекса"""
+        if not self._ready:
+            return 0
+        own_session = db is None
+        db = db or SessionLocal()
+        try:
+            # Число строк совпало - удалений не было (новые пациенты других воркеров догружает sync)
+            if db.query(func.count(PatientModel.id)).scalar() == len(self):
+                return 0
+            existing = {patient_id for (patient_id,) in db.query(PatientModel.id).yield_per(LOAD_BATCH_SIZE)}
+            removed = [patient_id for patient_id in list(self._patients) if patient_id not in existing]
+            for patient_id in removed:
+                self.remove(patient_id)
+            return len(removed)
+        finally:
+            if own_session:
+                db.close()
+
+    def suggest(self, q: str, limit: int) -> Optional[List[dict]]:
+        """
+        До limit пациентов, у которых ФИО (с любого слова) или цифры телефона начинаются с q.
+        None - индекс еще строится или выключен, подсказки нужно искать в БД
+        """
+        if not self._ready:
+            return None
+        phone_query = _is_phone_query(q)
+        prefix = normalize_phone(q) if phone_query else normalize_name(q)
+        if not prefix:
+            return []
+
+        found: List[int] = []
+        with self._lock:
+            keys = self._phone_keys if phone_query else self._name_keys
+            index = bisect_left(keys, prefix)
+            while index < len(keys) and len(found) < limit and keys[index].startswith(prefix):
+                patient_id = int(keys[index].rsplit(KEY_SEPARATOR, 1)[1])
+                if patient_id not in found:
+                    found.append(patient_id)
+                index += 1
+            return [
+                {"id": patient_id, "full_name": self._patients[patient_id][0], "phone": self._patients[patient_id][1]}
+                for patient_id in found
+            ]
+
+    def __len__(self) -> int:
+        return len(self._patients)
+
+
+def suggest_from_db(db: Session, q: str, limit: int) -> List[dict]:
+    """Подсказки без индекса - условиями поиска GET /patients/ (ФИО - ILIKE, телефон - по последним цифрам)"""
+    condition = phone_search(db, q) if _is_phone_query(q) else name_search(db, q)[0]
+    rows = db.query(PatientModel.id, PatientModel.full_name, PatientModel.phone).filter(
+        condition
+    ).order_by(PatientModel.id.desc()).limit(limit).all()
+    return [{"id": patient_id, "full_name": full_name, "phone": phone} for patient_id, full_name, phone in rows]
+
+
+def sync_patient_suggest_index():
+    """Задача планировщика: подхватывает изменения пациентов из других воркеров"""
+    try:
+        updated = patient_suggest_index.sync()
+        if updated:
+            logger.info(f"✓ Patient suggest index synced: {updated} patients")
+    except Exception as e:
+        logger.error(f"✗ Error syncing patient suggest index: {e}")
+
+
+def reconcile_patient_suggest_index():
+    """Задача планировщика: убирает пациентов, удаленных в других воркерах"""
+    try:
+        removed = patient_suggest_index.reconcile()
+        if removed:
+            logger.info(f"✓ Patient suggest index reconciled: {removed} deleted patients removed")
+    except Exception as e:
+        logger.error(f"✗ Error reconciling patient suggest index: {e}")
+
+
+patient_suggest_index = PatientSuggestIndex(settings.patient_suggest_max_bytes)
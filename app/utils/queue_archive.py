@@ -0,0 +1,176 @@
+"""
+Архив очередей прошедших дней вместо ночного DELETE.
+
+На PostgreSQL таблица queue секционирована по queue_date: секция на каждый день
+(queue_pYYYYMMDD) и секция по умолчанию queue_default. Ночью секции прошедших дней
+отсоединяются от queue (DETACH PARTITION) и присоединяются к queue_archive -
+это операции над метаданными, строки не переписываются. Из queue_default
+в архив переносятся только случайно попавшие туда строки.
+
+На SQLite и на несекционированной таблице (база создана через create_all без миграций)
+строки копируются в queue_archive и удаляются из queue пачками, каждая в своей транзакции.
+
+У queue_archive нет внешних ключей: отсоединенная секция сохраняет внешние ключи queue
+с ON DELETE CASCADE, поэтому они удаляются перед присоединением к архиву. Удаление пациента
+или врача не затрагивает архив - история хранится с их id; удалять ее нужно явно.
+"""
+from datetime import date, datetime, timedelta
+from typing import List, NamedTuple
+import logging
+import re
+import time
+from sqlalchemy import bindparam, text
+from sqlalchemy.orm import Session
+from app.db.session import SessionLocal
+
+logger = logging.getLogger(__name__)
+
+QUEUE_PARTITION_PATTERN = re.compile(r"^queue_p(\d{8})$")
+# Секции создаются заранее, чтобы строки не попадали в queue_default
+QUEUE_PARTITION_DAYS_AHEAD = 7
+QUEUE_ARCHIVE_BATCH_SIZE = 5000
+
+class ArchiveResult(NamedTuple):
+    rows: int
+    batches: int  # Транзакции переноса: секции и пачки строк
+
+
+_QUEUE_COLUMNS = (
+    "id, patient_id, doctor_id, ticket_number, queue_date, created_at, called_in_at, finished_at, priority"
+)
+
+
+def queue_is_partitioned(db: Session) -> bool:
+    if db.get_bind().dialect.name != "postgresql":
+        return False
+    return db.execute(text(
+        "SELECT EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass('queue'))"
+    )).scalar()
+
+
+def _partition_name(prefix: str, day: date) -> str:
+    return f"{prefix}_p{day:%Y%m%d}"
+
+
+def _queue_partitions(db: Session) -> List[date]:
+    """Дни, для которых у queue есть своя секция"""
+    names = db.execute(text("""
+        SELECT child.relname
+        FROM pg_inherits
+        JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+        WHERE pg_inherits.inhparent = to_regclass('queue')
+    """)).scalars()
+    days = []
+    for name in names:
+        match = QUEUE_PARTITION_PATTERN.match(name)
+        if match:
+            days.append(datetime.strptime(match.group(1), "%Y%m%d").date())
+    return sorted(days)
+
+
+def ensure_queue_partitions(db: Session, start: date, days: int = QUEUE_PARTITION_DAYS_AHEAD) -> int:
+    """Создает недостающие дневные секции queue на days дней начиная со start"""
+    if not queue_is_partitioned(db):
+        return 0
+
+    existing = set(_queue_partitions(db))
+    # Дни, строки которых уже лежат в queue_default, оставляем там (секцию не создать)
+    in_default = set(db.execute(text(
+        "SELECT DISTINCT queue_date FROM queue_default WHERE queue_date >= :start"
+    ), {"start": start}).scalars())
+
+    created = 0
+    for offset in range(days):
+        day = start + timedelta(days=offset)
+        if day in existing or day in in_default:
+            continue
+        db.execute(text(
+            f"CREATE TABLE {_partition_name('queue', day)} PARTITION OF queue "
+            f"FOR VALUES FROM ('{day.isoformat()}') TO ('{(day + timedelta(days=1)).isoformat()}')"
+        ))
+        created += 1
+    return created
+
+
+def _drop_foreign_keys(db: Session, table: str):
+    """Снимает внешние ключи, унаследованные отсоединенной секцией от queue"""
+    names = db.execute(text(
+        "SELECT conname FROM pg_constraint WHERE conrelid = to_regclass(:table) AND contype = 'f'"
+    ), {"table": table}).scalars().all()
+    for name in names:
+        db.execute(text(f'ALTER TABLE {table} DROP CONSTRAINT "{name}"'))
+
+
+def _move_rows_to_archive(db: Session, source: str, before: date, batch_size: int,
+                          pause_seconds: float) -> ArchiveResult:
+    """Переносит строки source с queue_date < before пачками по batch_size, коммит после каждой пачки"""
+    select_ids = text(f"SELECT id FROM {source} WHERE queue_date < :before ORDER BY id LIMIT :limit")
+    copy_rows = text(
+        f"INSERT INTO queue_archive ({_QUEUE_COLUMNS}) SELECT {_QUEUE_COLUMNS} FROM {source} WHERE id IN :ids"
+    ).bindparams(bindparam("ids", expanding=True))
+    delete_rows = text(f"DELETE FROM {source} WHERE id IN :ids").bindparams(bindparam("ids", expanding=True))
+
+    moved = batches = 0
+    while True:
+        ids = db.execute(select_ids, {"before": before, "limit": batch_size}).scalars().all()
+        if not ids:
+            return ArchiveResult(moved, batches)
+        db.execute(copy_rows, {"ids": ids})
+        db.execute(delete_rows, {"ids": ids})
+        db.commit()
+        moved += len(ids)
+        batches += 1
+        logger.info(f"✓ Archived {moved} rows from {source}")
+        if pause_seconds:
+            time.sleep(pause_seconds)
+
+
+def archive_old_queues(
+    db: Session,
+    before: date,
+    batch_size: int = QUEUE_ARCHIVE_BATCH_SIZE,
+    pause_seconds: float = 0
+) -> ArchiveResult:
+    """
+    Переносит очереди с queue_date < before в queue_archive; возвращает число записей и транзакций.
+    Коммитит сам: после каждой секции и каждой пачки строк, чтобы не держать одну длинную транзакцию.
+    """
+    if not queue_is_partitioned(db):
+        return _move_rows_to_archive(db, "queue", before, batch_size, pause_seconds)
+
+    archived = partitions = 0
+    for day in _queue_partitions(db):
+        if day >= before:
+            break
+        partition = _partition_name("queue", day)
+        archive_partition = _partition_name("queue_archive", day)
+        archived += db.execute(text(f"SELECT count(*) FROM {partition}")).scalar()
+        db.execute(text(f"ALTER TABLE queue DETACH PARTITION {partition}"))
+        db.execute(text(f"ALTER TABLE {partition} RENAME TO {archive_partition}"))
+        _drop_foreign_keys(db, archive_partition)
+        db.execute(text(
+            f"ALTER TABLE queue_archive ATTACH PARTITION {archive_partition} "
+            f"FOR VALUES FROM ('{day.isoformat()}') TO ('{(day + timedelta(days=1)).isoformat()}')"
+        ))
+        db.commit()
+        partitions += 1
+        logger.info(f"✓ Archived partition {partition}")
+
+    # Строки прошедших дней без своей секции
+    default_rows = _move_rows_to_archive(db, "queue_default", before, batch_size, pause_seconds)
+    return ArchiveResult(archived + default_rows.rows, partitions + default_rows.batches)
+
+
+def prepare_queue_partitions():
+    """При старте приложения: секции на ближайшие дни, если планировщик пропустил ночной запуск"""
+    db = SessionLocal()
+    try:
+        created = ensure_queue_partitions(db, date.today())
+        db.commit()
+        if created:
+            logger.info(f"✓ Created {created} queue partitions")
+    except Exception as e:
+        db.rollback()
+        logger.error(f"✗ Error creating queue partitions: {e}")
+    finally:
+        db.close()
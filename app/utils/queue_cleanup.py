@@ -0,0 +1,158 @@
+"""
+Ночная очистка очередей: перенос прошедших дней в архив (app/utils/queue_archive.py),
+секции на ближайшие дни, удаление старых счетчиков талонов.
+
+Планировщик запускается в каждом воркере uvicorn и в каждом serverless-инстансе,
+поэтому задача берет advisory lock PostgreSQL: очистку выполняет только тот, кто
+взял блокировку, остальные пропускают запуск. Блокировка сессионная, на отдельном
+соединении в autocommit - через pooler в режиме транзакций она не держится,
+для таких развертываний запускайте очистку из cron:
+
+    python -m app.utils.queue_cleanup --batch-size 5000
+
+и отключите ее в планировщике (QUEUE_CLEANUP_IN_SCHEDULER=false).
+
+Итог последнего запуска в этом процессе (длительность, строки, пачки, ошибка) -
+cleanup_metrics(), для администратора GET /queue/cleanup/metrics. Запуск из cron
+идет в отдельном процессе: его итог - в выводе команды и в логе.
+"""
+from contextlib import contextmanager
+from datetime import date, datetime
+from threading import Lock
+from typing import Iterator, NamedTuple, Optional
+import argparse
+import logging
+import sys
+import time
+from sqlalchemy import text
+from app.core.config import settings
+from app.db.session import SessionLocal, engine
+from app.utils.queue_archive import archive_old_queues, ensure_queue_partitions
+from app.utils.queue_counter import delete_old_queue_counters
+
+logger = logging.getLogger(__name__)
+
+QUEUE_CLEANUP_LOCK_KEY = 7_271_001
+
+
+class QueueCleanupResult(NamedTuple):
+    archived: int
+    batches: int
+    partitions_created: int
+    counters_deleted: int
+    seconds: float
+
+
+_metrics_lock = Lock()
+_metrics = {"runs": 0, "skipped": 0, "failures": 0, "last_run": None}
+
+
+def _record_run(started_at: datetime, seconds: float, result: Optional[QueueCleanupResult] = None,
+                error: Optional[Exception] = None):
+    with _metrics_lock:
+        if error is not None:
+            _metrics["failures"] += 1
+        else:
+            _metrics["runs"] += 1
+        _metrics["last_run"] = {
+            "started_at": started_at,
+            "seconds": seconds,
+            "archived": result.archived if result is not None else None,
+            "batches": result.batches if result is not None else None,
+            "partitions_created": result.partitions_created if result is not None else None,
+            "counters_deleted": result.counters_deleted if result is not None else None,
+            "error": str(error) if error is not None else None
+        }
+
+
+def cleanup_metrics() -> dict:
+    """Счетчики запусков в этом процессе и итог последнего (в том числе неудачного)"""
+    with _metrics_lock:
+        return {**_metrics, "last_run": dict(_metrics["last_run"]) if _metrics["last_run"] else None}
+
+
+@contextmanager
+def queue_cleanup_lock() -> Iterator[bool]:
+    """True - блокировка взята (на SQLite всегда: один процесс), False - очистка уже идет в другом месте"""
+    if engine.dialect.name != "postgresql":
+        yield True
+        return
+
+    with engine.connect() as connection:
+        connection = connection.execution_options(isolation_level="AUTOCOMMIT")
+        acquired = connection.execute(
+            text("SELECT pg_try_advisory_lock(:key)"), {"key": QUEUE_CLEANUP_LOCK_KEY}
+        ).scalar()
+        try:
+            yield acquired
+        finally:
+            if acquired:
+                connection.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": QUEUE_CLEANUP_LOCK_KEY})
+
+
+def run_queue_cleanup(
+    before: Optional[date] = None,
+    batch_size: int = settings.queue_cleanup_batch_size,
+    pause_seconds: float = settings.queue_cleanup_batch_pause_seconds
+) -> Optional[QueueCleanupResult]:
+    """Очистка очередей старше before (по умолчанию - сегодня); None - уже выполняется другим процессом"""
+    before = before or date.today()
+    with queue_cleanup_lock() as acquired:
+        if not acquired:
+            with _metrics_lock:
+                _metrics["skipped"] += 1
+            logger.info("⏭ Queue cleanup is already running elsewhere, skipping")
+            return None
+
+        started_at = datetime.utcnow()
+        started = time.monotonic()
+        db = SessionLocal()
+        try:
+            archive = archive_old_queues(db, before, batch_size=batch_size, pause_seconds=pause_seconds)
+            partitions_created = ensure_queue_partitions(db, date.today())
+            counters_deleted = delete_old_queue_counters(db, before)
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            _record_run(started_at, round(time.monotonic() - started, 3), error=e)
+            raise
+        finally:
+            db.close()
+
+    result = QueueCleanupResult(
+        archived=archive.rows,
+        batches=archive.batches,
+        partitions_created=partitions_created,
+        counters_deleted=counters_deleted,
+        seconds=round(time.monotonic() - started, 3)
+    )
+    _record_run(started_at, result.seconds, result)
+    logger.info(
+        f"✓ Queue cleanup: archived={result.archived} batches={result.batches} "
+        f"partitions_created={result.partitions_created} counters_deleted={result.counters_deleted} "
+        f"seconds={result.seconds}"
+    )
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Archive past queues (for cron outside the web process)")
+    parser.add_argument("--before", type=date.fromisoformat, default=None,
+                        help="Archive queues older than this date (YYYY-MM-DD, default: today)")
+    parser.add_argument("--batch-size", type=int, default=settings.queue_cleanup_batch_size)
+    parser.add_argument("--pause", type=float, default=settings.queue_cleanup_batch_pause_seconds,
+                        help="Pause between batches, seconds")
+    args = parser.parse_args()
+
+    # Вне веб-приложения модели не импортированы - связи между ними не разрешатся
+    import app.db.base  # noqa: F401
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    result = run_queue_cleanup(args.before, batch_size=args.batch_size, pause_seconds=args.pause)
+    if result is None:
+        sys.exit("Queue cleanup is already running")
+    print(result._asdict())
+
+
+if __name__ == "__main__":
+    main()
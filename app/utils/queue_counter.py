@@ -0,0 +1,46 @@
+"""
+Выдача номеров талонов очереди без гонок.
+
+Номер берется из счетчика (doctor_id, queue_date) одним запросом
+INSERT ... ON CONFLICT DO UPDATE ... RETURNING: строка счетчика блокируется
+до конца транзакции, поэтому параллельные добавления к одному врачу получают
+последовательные номера без дублей, а добавления к разным врачам не ждут друг друга.
+Уникальный индекс (doctor_id, queue_date, ticket_number) - последняя страховка.
+
+Номер талона не меняется; позиция в очереди считается при чтении (app/utils/queue_position.py).
+"""
+from datetime import date
+from sqlalchemy.orm import Session
+from app.db.session import dialect_insert
+from app.models.queue import QueueCounter
+
+
+def allocate_queue_numbers(db: Session, doctor_id: int, queue_date: date, count: int = 1) -> int:
+    """
+    Резервирует count номеров подряд и возвращает последний из них
+    (номера: last - count + 1 ... last). Коммит - на вызывающей стороне.
+    """
+    stmt = dialect_insert(db)(QueueCounter).values(doctor_id=doctor_id, queue_date=queue_date, last_number=count)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[QueueCounter.doctor_id, QueueCounter.queue_date],
+        set_={"last_number": QueueCounter.last_number + stmt.excluded.last_number}
+    ).returning(QueueCounter.last_number)
+    return db.execute(stmt).scalar_one()
+
+
+def allocate_queue_number(db: Session, doctor_id: int, queue_date: date) -> int:
+    """Следующий номер талона в очереди врача на дату"""
+    return allocate_queue_numbers(db, doctor_id, queue_date)
+
+
+def reset_queue_counter(db: Session, doctor_id: int, queue_date: date):
+    """Сброс счетчика при очистке очереди врача на дату"""
+    db.query(QueueCounter).filter(
+        QueueCounter.doctor_id == doctor_id,
+        QueueCounter.queue_date == queue_date
+    ).delete(synchronize_session=False)
+
+
+def delete_old_queue_counters(db: Session, before: date) -> int:
+    """Удаляет счетчики прошедших дней"""
+    return db.query(QueueCounter).filter(QueueCounter.queue_date < before).delete(synchronize_session=False)
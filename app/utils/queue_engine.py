@@ -0,0 +1,256 @@
+"""
+Сегодняшние очереди врачей в памяти воркера.
+
+Для каждого врача - отсортированный список ключей (-priority, талон) и записи по номеру талона:
+добавление в конец O(1) (талоны выдаются по возрастанию), вставка с приоритетом, поиск позиции
+и удаление - бинарным поиском (bisect).
+
+Запись идет в таблицу queue, движок обновляется после коммита событиями
+из app/utils/queue_events.py - и своими, и других воркеров (LISTEN/NOTIFY).
+Движок перестраивается из БД при старте, после полуночного сброса, при смене даты,
+после переподключения LISTEN (события за разрыв потеряны) и при расхождении
+с таблицей, найденном периодической сверкой планировщика;
+GET /queue/doctor/{doctor_id} за сегодня отвечает из памяти без запроса к очереди.
+"""
+from bisect import bisect_left, insort
+from datetime import date, datetime
+from threading import RLock
+from typing import Dict, List, Optional, Tuple
+import logging
+from sqlalchemy.orm import Session
+from app.db.session import SessionLocal
+from app.models.patient import Patient as PatientModel
+from app.models.queue import Queue as QueueModel
+from app.utils.queue_events import queue_broker
+from app.utils.queue_position import queue_order
+
+logger = logging.getLogger(__name__)
+
+
+class DoctorQueue:
+    """
+    Очередь одного врача: ключи (-priority, талон) по возрастанию и данные записей по талону.
+    Пациент с более высоким приоритетом встает перед всеми с меньшим, внутри приоритета - по талонам
+    """
+
+    def __init__(self):
+        self.keys: List[Tuple[int, int]] = []
+        self.entries: Dict[int, dict] = {}
+
+    @staticmethod
+    def _key(ticket_number: int, entry: dict) -> Tuple[int, int]:
+        return (-entry.get("priority", 0), ticket_number)
+
+    def add(self, ticket_number: int, entry: dict):
+        if ticket_number in self.entries:
+            self.remove(ticket_number)
+        key = self._key(ticket_number, entry)
+        if not self.keys or key > self.keys[-1]:
+            self.keys.append(key)
+        else:
+            insort(self.keys, key)
+        self.entries[ticket_number] = entry
+
+    def remove(self, ticket_number: int):
+        entry = self.entries.pop(ticket_number, None)
+        if entry is None:
+            return
+        key = self._key(ticket_number, entry)
+        index = bisect_left(self.keys, key)
+        if index < len(self.keys) and self.keys[index] == key:
+            del self.keys[index]
+
+    def position(self, ticket_number: int) -> int:
+        return bisect_left(self.keys, self._key(ticket_number, self.entries[ticket_number])) + 1
+
+    def listing(self) -> List[dict]:
+        """Записи в формате GET /queue/doctor/{doctor_id}, queue_number - позиция"""
+        return [
+            {**self.entries[ticket_number], "queue_number": position}
+            for position, (_, ticket_number) in enumerate(self.keys, start=1)
+        ]
+
+
+def _entry_data(queue_entry: QueueModel, patient_full_name: str, patient_phone: str) -> dict:
+    return {
+        "id": queue_entry.id,
+        "patient_id": queue_entry.patient_id,
+        "doctor_id": queue_entry.doctor_id,
+        "priority": queue_entry.priority,
+        "queue_date": queue_entry.queue_date,
+        "created_at": queue_entry.created_at,
+        "called_in_at": queue_entry.called_in_at,
+        "finished_at": queue_entry.finished_at,
+        "patient_full_name": patient_full_name,
+        "patient_phone": patient_phone
+    }
+
+
+class QueueEngine:
+    def __init__(self):
+        self.queue_date: Optional[date] = None
+        self._queues: Dict[int, DoctorQueue] = {}
+        self._tickets_by_id: Dict[int, Tuple[int, int]] = {}  # id записи -> (doctor_id, талон)
+        self._lock = RLock()
+
+    def rebuild(self, db: Optional[Session] = None):
+        """Загружает сегодняшние очереди из БД. События во время загрузки ждут на блокировке"""
+        own_session = db is None
+        db = db or SessionLocal()
+        try:
+            with self._lock:
+                today = date.today()
+                rows = db.query(QueueModel, PatientModel.full_name, PatientModel.phone).join(
+                    PatientModel, QueueModel.patient_id == PatientModel.id
+                ).filter(QueueModel.queue_date == today).order_by(
+                    QueueModel.doctor_id, *queue_order()
+                ).all()
+
+                self._queues = {}
+                self._tickets_by_id = {}
+                for queue_entry, patient_full_name, patient_phone in rows:
+                    self._add(queue_entry.doctor_id, queue_entry.ticket_number,
+                              _entry_data(queue_entry, patient_full_name, patient_phone))
+                self.queue_date = today
+            logger.info(f"✓ Queue engine rebuilt: {len(rows)} entries for {today}")
+        finally:
+            if own_session:
+                db.close()
+
+    def _add(self, doctor_id: int, ticket_number: int, entry: dict):
+        self._queues.setdefault(doctor_id, DoctorQueue()).add(ticket_number, entry)
+        self._tickets_by_id[entry["id"]] = (doctor_id, ticket_number)
+
+    def _entry(self, queue_id: int) -> Optional[dict]:
+        location = self._tickets_by_id.get(queue_id)
+        if location is None or location[0] not in self._queues:
+            return None
+        return self._queues[location[0]].entries.get(location[1])
+
+    def _ensure_current(self) -> bool:
+        """После полуночи перестраивается; False - движок недоступен, читать из БД"""
+        if self.queue_date == date.today():
+            return True
+        try:
+            self.rebuild()
+        except Exception as e:
+            logger.error(f"✗ Error rebuilding queue engine: {e}")
+            return False
+        return True
+
+    def apply(self, queue_event: dict):
+        """Применяет событие очереди (вызывается брокером в потоке публикации)"""
+        with self._lock:
+            if self.queue_date is None or queue_event.get("queue_date") != self.queue_date.isoformat():
+                return
+            doctor_id = queue_event["doctor_id"]
+            event_type = queue_event["type"]
+
+            if event_type == "add":
+                entry = dict(queue_event["entry"])
+                entry.pop("queue_number", None)
+                entry["queue_date"] = date.fromisoformat(entry["queue_date"])
+                for field in ("created_at", "called_in_at", "finished_at"):
+                    if entry.get(field) is not None:
+                        entry[field] = datetime.fromisoformat(entry[field])
+                self._add(doctor_id, queue_event["ticket_number"], entry)
+            elif event_type == "remove":
+                location = self._tickets_by_id.pop(queue_event["id"], None)
+                if location is not None and location[0] in self._queues:
+                    self._queues[location[0]].remove(location[1])
+            elif event_type == "clear":
+                doctor_queue = self._queues.pop(doctor_id, None)
+                if doctor_queue is not None:
+                    for entry in doctor_queue.entries.values():
+                        self._tickets_by_id.pop(entry["id"], None)
+            elif event_type in ("call", "finish"):
+                entry = self._entry(queue_event["id"])
+                for field in ("called_in_at", "finished_at"):
+                    if entry is not None and queue_event.get(field) is not None:
+                        entry[field] = datetime.fromisoformat(queue_event[field])
+            elif event_type == "priority":
+                location = self._tickets_by_id.get(queue_event["id"])
+                entry = self._entry(queue_event["id"])
+                if entry is not None:
+                    doctor_queue = self._queues[location[0]]
+                    doctor_queue.remove(location[1])
+                    doctor_queue.add(location[1], {**entry, "priority": queue_event["priority"]})
+            elif event_type == "patient":
+                doctor_queue = self._queues.get(doctor_id)
+                for entry in doctor_queue.entries.values() if doctor_queue else ():
+                    if entry["patient_id"] == queue_event["patient_id"]:
+                        entry["patient_full_name"] = queue_event["patient_full_name"]
+                        entry["patient_phone"] = queue_event["patient_phone"]
+
+    def doctor_queue(self, doctor_id: int) -> Optional[List[dict]]:
+        """Сегодняшняя очередь врача из памяти или None, если движок недоступен"""
+        with self._lock:
+            if not self._ensure_current():
+                return None
+            doctor_queue = self._queues.get(doctor_id)
+            return doctor_queue.listing() if doctor_queue is not None else []
+
+    def _memory_rows(self) -> Dict[int, tuple]:
+        rows = {}
+        for doctor_id, doctor_queue in self._queues.items():
+            for ticket_number, entry in doctor_queue.entries.items():
+                rows[entry["id"]] = (doctor_id, ticket_number, entry["priority"], entry["patient_id"],
+                                     entry["patient_full_name"], entry["patient_phone"])
+        return rows
+
+    def check(self, db: Session) -> dict:
+        """Сравнивает движок с таблицей queue за сегодня"""
+        with self._lock:
+            if self.queue_date is None:
+                return {"consistent": False, "queue_date": None, "entries": 0,
+                        "missing": [], "extra": [], "mismatched": []}
+            memory_rows = self._memory_rows()
+            table_rows = {
+                queue_id: tuple(row)
+                for queue_id, *row in db.query(
+                    QueueModel.id, QueueModel.doctor_id, QueueModel.ticket_number,
+                    QueueModel.priority, QueueModel.patient_id, PatientModel.full_name, PatientModel.phone
+                ).join(
+                    PatientModel, QueueModel.patient_id == PatientModel.id
+                ).filter(QueueModel.queue_date == self.queue_date).all()
+            }
+
+        missing = sorted(set(table_rows) - set(memory_rows))
+        extra = sorted(set(memory_rows) - set(table_rows))
+        mismatched = sorted(
+            queue_id for queue_id in set(table_rows) & set(memory_rows)
+            if table_rows[queue_id] != memory_rows[queue_id]
+        )
+        return {
+            "consistent": not (missing or extra or mismatched),
+            "queue_date": self.queue_date,
+            "entries": len(table_rows),
+            "missing": missing,
+            "extra": extra,
+            "mismatched": mismatched
+        }
+
+
+def verify_queue_engine():
+    """
+    Задача планировщика: сверка с таблицей queue за сегодня (один запрос по сегодняшним записям).
+    Расхождение - пропущенные события других воркеров - исправляется перестройкой
+    """
+    db = SessionLocal()
+    try:
+        result = queue_engine.check(db)
+        if queue_engine.queue_date is not None and not result["consistent"]:
+            logger.warning(
+                f"⚠️ Queue engine drift: missing={len(result['missing'])} extra={len(result['extra'])} "
+                f"mismatched={len(result['mismatched'])}, rebuilding"
+            )
+            queue_engine.rebuild(db)
+    except Exception as e:
+        logger.error(f"✗ Error verifying queue engine: {e}")
+    finally:
+        db.close()
+
+
+queue_engine = QueueEngine()
+queue_broker.add_listener(queue_engine.apply)
+queue_broker.add_reconnect_handler(queue_engine.rebuild)
@@ -0,0 +1,140 @@
+"""
+Ожидаемое время ожидания в очереди.
+
+Время приема врача - экспоненциально взвешенное скользящее среднее длительностей
+(finished_at - called_in_at): mean = alpha * x + (1 - alpha) * mean.
+Средние живут в памяти воркера и обновляются событием "finish" из app/utils/queue_events.py
+(и своим, и других воркеров), в таблицу queue_service_times сохраняются периодически
+планировщиком и загружаются при старте.
+
+Ожидание считается за один проход по очереди без запросов к БД: пациенты на приеме
+занимают остаток среднего времени, каждый ожидающий впереди - среднее время целиком.
+"""
+from datetime import datetime
+from threading import Lock
+from typing import Dict, List, Optional, Set
+import logging
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.db.session import SessionLocal, dialect_insert
+from app.models.queue import QueueServiceTime
+from app.utils.queue_events import queue_broker
+
+logger = logging.getLogger(__name__)
+
+
+class ServiceTimeEstimator:
+    def __init__(self, alpha: float, default_seconds: float):
+        self.alpha = alpha
+        self.default_seconds = default_seconds
+        self._means: Dict[int, float] = {}
+        self._samples: Dict[int, int] = {}
+        self._dirty: Set[int] = set()
+        self._lock = Lock()
+
+    def observe(self, doctor_id: int, service_seconds: float):
+        if service_seconds <= 0:
+            return
+        with self._lock:
+            mean = self._means.get(doctor_id)
+            self._means[doctor_id] = service_seconds if mean is None else (
+                self.alpha * service_seconds + (1 - self.alpha) * mean
+            )
+            self._samples[doctor_id] = self._samples.get(doctor_id, 0) + 1
+            self._dirty.add(doctor_id)
+
+    def mean_seconds(self, doctor_id: int) -> float:
+        with self._lock:
+            return self._means.get(doctor_id, self.default_seconds)
+
+    def apply(self, queue_event: dict):
+        """Слушатель брокера событий очереди"""
+        if queue_event["type"] == "finish" and queue_event.get("service_seconds") is not None:
+            self.observe(queue_event["doctor_id"], queue_event["service_seconds"])
+
+    def load(self, db: Optional[Session] = None):
+        own_session = db is None
+        db = db or SessionLocal()
+        try:
+            rows = db.query(QueueServiceTime).all()
+            with self._lock:
+                for row in rows:
+                    if row.doctor_id not in self._dirty:
+                        self._means[row.doctor_id] = row.mean_seconds
+                        self._samples[row.doctor_id] = row.samples
+            logger.info(f"✓ Loaded service times for {len(rows)} doctors")
+        finally:
+            if own_session:
+                db.close()
+
+    def persist(self, db: Optional[Session] = None) -> int:
+        """Сохраняет изменившиеся средние; возвращает число врачей"""
+        with self._lock:
+            rows = [
+                {"doctor_id": doctor_id, "mean_seconds": self._means[doctor_id],
+                 "samples": self._samples[doctor_id], "updated_at": datetime.utcnow()}
+                for doctor_id in self._dirty
+            ]
+            self._dirty = set()
+        if not rows:
+            return 0
+
+        own_session = db is None
+        db = db or SessionLocal()
+        try:
+            stmt = dialect_insert(db)(QueueServiceTime).values(rows)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[QueueServiceTime.doctor_id],
+                set_={
+                    "mean_seconds": stmt.excluded.mean_seconds,
+                    "samples": stmt.excluded.samples,
+                    "updated_at": stmt.excluded.updated_at
+                }
+            )
+            db.execute(stmt)
+            db.commit()
+        except Exception:
+            db.rollback()
+            with self._lock:
+                self._dirty.update(row["doctor_id"] for row in rows)
+            raise
+        finally:
+            if own_session:
+                db.close()
+        return len(rows)
+
+
+def add_wait_estimates(queue_list: List[dict], mean_seconds: float, now: Optional[datetime] = None) -> List[dict]:
+    """
+    Проставляет estimated_wait_minutes записям одной очереди (по порядку позиций), O(n):
+    завершенные - None, на приеме - 0, ожидающие - сумма времени тех, кто впереди.
+    """
+    now = now or datetime.utcnow()
+    ahead_seconds = 0.0
+    for entry in queue_list:
+        if entry.get("finished_at") is not None:
+            entry["estimated_wait_minutes"] = None
+        elif entry.get("called_in_at") is not None:
+            entry["estimated_wait_minutes"] = 0
+            ahead_seconds += max(mean_seconds - (now - entry["called_in_at"]).total_seconds(), 0)
+        else:
+            entry["estimated_wait_minutes"] = round(ahead_seconds / 60)
+            ahead_seconds += mean_seconds
+    return queue_list
+
+
+def persist_service_times():
+    """Задача планировщика"""
+    try:
+        saved = service_time_estimator.persist()
+        if saved:
+            logger.info(f"✓ Saved service times for {saved} doctors")
+    except Exception as e:
+        logger.error(f"✗ Error saving service times: {e}")
+
+
+service_time_estimator = ServiceTimeEstimator(
+    alpha=settings.queue_service_time_alpha,
+    default_seconds=settings.queue_default_service_minutes * 60
+)
+queue_broker.add_listener(service_time_estimator.apply)
@@ -0,0 +1,323 @@
+"""
+События очереди для табло и консолей врачей (SSE и WebSocket в app/routes/queue.py).
+
+Изменения очереди регистрируются в сессии через emit_queue_event() до коммита
+и рассылаются подписчикам этого воркера только после успешного коммита
+(при откате событие отбрасывается).
+
+Несколько воркеров: на PostgreSQL событие дополнительно отправляется через
+pg_notify в той же транзакции, а фоновый поток каждого воркера слушает канал
+(LISTEN) и пересылает чужие события своим подписчикам.
+
+Типы событий:
+    add     - {"type": "add", "doctor_id", "queue_date", "ticket_number", "entry": {... как в GET /queue/doctor/{id} ...}}
+    remove  - {"type": "remove", "doctor_id", "queue_date", "id"}
+    clear   - {"type": "clear", "doctor_id", "queue_date"}
+    patient - {"type": "patient", "doctor_id", "queue_date", "patient_id", "patient_full_name", "patient_phone"}
+              (изменились ФИО или телефон пациента, который стоит в очереди)
+    priority - {"type": "priority", "doctor_id", "queue_date", "id", "priority"} (запись переставлена по приоритету)
+    call    - {"type": "call", "doctor_id", "queue_date", "id", "called_in_at"} (врач вызвал пациента)
+    finish  - {"type": "finish", "doctor_id", "queue_date", "id", "called_in_at", "finished_at", "service_seconds"}
+    resync - подписчик не успевал читать события или LISTEN переподключался (события
+             других воркеров могли потеряться), нужно заново загрузить очередь
+"""
+from datetime import date
+from threading import Event, Lock, Thread
+from typing import Callable, Dict, List, Optional, Set
+import asyncio
+import json
+import logging
+import select
+import uuid
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import NullPool
+from app.core.config import settings
+from app.db.session import SessionLocal
+from app.models.queue import Queue as QueueModel
+from app.models.patient import Patient as PatientModel
+
+logger = logging.getLogger(__name__)
+
+QUEUE_EVENTS_CHANNEL = "queue_events"
+SUBSCRIBER_BUFFER = 256
+LISTEN_POLL_SECONDS = 5
+LISTEN_RECONNECT_SECONDS = 5
+# Свои события воркер доставляет напрямую, из LISTEN берет только чужие
+WORKER_ORIGIN = uuid.uuid4().hex
+
+
+class QueueSubscription:
+    """Очередь событий одного подключения (живет в event loop этого подключения)"""
+
+    def __init__(self, doctor_id: int, loop: asyncio.AbstractEventLoop):
+        self.doctor_id = doctor_id
+        self.loop = loop
+        self.events: asyncio.Queue = asyncio.Queue(maxsize=SUBSCRIBER_BUFFER)
+
+    def deliver(self, queue_event: dict):
+        """Вызывается в event loop подписчика"""
+        try:
+            self.events.put_nowait(queue_event)
+        except asyncio.QueueFull:
+            # Клиент не успевает - отбрасываем накопленное и просим перезагрузить очередь
+            while not self.events.empty():
+                self.events.get_nowait()
+            self.events.put_nowait({"type": "resync", "doctor_id": self.doctor_id})
+
+    async def get(self) -> dict:
+        return await self.events.get()
+
+
+class QueueEventBroker:
+    """Pub/sub внутри воркера: подписчики по doctor_id, публикация из любого потока"""
+
+    def __init__(self):
+        self._subscribers: Dict[int, Set[QueueSubscription]] = {}
+        self._listeners: List[Callable[[dict], None]] = []
+        self._reconnect_handlers: List[Callable[[], None]] = []
+        self._lock = Lock()
+
+    def add_listener(self, listener: Callable[[dict], None]):
+        """Синхронный обработчик всех событий (вызывается в потоке публикации)"""
+        self._listeners.append(listener)
+
+    def add_reconnect_handler(self, handler: Callable[[], None]):
+        """Вызывается после переподключения LISTEN: события других воркеров за разрыв потеряны"""
+        self._reconnect_handlers.append(handler)
+
+    def reconnected(self):
+        """
+        Состояние, собранное из событий, перестраивается из БД, затем все подписчики
+        получают resync и перезагружают очередь (после перестройки - уже актуальную)
+        """
+        for handler in self._reconnect_handlers:
+            try:
+                handler()
+            except Exception as e:
+                logger.error(f"✗ Queue events reconnect handler error: {e}")
+
+        with self._lock:
+            subscribers = [subscription for group in self._subscribers.values() for subscription in group]
+        for subscription in subscribers:
+            self._deliver(subscription, {"type": "resync", "doctor_id": subscription.doctor_id})
+
+    def _deliver(self, subscription: QueueSubscription, queue_event: dict):
+        try:
+            subscription.loop.call_soon_threadsafe(subscription.deliver, queue_event)
+        except RuntimeError:
+            # Event loop уже закрыт - подписчик отключился
+            self.unsubscribe(subscription)
+
+    def subscribe(self, doctor_id: int) -> QueueSubscription:
+        """Вызывается из async кода - подписка привязывается к текущему event loop"""
+        subscription = QueueSubscription(doctor_id, asyncio.get_running_loop())
+        with self._lock:
+            self._subscribers.setdefault(doctor_id, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: QueueSubscription):
+        with self._lock:
+            subscribers = self._subscribers.get(subscription.doctor_id)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[subscription.doctor_id]
+
+    def publish(self, queue_event: dict):
+        """Потокобезопасно: доставка идет через call_soon_threadsafe в loop подписчика"""
+        for listener in self._listeners:
+            try:
+                listener(queue_event)
+            except Exception as e:
+                logger.error(f"✗ Queue event listener error: {e}")
+
+        with self._lock:
+            subscribers = list(self._subscribers.get(queue_event["doctor_id"], ()))
+        for subscription in subscribers:
+            self._deliver(subscription, queue_event)
+
+    def subscribers_count(self) -> int:
+        with self._lock:
+            return sum(len(subscribers) for subscribers in self._subscribers.values())
+
+
+queue_broker = QueueEventBroker()
+
+
+def _is_postgresql(db: Session) -> bool:
+    return db.get_bind().dialect.name == "postgresql"
+
+
+def emit_queue_event(db: Session, queue_event: dict):
+    """Регистрирует событие в транзакции; подписчики получат его после коммита"""
+    db.info.setdefault("queue_events", []).append(queue_event)
+    if _is_postgresql(db):
+        payload = json.dumps({**queue_event, "origin": WORKER_ORIGIN}, default=str)
+        db.execute(text("SELECT pg_notify(:channel, :payload)"), {"channel": QUEUE_EVENTS_CHANNEL, "payload": payload})
+
+
+@event.listens_for(SessionLocal, "after_commit")
+def _publish_committed_queue_events(session: Session):
+    for queue_event in session.info.pop("queue_events", []):
+        queue_broker.publish(queue_event)
+
+
+@event.listens_for(SessionLocal, "after_rollback")
+def _discard_queue_events(session: Session):
+    session.info.pop("queue_events", None)
+
+
+def queue_entry_event(queue_entry: QueueModel, position: int, patient: PatientModel) -> dict:
+    """Событие добавления: запись в том же виде, что и в GET /queue/doctor/{doctor_id}"""
+    return {
+        "type": "add",
+        "doctor_id": queue_entry.doctor_id,
+        "queue_date": queue_entry.queue_date.isoformat(),
+        "ticket_number": queue_entry.ticket_number,
+        "entry": {
+            "id": queue_entry.id,
+            "patient_id": queue_entry.patient_id,
+            "doctor_id": queue_entry.doctor_id,
+            "queue_number": position,
+            "priority": queue_entry.priority,
+            "queue_date": queue_entry.queue_date.isoformat(),
+            "created_at": queue_entry.created_at.isoformat() if queue_entry.created_at else None,
+            "called_in_at": queue_entry.called_in_at.isoformat() if queue_entry.called_in_at else None,
+            "finished_at": queue_entry.finished_at.isoformat() if queue_entry.finished_at else None,
+            "patient_full_name": patient.full_name,
+            "patient_phone": patient.phone
+        }
+    }
+
+
+def queue_remove_event(queue_entry: QueueModel) -> dict:
+    return {
+        "type": "remove",
+        "doctor_id": queue_entry.doctor_id,
+        "queue_date": queue_entry.queue_date.isoformat(),
+        "id": queue_entry.id
+    }
+
+
+def queue_clear_event(doctor_id: int, queue_date: date) -> dict:
+    return {"type": "clear", "doctor_id": doctor_id, "queue_date": queue_date.isoformat()}
+
+
+def queue_priority_event(queue_entry: QueueModel) -> dict:
+    return {
+        "type": "priority",
+        "doctor_id": queue_entry.doctor_id,
+        "queue_date": queue_entry.queue_date.isoformat(),
+        "id": queue_entry.id,
+        "priority": queue_entry.priority
+    }
+
+
+def queue_call_event(queue_entry: QueueModel) -> dict:
+    return {
+        "type": "call",
+        "doctor_id": queue_entry.doctor_id,
+        "queue_date": queue_entry.queue_date.isoformat(),
+        "id": queue_entry.id,
+        "called_in_at": queue_entry.called_in_at.isoformat()
+    }
+
+
+def queue_finish_event(queue_entry: QueueModel) -> dict:
+    """service_seconds - длительность приема, если пациента вызывали (иначе None)"""
+    service_seconds = None
+    if queue_entry.called_in_at is not None:
+        service_seconds = (queue_entry.finished_at - queue_entry.called_in_at).total_seconds()
+    return {
+        "type": "finish",
+        "doctor_id": queue_entry.doctor_id,
+        "queue_date": queue_entry.queue_date.isoformat(),
+        "id": queue_entry.id,
+        "called_in_at": queue_entry.called_in_at.isoformat() if queue_entry.called_in_at else None,
+        "finished_at": queue_entry.finished_at.isoformat(),
+        "service_seconds": service_seconds
+    }
+
+
+def queue_patient_event(queue_entry: QueueModel, patient: PatientModel) -> dict:
+    return {
+        "type": "patient",
+        "doctor_id": queue_entry.doctor_id,
+        "queue_date": queue_entry.queue_date.isoformat(),
+        "patient_id": patient.id,
+        "patient_full_name": patient.full_name,
+        "patient_phone": patient.phone
+    }
+
+
+def emit_patient_queue_events(db: Session, patient: PatientModel, removed: bool = False):
+    """События для сегодняшних очередей пациента: после изменения ФИО/телефона или перед удалением"""
+    for queue_entry in db.query(QueueModel).filter(
+        QueueModel.patient_id == patient.id,
+        QueueModel.queue_date == date.today()
+    ).all():
+        emit_queue_event(db, queue_remove_event(queue_entry) if removed else queue_patient_event(queue_entry, patient))
+
+
+class PostgresQueueEventListener(Thread):
+    """Фоновый LISTEN: события других воркеров пересылаются подписчикам этого воркера"""
+
+    def __init__(self, database_url: str):
+        super().__init__(name="queue-events-listener", daemon=True)
+        self.database_url = database_url
+        self._stopped = Event()
+
+    def stop(self):
+        self._stopped.set()
+
+    def run(self):
+        engine = create_engine(self.database_url, poolclass=NullPool)
+        connected_before = False
+        while not self._stopped.is_set():
+            connection = None
+            try:
+                connection = engine.raw_connection()
+                dbapi_connection = connection.dbapi_connection
+                dbapi_connection.autocommit = True
+                dbapi_connection.cursor().execute(f"LISTEN {QUEUE_EVENTS_CHANNEL};")
+                logger.info("✓ Listening for queue events")
+                if connected_before:
+                    # NOTIFY, отправленные пока соединения не было, не придут
+                    queue_broker.reconnected()
+                connected_before = True
+
+                while not self._stopped.is_set():
+                    if select.select([dbapi_connection], [], [], LISTEN_POLL_SECONDS) == ([], [], []):
+                        continue
+                    dbapi_connection.poll()
+                    while dbapi_connection.notifies:
+                        self._dispatch(dbapi_connection.notifies.pop(0).payload)
+            except Exception as e:
+                logger.error(f"✗ Queue events listener error: {e}")
+                self._stopped.wait(LISTEN_RECONNECT_SECONDS)
+            finally:
+                if connection is not None:
+                    connection.close()
+
+    def _dispatch(self, payload: str):
+        try:
+            queue_event = json.loads(payload)
+        except ValueError:
+            logger.warning(f"⚠️ Malformed queue event: {payload[:200]}")
+            return
+        if queue_event.pop("origin", None) != WORKER_ORIGIN:
+            queue_broker.publish(queue_event)
+
+
+_listener: Optional[PostgresQueueEventListener] = None
+
+
+def start_queue_event_listener():
+    """Запускается при старте приложения; на SQLite (один процесс) не нужен"""
+    global _listener
+    database_url = settings.queue_events_database_url or settings.database_url
+    if not database_url.startswith("postgresql") or _listener is not None:
+        return
+    _listener = PostgresQueueEventListener(database_url)
+    _listener.start()
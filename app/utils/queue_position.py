@@ -0,0 +1,87 @@
+"""
+Позиция пациента в очереди.
+
+В таблице хранится неизменяемый номер талона (ticket_number) и приоритет, а позиция (1, 2, 3...),
+которую видят регистратура и врач, считается при чтении:
+ROW_NUMBER() OVER (PARTITION BY doctor_id, queue_date ORDER BY priority DESC, ticket_number).
+Удаление из очереди и смена приоритета меняют одну строку, без пересчета номеров остальных.
+"""
+from datetime import date
+from typing import Dict, List
+from sqlalchemy import and_, func, or_
+from sqlalchemy.orm import Session
+from app.models.queue import Queue as QueueModel
+
+
+def queue_position_column():
+    """Позиция записи в очереди своего врача на свою дату"""
+    return func.row_number().over(
+        partition_by=(QueueModel.doctor_id, QueueModel.queue_date),
+        order_by=queue_order()
+    )
+
+
+def queue_order():
+    """Порядок очереди: сначала более высокий приоритет, внутри приоритета - по талонам"""
+    return (QueueModel.priority.desc(), QueueModel.ticket_number)
+
+
+def queue_position(db: Session, queue_entry: QueueModel) -> int:
+    """Позиция одной записи: сколько записей этого врача на эту дату стоят не позже нее"""
+    return db.query(func.count(QueueModel.id)).filter(
+        QueueModel.doctor_id == queue_entry.doctor_id,
+        QueueModel.queue_date == queue_entry.queue_date,
+        or_(
+            QueueModel.priority > queue_entry.priority,
+            and_(QueueModel.priority == queue_entry.priority, QueueModel.ticket_number <= queue_entry.ticket_number)
+        )
+    ).scalar()
+
+
+def queue_positions(db: Session, queue_entries: List[QueueModel]) -> Dict[int, int]:
+    """Позиции нескольких записей одной даты одним запросом: {id записи: позиция}"""
+    if not queue_entries:
+        return {}
+    positions = db.query(
+        QueueModel.id,
+        queue_position_column().label("position")
+    ).filter(
+        QueueModel.doctor_id.in_({queue_entry.doctor_id for queue_entry in queue_entries}),
+        QueueModel.queue_date == queue_entries[0].queue_date
+    ).subquery()
+    return dict(db.query(positions.c.id, positions.c.position).filter(
+        positions.c.id.in_([queue_entry.id for queue_entry in queue_entries])
+    ).all())
+
+
+def patient_queue_positions(db: Session, doctor_id: int, queue_date: date):
+    """
+    Подзапрос (patient_id, queue_number) по очереди врача на дату - для LEFT JOIN
+    к списку пациентов одним запросом вместо запроса на каждого пациента
+    """
+    positions = db.query(
+        QueueModel.patient_id,
+        queue_position_column().label("position")
+    ).filter(
+        QueueModel.doctor_id == doctor_id,
+        QueueModel.queue_date == queue_date
+    ).subquery()
+    return db.query(
+        positions.c.patient_id,
+        func.min(positions.c.position).label("queue_number")
+    ).group_by(positions.c.patient_id).subquery()
+
+
+def queue_entry_data(queue_entry: QueueModel, position: int) -> dict:
+    """Запись очереди в формате ответа API: queue_number - позиция, а не номер талона"""
+    return {
+        "id": queue_entry.id,
+        "patient_id": queue_entry.patient_id,
+        "doctor_id": queue_entry.doctor_id,
+        "queue_number": position,
+        "priority": queue_entry.priority,
+        "queue_date": queue_entry.queue_date,
+        "created_at": queue_entry.created_at,
+        "called_in_at": queue_entry.called_in_at,
+        "finished_at": queue_entry.finished_at
+    }
@@ -1,8 +1,13 @@
 from apscheduler.schedulers.background import BackgroundScheduler
 from apscheduler.triggers.cron import CronTrigger
-from datetime import date
-from app.db.session import SessionLocal
-from app.models.queue import Queue as QueueModel
+from apscheduler.triggers.interval import IntervalTrigger
+from datetime import date, datetime
+from app.core.config import settings
+from app.utils.queue_cleanup import run_queue_cleanup
+from app.utils.queue_engine import queue_engine, verify_queue_engine
+from app.utils.queue_eta import persist_service_times
+from app.utils.patient_suggest import reconcile_patient_suggest_index, sync_patient_suggest_index
+from app.utils.stats_snapshot import refresh_stats_snapshot
 import logging
 
 logger = logging.getLogger(__name__)
@@ -10,22 +15,24 @@ logger = logging.getLogger(__name__)
 
 def clear_old_queues():
     """
-    Очистка всех очередей, которые старше сегодняшней даты.
-    Вызывается автоматически каждый день в 00:00.
+    Перенос всех очередей, которые старше сегодняшней даты, в архив (queue_archive).
+    Вызывается автоматически каждый день в 00:00 в каждом воркере; саму очистку выполняет
+    один воркер (advisory lock), очереди в памяти перестраивает каждый.
     """
-    db = SessionLocal()
+    if settings.queue_cleanup_in_scheduler:
+        try:
+            result = run_queue_cleanup()
+            if result is not None:
+                print(f"✓ Queue reset completed at {date.today()}. Archived {result.archived} old entries.")
+        except Exception as e:
+            logger.error(f"✗ Error clearing old queues: {e}")
+            print(f"✗ Error clearing old queues: {e}")
+
+    # Новый день - перестраиваем очереди в памяти
     try:
-        today = date.today()
-        deleted_count = db.query(QueueModel).filter(QueueModel.queue_date < today).delete()
-        db.commit()
-        logger.info(f"✓ Queue reset completed. Removed {deleted_count} old entries.")
-        print(f"✓ Queue reset completed at {date.today()}. Removed {deleted_count} old entries.")
+        queue_engine.rebuild()
     except Exception as e:
-        db.rollback()
-        logger.error(f"✗ Error clearing old queues: {e}")
-        print(f"✗ Error clearing old queues: {e}")
-    finally:
-        db.close()
+        logger.error(f"✗ Error rebuilding queue engine: {e}")
 
 
 def start_scheduler():
@@ -43,6 +50,52 @@ def start_scheduler():
         replace_existing=True
     )
 
+    # Средние времени приема врачей - в БД
+    scheduler.add_job(
+        persist_service_times,
+        trigger=IntervalTrigger(seconds=settings.queue_service_time_persist_seconds),
+        id="persist_service_times",
+        name="Persist doctor service times",
+        replace_existing=True
+    )
+
+    # Очереди в памяти против таблицы queue - на случай потерянных событий других воркеров
+    scheduler.add_job(
+        verify_queue_engine,
+        trigger=IntervalTrigger(seconds=settings.queue_engine_check_seconds),
+        id="verify_queue_engine",
+        name="Verify in-memory queues",
+        replace_existing=True
+    )
+
+    # Индекс подсказок пациентов - изменения, сделанные в других воркерах
+    scheduler.add_job(
+        sync_patient_suggest_index,
+        trigger=IntervalTrigger(seconds=settings.patient_suggest_sync_seconds),
+        id="sync_patient_suggest_index",
+        name="Sync patient suggest index",
+        replace_existing=True
+    )
+
+    # Индекс подсказок пациентов - удаленные в других воркерах (сверка со всей таблицей, редко)
+    scheduler.add_job(
+        reconcile_patient_suggest_index,
+        trigger=IntervalTrigger(seconds=settings.patient_suggest_reconcile_seconds),
+        id="reconcile_patient_suggest_index",
+        name="Reconcile patient suggest index",
+        replace_existing=True
+    )
+
+    # Колоночный снимок записей для срезов статистики - вне запросов /stats
+    scheduler.add_job(
+        refresh_stats_snapshot,
+        trigger=IntervalTrigger(seconds=settings.stats_snapshot_refresh_seconds),
+        id="refresh_stats_snapshot",
+        name="Refresh stats snapshot",
+        replace_existing=True,
+        next_run_time=datetime.now()
+    )
+
     scheduler.start()
     logger.info("✓ Scheduler started. Queue reset scheduled for 00:00 daily.")
     print("✓ Scheduler started. Queue reset scheduled for 00:00 daily.")
@@ -0,0 +1,430 @@
+"""
+Агрегация статистики одним GROUP BY запросом вместо запроса на каждый день или врача.
+Данные читаются из дневных сводок (daily_stats_rollup, daily_patients_rollup).
+"""
+from datetime import date, timedelta
+from decimal import Decimal
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+from sqlalchemy import func, and_
+from sqlalchemy.orm import Session
+from app.models.stats_rollup import DailyStatsRollup, DailyPatientsRollup
+from app.models.user import User
+from app.schemas.stats import (
+    DailyStats, WeeklyStats, MonthlyStats, DailyFinancialStats, WeeklyFinancialStats, MonthlyFinancialStats,
+    DoctorDayStats
+)
+
+
+class AppointmentTotals(NamedTuple):
+    """Суммы по записям за период"""
+    appointments_count: int = 0
+    completed_count: int = 0
+    pending_count: int = 0
+    revenue: Decimal = Decimal(0)
+    completed_revenue: Decimal = Decimal(0)
+    pending_revenue: Decimal = Decimal(0)
+    cost_count: int = 0
+
+    @property
+    def average_cost(self) -> Decimal:
+        """Средняя стоимость среди записей с указанной стоимостью"""
+        if not self.cost_count:
+            return Decimal(0)
+        return Decimal(self.revenue) / self.cost_count
+
+
+def _as_date(value) -> date:
+    """SQLite возвращает даты строкой, PostgreSQL - объектом date"""
+    if isinstance(value, str):
+        return date.fromisoformat(value)
+    return value
+
+
+def iter_dates(start_date: date, end_date: date):
+    """Все даты диапазона [start_date, end_date] включительно"""
+    current_date = start_date
+    while current_date <= end_date:
+        yield current_date
+        current_date += timedelta(days=1)
+
+
+def month_last_day(year: int, month: int) -> date:
+    """Последний день календарного месяца"""
+    return date(year + month // 12, month % 12 + 1, 1) - timedelta(days=1)
+
+
+def recent_months(today: date, months: int) -> List[Tuple[int, int]]:
+    """Последние N календарных месяцев, включая текущий: [(год, месяц)], от нового к старому"""
+    periods = []
+    year, month = today.year, today.month
+    for _ in range(months):
+        periods.append((year, month))
+        year, month = (year, month - 1) if month > 1 else (year - 1, 12)
+    return periods
+
+
+def month_weeks(year: int, month: int, last_day: date) -> List[Tuple[date, date]]:
+    """
+    Календарные недели (понедельник - воскресенье) месяца, обрезанные по границам месяца
+    и по last_day (для текущего месяца - без будущих дней)
+    """
+    first_day = date(year, month, 1)
+    last_day = min(month_last_day(year, month), last_day)
+    weeks = []
+    week_start = first_day
+    while week_start <= last_day:
+        week_end = min(week_start + timedelta(days=6 - week_start.weekday()), last_day)
+        weeks.append((week_start, week_end))
+        week_start = week_end + timedelta(days=1)
+    return weeks
+
+
+def _totals_columns():
+    """Колонки для AppointmentTotals (условная агрегация FILTER по статусу)"""
+    rollup = DailyStatsRollup
+    return (
+        func.coalesce(func.sum(rollup.appointments_count), 0),
+        func.coalesce(func.sum(rollup.appointments_count).filter(rollup.status == "done"), 0),
+        func.coalesce(func.sum(rollup.appointments_count).filter(rollup.status == "scheduled"), 0),
+        func.coalesce(func.sum(rollup.cost_sum), 0),
+        func.coalesce(func.sum(rollup.cost_sum).filter(rollup.status == "done"), 0),
+        func.coalesce(func.sum(rollup.cost_sum).filter(rollup.status == "scheduled"), 0),
+        func.coalesce(func.sum(rollup.cost_count), 0),
+    )
+
+
+def _date_filters(column, start_date: Optional[date], end_date: Optional[date]) -> list:
+    filters = []
+    if start_date is not None:
+        filters.append(column >= start_date)
+    if end_date is not None:
+        filters.append(column <= end_date)
+    return filters
+
+
+def appointment_totals(db: Session, start_date: Optional[date] = None, end_date: Optional[date] = None,
+                       doctor_id: Optional[int] = None) -> AppointmentTotals:
+    """Суммы по записям за период (без границ - за все время)"""
+    filters = _date_filters(DailyStatsRollup.stat_date, start_date, end_date)
+    if doctor_id is not None:
+        filters.append(DailyStatsRollup.doctor_id == doctor_id)
+    row = db.query(*_totals_columns()).filter(*filters).one()
+    return AppointmentTotals(*row)
+
+
+def appointment_totals_by_day(db: Session, start_date: date, end_date: date) -> Dict[date, AppointmentTotals]:
+    """Суммы по записям по дням: {дата: AppointmentTotals}"""
+    rows = db.query(
+        DailyStatsRollup.stat_date,
+        *_totals_columns()
+    ).filter(
+        *_date_filters(DailyStatsRollup.stat_date, start_date, end_date)
+    ).group_by(DailyStatsRollup.stat_date).all()
+
+    return {_as_date(row[0]): AppointmentTotals(*row[1:]) for row in rows}
+
+
+def new_patients_count(db: Session, start_date: Optional[date] = None, end_date: Optional[date] = None) -> int:
+    """Количество новых пациентов за период (без границ - всего пациентов)"""
+    return db.query(
+        func.coalesce(func.sum(DailyPatientsRollup.new_patients_count), 0)
+    ).filter(
+        *_date_filters(DailyPatientsRollup.stat_date, start_date, end_date)
+    ).scalar()
+
+
+def count_new_patients_by_day(db: Session, start_date: date, end_date: date) -> Dict[date, int]:
+    """Количество новых пациентов по дням: {дата: количество}"""
+    rows = db.query(
+        DailyPatientsRollup.stat_date,
+        DailyPatientsRollup.new_patients_count
+    ).filter(
+        *_date_filters(DailyPatientsRollup.stat_date, start_date, end_date)
+    ).all()
+
+    return {_as_date(day): count for day, count in rows}
+
+
+def build_daily_stats(db: Session, start_date: date, end_date: date) -> List[DailyStats]:
+    """
+    Ежедневная статистика за период.
+    Два запроса независимо от длины периода, дни без данных заполняются нулями.
+    """
+    totals_by_day = appointment_totals_by_day(db, start_date, end_date)
+    new_patients_by_day = count_new_patients_by_day(db, start_date, end_date)
+
+    daily_stats = []
+    for current_date in iter_dates(start_date, end_date):
+        totals = totals_by_day.get(current_date, AppointmentTotals())
+        daily_stats.append(DailyStats(
+            date=current_date,
+            appointments_count=totals.appointments_count,
+            completed_count=totals.completed_count,
+            new_patients_count=new_patients_by_day.get(current_date, 0)
+        ))
+
+    return daily_stats
+
+
+def summarize_daily_stats(daily_stats: List[DailyStats]) -> Tuple[int, int, int]:
+    """Суммы по списку дней: (записи, завершенные, новые пациенты)"""
+    return (
+        sum(day.appointments_count for day in daily_stats),
+        sum(day.completed_count for day in daily_stats),
+        sum(day.new_patients_count for day in daily_stats)
+    )
+
+
+def build_weekly_stats(daily_by_date: Dict[date, DailyStats], week_start: date, week_end: date) -> WeeklyStats:
+    """Недельная статистика из уже посчитанных дней (без запросов к БД)"""
+    daily_breakdown = [daily_by_date[day] for day in iter_dates(week_start, week_end)]
+    appointments_count, completed_count, new_patients = summarize_daily_stats(daily_breakdown)
+    return WeeklyStats(
+        week_start=week_start,
+        week_end=week_end,
+        appointments_count=appointments_count,
+        completed_count=completed_count,
+        new_patients_count=new_patients,
+        daily_breakdown=daily_breakdown
+    )
+
+
+def build_monthly_stats(db: Session, today: date, months: int) -> List[MonthlyStats]:
+    """
+    Месяц → недели → дни за последние N месяцев.
+    Дневные сводки читаются одним диапазоном, недели и месяцы собираются в памяти.
+    """
+    periods = recent_months(today, months)
+    oldest_year, oldest_month = periods[-1]
+    daily_by_date = {
+        day.date: day for day in build_daily_stats(db, date(oldest_year, oldest_month, 1), today)
+    }
+
+    monthly_stats = []
+    for year, month in periods:
+        weekly_breakdown = [
+            build_weekly_stats(daily_by_date, week_start, week_end)
+            for week_start, week_end in month_weeks(year, month, today)
+        ]
+        monthly_stats.append(MonthlyStats(
+            month=month,
+            year=year,
+            appointments_count=sum(week.appointments_count for week in weekly_breakdown),
+            completed_count=sum(week.completed_count for week in weekly_breakdown),
+            new_patients_count=sum(week.new_patients_count for week in weekly_breakdown),
+            weekly_breakdown=weekly_breakdown
+        ))
+
+    return monthly_stats
+
+
+def add_totals(totals: Iterable[AppointmentTotals]) -> AppointmentTotals:
+    """Поэлементная сумма нескольких AppointmentTotals"""
+    return AppointmentTotals(*(sum(values) for values in zip(*totals)))
+
+
+def daily_financial_stats(day: date, totals: AppointmentTotals) -> DailyFinancialStats:
+    """Финансовая статистика одного дня из AppointmentTotals"""
+    return DailyFinancialStats(
+        date=day,
+        revenue=totals.revenue,
+        completed_revenue=totals.completed_revenue,
+        appointments_count=totals.appointments_count,
+        average_cost=totals.average_cost
+    )
+
+
+def build_daily_financial_stats(totals_by_day: Dict[date, AppointmentTotals],
+                                start_date: date, end_date: date) -> List[DailyFinancialStats]:
+    """Ежедневная финансовая статистика за период, дни без данных заполняются нулями"""
+    return [
+        daily_financial_stats(current_date, totals_by_day.get(current_date, AppointmentTotals()))
+        for current_date in iter_dates(start_date, end_date)
+    ]
+
+
+def _doctors_with_rollup(db: Session, *columns, join_filters: Iterable = ()):
+    """
+    Врачи с LEFT JOIN на сводку - врачи без записей тоже попадают в результат.
+    Ограничения по датам передаются в join_filters (в условие JOIN, а не в WHERE).
+    """
+    return db.query(User.id, User.full_name, *columns).outerjoin(
+        DailyStatsRollup, and_(DailyStatsRollup.doctor_id == User.id, *join_filters)
+    ).filter(User.role == "doctor").group_by(User.id, User.full_name).order_by(User.id)
+
+
+def appointment_totals_by_doctor(db: Session, start_date: Optional[date] = None,
+                                 end_date: Optional[date] = None) -> List[Tuple[int, str, AppointmentTotals]]:
+    """Суммы по записям для каждого врача: [(doctor_id, doctor_name, AppointmentTotals)]"""
+    rows = _doctors_with_rollup(
+        db, *_totals_columns(),
+        join_filters=_date_filters(DailyStatsRollup.stat_date, start_date, end_date)
+    ).all()
+    return [(row[0], row[1], AppointmentTotals(*row[2:])) for row in rows]
+
+
+def sum_revenue_by_doctor(db: Session, today: date, week_ago: date, month_ago: date):
+    """
+    Финансовые показатели по врачам одним запросом.
+    Строки: (doctor_id, doctor_name, AppointmentTotals, выручка сегодня, за неделю, за месяц)
+    """
+    rollup = DailyStatsRollup
+    rows = _doctors_with_rollup(
+        db,
+        *_totals_columns(),
+        func.coalesce(func.sum(rollup.cost_sum).filter(rollup.stat_date == today), 0),
+        func.coalesce(func.sum(rollup.cost_sum).filter(rollup.stat_date >= week_ago), 0),
+        func.coalesce(func.sum(rollup.cost_sum).filter(rollup.stat_date >= month_ago), 0)
+    ).all()
+    return [(row[0], row[1], AppointmentTotals(*row[2:9]), *row[9:]) for row in rows]
+
+
+class DoctorDay(NamedTuple):
+    """День врача с местом в рейтинге дней этого врача (1 - лучший)"""
+    stat_date: date
+    appointments_count: int
+    revenue: Decimal
+    day_rank: int
+
+
+def rank_doctor_days(db: Session, start_date: date, end_date: date, order_by: str = "revenue",
+                     max_rank: Optional[int] = None) -> Dict[int, List[DoctorDay]]:
+    """
+    Дни врачей за период, ранжированные одним запросом:
+    ROW_NUMBER() OVER (PARTITION BY doctor_id ORDER BY <revenue|appointments> DESC, stat_date).
+    order_by - "revenue" или "appointments"; max_rank ограничивает результат лучшими днями,
+    без него возвращается весь ряд. Результат: {doctor_id: [DoctorDay]} в порядке рейтинга.
+    """
+    rollup = DailyStatsRollup
+    daily = db.query(
+        rollup.doctor_id.label("doctor_id"),
+        rollup.stat_date.label("stat_date"),
+        func.coalesce(func.sum(rollup.appointments_count), 0).label("appointments_count"),
+        func.coalesce(func.sum(rollup.cost_sum), 0).label("revenue")
+    ).filter(
+        *_date_filters(rollup.stat_date, start_date, end_date)
+    ).group_by(rollup.doctor_id, rollup.stat_date).subquery()
+
+    rank_column = daily.c.revenue if order_by == "revenue" else daily.c.appointments_count
+    ranked = db.query(
+        daily,
+        func.row_number().over(
+            partition_by=daily.c.doctor_id,
+            order_by=(rank_column.desc(), daily.c.stat_date)
+        ).label("day_rank")
+    ).subquery()
+
+    query = db.query(ranked)
+    if max_rank is not None:
+        query = query.filter(ranked.c.day_rank <= max_rank)
+
+    days_by_doctor: Dict[int, List[DoctorDay]] = {}
+    for row in query.order_by(ranked.c.doctor_id, ranked.c.day_rank).all():
+        days_by_doctor.setdefault(row.doctor_id, []).append(DoctorDay(
+            _as_date(row.stat_date), row.appointments_count, Decimal(row.revenue), row.day_rank
+        ))
+    return days_by_doctor
+
+
+def top_doctor_days(days: List[DoctorDay], top_n: int, order_by: str = "revenue") -> List[DoctorDay]:
+    """Лучшие top_n дней (дни с нулевым показателем не считаются лучшими)"""
+    return [
+        day for day in days
+        if day.day_rank <= top_n and (day.revenue if order_by == "revenue" else day.appointments_count) > 0
+    ]
+
+
+def doctor_day_stats(day: DoctorDay) -> DoctorDayStats:
+    return DoctorDayStats(date=day.stat_date, appointments_count=day.appointments_count, revenue=day.revenue)
+
+
+def build_doctor_day_series(days: List[DoctorDay], start_date: date, end_date: date) -> List[DoctorDayStats]:
+    """Дневной ряд врача по датам, дни без записей заполняются нулями"""
+    by_date = {day.stat_date: day for day in days}
+    return [
+        doctor_day_stats(by_date.get(current_date, DoctorDay(current_date, 0, Decimal(0), 0)))
+        for current_date in iter_dates(start_date, end_date)
+    ]
+
+
+def sum_totals_by_day(totals_by_day: Dict[date, AppointmentTotals], start_date: date, end_date: date) -> AppointmentTotals:
+    """Суммы по дням [start_date, end_date] из уже загруженных дневных сумм"""
+    return add_totals(
+        totals_by_day[day] for day in iter_dates(start_date, end_date) if day in totals_by_day
+    )
+
+
+def build_weekly_financial_stats(totals_by_day: Dict[date, AppointmentTotals],
+                                 week_start: date, week_end: date) -> WeeklyFinancialStats:
+    """Недельная финансовая статистика из уже загруженных дневных сумм"""
+    week_totals = sum_totals_by_day(totals_by_day, week_start, week_end)
+    return WeeklyFinancialStats(
+        week_start=week_start,
+        week_end=week_end,
+        total_revenue=week_totals.revenue,
+        completed_revenue=week_totals.completed_revenue,
+        appointments_count=week_totals.appointments_count,
+        average_cost=week_totals.average_cost,
+        daily_breakdown=build_daily_financial_stats(totals_by_day, week_start, week_end)
+    )
+
+
+def build_monthly_financial_stats(db: Session, today: date, months: int) -> List[MonthlyFinancialStats]:
+    """
+    Финансовая статистика месяц → недели → дни за последние N месяцев.
+    Один GROUP BY по дневной сводке, недели и месяцы собираются в памяти.
+    """
+    periods = recent_months(today, months)
+    oldest_year, oldest_month = periods[-1]
+    totals_by_day = appointment_totals_by_day(db, date(oldest_year, oldest_month, 1), today)
+
+    monthly_stats = []
+    for year, month in periods:
+        month_totals = sum_totals_by_day(
+            totals_by_day, date(year, month, 1), min(month_last_day(year, month), today)
+        )
+        monthly_stats.append(MonthlyFinancialStats(
+            month=month,
+            year=year,
+            total_revenue=month_totals.revenue,
+            completed_revenue=month_totals.completed_revenue,
+            appointments_count=month_totals.appointments_count,
+            average_cost=month_totals.average_cost,
+            weekly_breakdown=[
+                build_weekly_financial_stats(totals_by_day, week_start, week_end)
+                for week_start, week_end in month_weeks(year, month, today)
+            ]
+        ))
+
+    return monthly_stats
+
+
+def rollup_slice(db: Session, start_date: Optional[date] = None, end_date: Optional[date] = None,
+                 doctor_id: Optional[int] = None, status: Optional[str] = None,
+                 group_by: Optional[str] = None) -> List[Tuple[str, int, Decimal]]:
+    """
+    Срез по дневной сводке: [(ключ группы, записи, выручка)].
+    group_by - "day", "doctor", "status" или None (одна строка с ключом "all").
+    """
+    rollup = DailyStatsRollup
+    group_column = {"day": rollup.stat_date, "doctor": rollup.doctor_id, "status": rollup.status}.get(group_by)
+    filters = _date_filters(rollup.stat_date, start_date, end_date)
+    if doctor_id is not None:
+        filters.append(rollup.doctor_id == doctor_id)
+    if status is not None:
+        filters.append(rollup.status == status)
+
+    columns = [
+        func.coalesce(func.sum(rollup.appointments_count), 0),
+        func.coalesce(func.sum(rollup.cost_sum), 0)
+    ]
+    if group_column is None:
+        count, revenue = db.query(*columns).filter(*filters).one()
+        return [("all", count, Decimal(revenue))]
+
+    rows = db.query(group_column, *columns).filter(*filters).group_by(group_column).order_by(group_column).all()
+    return [
+        (str(_as_date(key)) if group_by == "day" else str(key), count, Decimal(revenue))
+        for key, count, revenue in rows
+        if count
+    ]
@@ -0,0 +1,102 @@
+"""
+Кэш ответов статистики (в памяти воркера).
+
+Записи живут не дольше TTL, количество ограничено (LRU вытеснение).
+Любая запись в БД, влияющая на статистику, увеличивает счетчик версии -
+все ранее закэшированные ответы становятся недействительными.
+Другие воркеры узнают об изменениях не позже, чем через TTL.
+"""
+from collections import OrderedDict
+from threading import Lock
+from typing import Any, Callable, Hashable, Tuple
+import time
+from fastapi import Request, Response
+from app.core.config import settings
+
+STATS_CACHE_HEADER = "X-Stats-Cache"
+
+
+class StatsCache:
+    def __init__(self, max_entries: int, ttl_seconds: float):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.version = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries: "OrderedDict[Hashable, Tuple[int, float, Any]]" = OrderedDict()
+        self._lock = Lock()
+
+    def invalidate(self):
+        """Сбросить кэш после изменения данных"""
+        with self._lock:
+            self.version += 1
+
+    def get_or_compute(self, key: Hashable, compute: Callable[[], Any], bypass: bool = False,
+                       should_cache: Callable[[Any], bool] = None) -> Tuple[Any, str]:
+        """
+        Возвращает (значение, состояние), где состояние - "hit", "miss" или "bypass".
+        При bypass значение всегда вычисляется заново и обновляет кэш.
+        should_cache позволяет не сохранять неполные результаты.
+        """
+        now = time.monotonic()
+        with self._lock:
+            version = self.version
+            entry = self._entries.get(key)
+            if not bypass and entry is not None:
+                entry_version, expires_at, value = entry
+                if entry_version == version and expires_at > now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value, "hit"
+            if not bypass:
+                self.misses += 1
+
+        # Вычисляем вне блокировки - другие запросы не ждут медленный отчет
+        value = compute()
+        if should_cache is not None and not should_cache(value):
+            return value, "bypass" if bypass else "miss"
+
+        with self._lock:
+            self._entries[key] = (version, time.monotonic() + self.ttl_seconds, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+        return value, "bypass" if bypass else "miss"
+
+    def metrics(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "version": self.version,
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups * 100, 2) if lookups else 0.0
+            }
+
+
+stats_cache = StatsCache(settings.stats_cache_max_entries, settings.stats_cache_ttl_seconds)
+
+
+def invalidate_stats_cache():
+    """Вызывается после коммита изменений записей/пациентов"""
+    stats_cache.invalidate()
+
+
+def cached_stats(request: Request, response: Response, key: Hashable, compute: Callable[[], Any],
+                 should_cache: Callable[[Any], bool] = None) -> Any:
+    """
+    Ответ эндпоинта статистики через кэш.
+    Заголовок запроса `X-Stats-Cache: bypass` принудительно пересчитывает ответ,
+    в ответе заголовок `X-Stats-Cache` показывает hit / miss / bypass.
+    """
+    bypass = request.headers.get(STATS_CACHE_HEADER, "").lower() == "bypass"
+    value, state = stats_cache.get_or_compute(key, compute, bypass=bypass, should_cache=should_cache)
+    response.headers[STATS_CACHE_HEADER] = state
+    return value
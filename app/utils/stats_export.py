@@ -0,0 +1,167 @@
+"""
+Потоковая выгрузка записей и финансовой статистики в CSV / NDJSON.
+
+Строки читаются серверным курсором (yield_per) в отдельной сессии внутри генератора
+и отдаются клиенту пачками - память не растет с размером выгрузки, а заголовок
+уходит клиенту до завершения запроса.
+"""
+from datetime import date, timedelta
+from typing import Iterator, List, Optional
+import csv
+import io
+import json
+from sqlalchemy import func
+from app.db.session import SessionLocal
+from app.models.appointment import Appointment
+from app.models.patient import Patient
+from app.models.stats_rollup import DailyStatsRollup
+from app.models.user import User
+from app.utils.date_buckets import clinic_date, day_start
+from app.utils.stats_aggregation import _as_date
+
+EXPORT_BATCH_SIZE = 1000
+EXPORT_MEDIA_TYPES = {
+    "csv": "text/csv; charset=utf-8",
+    "ndjson": "application/x-ndjson",
+}
+
+APPOINTMENT_EXPORT_COLUMNS = [
+    "id", "date", "clinic_date", "doctor_id", "doctor_name",
+    "patient_id", "patient_full_name", "status", "cost"
+]
+FINANCIAL_EXPORT_COLUMNS = [
+    "date", "doctor_id", "doctor_name", "appointments_count", "completed_count",
+    "revenue", "completed_revenue", "pending_revenue"
+]
+
+
+def _format_value(value):
+    if value is None:
+        return None
+    if isinstance(value, (int, float, str)):
+        return value
+    if isinstance(value, date):
+        return value.isoformat()
+    return str(value)
+
+
+def _encode_rows(rows: Iterator[tuple], columns: List[str], export_format: str) -> Iterator[str]:
+    """Кодирует строки пачками по EXPORT_BATCH_SIZE; заголовок CSV отдается сразу"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer) if export_format == "csv" else None
+
+    if writer is not None:
+        writer.writerow(columns)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+
+    pending = 0
+    try:
+        for row in rows:
+            values = [_format_value(value) for value in row]
+            if writer is not None:
+                writer.writerow(["" if value is None else value for value in values])
+            else:
+                buffer.write(json.dumps(dict(zip(columns, values)), ensure_ascii=False))
+                buffer.write("\n")
+            pending += 1
+            if pending >= EXPORT_BATCH_SIZE:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+                pending = 0
+    finally:
+        # Клиент мог оборвать загрузку - закрываем курсор и сессию сразу
+        rows.close()
+
+    if pending:
+        yield buffer.getvalue()
+
+
+def _appointment_rows(start_date: Optional[date], end_date: Optional[date],
+                      doctor_id: Optional[int], status: Optional[str]) -> Iterator[tuple]:
+    """Записи с именами врача и пациента, по дате; сессия живет, пока идет выгрузка"""
+    db = SessionLocal()
+    try:
+        query = db.query(
+            Appointment.id, Appointment.date, Appointment.doctor_id, User.full_name,
+            Appointment.patient_id, Patient.full_name, Appointment.status, Appointment.cost
+        ).outerjoin(
+            User, Appointment.doctor_id == User.id
+        ).outerjoin(
+            Patient, Appointment.patient_id == Patient.id
+        )
+        if start_date is not None:
+            query = query.filter(Appointment.date >= day_start(start_date))
+        if end_date is not None:
+            query = query.filter(Appointment.date < day_start(end_date + timedelta(days=1)))
+        if doctor_id is not None:
+            query = query.filter(Appointment.doctor_id == doctor_id)
+        if status is not None:
+            query = query.filter(Appointment.status == status)
+
+        for row in query.order_by(Appointment.date, Appointment.id).yield_per(EXPORT_BATCH_SIZE):
+            appointment_id, appointment_date, *rest = row
+            clinic_day = clinic_date(appointment_date) if appointment_date is not None else None
+            yield (appointment_id, appointment_date, clinic_day, *rest)
+    finally:
+        db.close()
+
+
+def _financial_rows(start_date: Optional[date], end_date: Optional[date],
+                    doctor_id: Optional[int]) -> Iterator[tuple]:
+    """Дневные финансовые итоги по врачам из дневной сводки"""
+    rollup = DailyStatsRollup
+    db = SessionLocal()
+    try:
+        query = db.query(
+            rollup.stat_date,
+            rollup.doctor_id,
+            User.full_name,
+            func.sum(rollup.appointments_count),
+            func.coalesce(func.sum(rollup.appointments_count).filter(rollup.status == "done"), 0),
+            func.sum(rollup.cost_sum),
+            func.coalesce(func.sum(rollup.cost_sum).filter(rollup.status == "done"), 0),
+            func.coalesce(func.sum(rollup.cost_sum).filter(rollup.status == "scheduled"), 0)
+        ).join(User, rollup.doctor_id == User.id)
+        if start_date is not None:
+            query = query.filter(rollup.stat_date >= start_date)
+        if end_date is not None:
+            query = query.filter(rollup.stat_date <= end_date)
+        if doctor_id is not None:
+            query = query.filter(rollup.doctor_id == doctor_id)
+
+        query = query.group_by(rollup.stat_date, rollup.doctor_id, User.full_name).having(
+            func.sum(rollup.appointments_count) != 0
+        ).order_by(rollup.stat_date, rollup.doctor_id)
+
+        for stat_date, *rest in query.yield_per(EXPORT_BATCH_SIZE):
+            yield (_as_date(stat_date), *rest)
+    finally:
+        db.close()
+
+
+def export_appointments(export_format: str, start_date: Optional[date] = None, end_date: Optional[date] = None,
+                        doctor_id: Optional[int] = None, status: Optional[str] = None) -> Iterator[str]:
+    return _encode_rows(
+        _appointment_rows(start_date, end_date, doctor_id, status),
+        APPOINTMENT_EXPORT_COLUMNS, export_format
+    )
+
+
+def export_financial(export_format: str, start_date: Optional[date] = None, end_date: Optional[date] = None,
+                     doctor_id: Optional[int] = None) -> Iterator[str]:
+    return _encode_rows(
+        _financial_rows(start_date, end_date, doctor_id),
+        FINANCIAL_EXPORT_COLUMNS, export_format
+    )
+
+
+def export_filename(name: str, export_format: str, start_date: Optional[date], end_date: Optional[date]) -> str:
+    parts = [name]
+    if start_date is not None:
+        parts.append(start_date.strftime("%Y%m%d"))
+    if end_date is not None:
+        parts.append(end_date.strftime("%Y%m%d"))
+    return f"{'_'.join(parts)}.{export_format}"
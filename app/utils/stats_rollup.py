@@ -0,0 +1,206 @@
+"""
+Поддержка дневных сводок (daily_stats_rollup, daily_patients_rollup).
+
+Сводки обновляются в той же транзакции, что и изменение записи/пациента,
+поэтому статистика читает готовые суммы и не сканирует исходные таблицы.
+
+Пересчет (backfill), целиком или за период:
+    python -m app.utils.stats_rollup backfill
+    python -m app.utils.stats_rollup backfill --from 2025-01-01 --to 2025-01-31
+"""
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from typing import Optional
+import argparse
+import logging
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+from app.db.session import SessionLocal, dialect_insert
+from app.models.appointment import Appointment
+from app.models.patient import Patient
+from app.models.stats_rollup import DailyStatsRollup, DailyPatientsRollup
+from app.utils.date_buckets import clinic_date, clinic_day_expr, day_start, as_naive_utc
+
+logger = logging.getLogger(__name__)
+
+# id записей, удаленных в транзакции (session.info) - после коммита их убирает снимок статистики
+DELETED_APPOINTMENTS_KEY = "deleted_appointment_ids"
+
+
+def appointment_stat_date(value: datetime) -> date:
+    """День, к которому относится запись (в таймзоне клиники)"""
+    return clinic_date(value)
+
+
+def patient_stat_date(value: datetime) -> date:
+    """День регистрации пациента (created_at хранится в UTC без таймзоны)"""
+    return clinic_date(value)
+
+
+def _apply_appointment(db: Session, appointment: Appointment, sign: int):
+    """Прибавляет (sign=1) или вычитает (sign=-1) запись из сводки"""
+    if appointment.date is None or appointment.doctor_id is None:
+        return
+
+    cost = appointment.cost
+    stmt = dialect_insert(db)(DailyStatsRollup).values(
+        stat_date=appointment_stat_date(appointment.date),
+        doctor_id=appointment.doctor_id,
+        status=appointment.status or "scheduled",
+        appointments_count=sign,
+        cost_count=sign if cost is not None else 0,
+        cost_sum=sign * Decimal(cost) if cost is not None else Decimal(0)
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[DailyStatsRollup.stat_date, DailyStatsRollup.doctor_id, DailyStatsRollup.status],
+        set_={
+            "appointments_count": DailyStatsRollup.appointments_count + stmt.excluded.appointments_count,
+            "cost_count": DailyStatsRollup.cost_count + stmt.excluded.cost_count,
+            "cost_sum": DailyStatsRollup.cost_sum + stmt.excluded.cost_sum,
+        }
+    )
+    db.execute(stmt)
+
+
+def rollup_add_appointment(db: Session, appointment: Appointment):
+    """Учесть запись в сводке (после создания или изменения)"""
+    _apply_appointment(db, appointment, 1)
+
+
+def rollup_remove_appointment(db: Session, appointment: Appointment):
+    """Убрать запись из сводки (перед изменением статуса/стоимости или удалением)"""
+    _apply_appointment(db, appointment, -1)
+
+
+def _apply_patient(db: Session, patient: Patient, sign: int):
+    if patient.created_at is None:
+        return
+
+    stmt = dialect_insert(db)(DailyPatientsRollup).values(
+        stat_date=patient_stat_date(patient.created_at),
+        new_patients_count=sign
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[DailyPatientsRollup.stat_date],
+        set_={"new_patients_count": DailyPatientsRollup.new_patients_count + stmt.excluded.new_patients_count}
+    )
+    db.execute(stmt)
+
+
+def rollup_add_patient(db: Session, patient: Patient):
+    """Учесть нового пациента в сводке"""
+    _apply_patient(db, patient, 1)
+
+
+def rollup_remove_patient(db: Session, patient: Patient):
+    """Убрать пациента и все его записи (удаляются каскадом) из сводок"""
+    _apply_patient(db, patient, -1)
+    deleted_ids = db.info.setdefault(DELETED_APPOINTMENTS_KEY, [])
+    for appointment in db.query(Appointment).filter(Appointment.patient_id == patient.id).all():
+        rollup_remove_appointment(db, appointment)
+        deleted_ids.append(appointment.id)
+
+
+def _source_bounds(column, start_date: Optional[date], end_date: Optional[date], naive_utc: bool = False) -> list:
+    """Sargable границы [начало start_date, начало end_date + 1) для исходной таблицы"""
+    filters = []
+    if start_date is not None:
+        start = day_start(start_date)
+        filters.append(column >= (as_naive_utc(start) if naive_utc else start))
+    if end_date is not None:
+        end = day_start(end_date + timedelta(days=1))
+        filters.append(column < (as_naive_utc(end) if naive_utc else end))
+    return filters
+
+
+def _rollup_bounds(column, start_date: Optional[date], end_date: Optional[date]) -> list:
+    filters = []
+    if start_date is not None:
+        filters.append(column >= start_date)
+    if end_date is not None:
+        filters.append(column <= end_date)
+    return filters
+
+
+def rebuild_rollup(db: Session, start_date: Optional[date] = None, end_date: Optional[date] = None):
+    """
+    Пересчет сводок из таблиц appointments и patients.
+    Без границ - полностью, иначе только дни [start_date, end_date].
+    """
+    appointment_day = clinic_day_expr(db, Appointment.date)
+    patient_day = clinic_day_expr(db, Patient.created_at, naive_utc=True)
+    appointment_status = func.coalesce(Appointment.status, "scheduled")
+
+    db.query(DailyStatsRollup).filter(
+        *_rollup_bounds(DailyStatsRollup.stat_date, start_date, end_date)
+    ).delete(synchronize_session=False)
+    db.query(DailyPatientsRollup).filter(
+        *_rollup_bounds(DailyPatientsRollup.stat_date, start_date, end_date)
+    ).delete(synchronize_session=False)
+
+    db.execute(
+        DailyStatsRollup.__table__.insert().from_select(
+            ["stat_date", "doctor_id", "status", "appointments_count", "cost_count", "cost_sum"],
+            select(
+                appointment_day,
+                Appointment.doctor_id,
+                appointment_status,
+                func.count(Appointment.id),
+                func.count(Appointment.cost),
+                func.coalesce(func.sum(Appointment.cost), 0)
+            ).where(
+                Appointment.date.isnot(None),
+                Appointment.doctor_id.isnot(None),
+                *_source_bounds(Appointment.date, start_date, end_date)
+            ).group_by(appointment_day, Appointment.doctor_id, appointment_status)
+        )
+    )
+    db.execute(
+        DailyPatientsRollup.__table__.insert().from_select(
+            ["stat_date", "new_patients_count"],
+            select(patient_day, func.count(Patient.id)).where(
+                Patient.created_at.isnot(None),
+                *_source_bounds(Patient.created_at, start_date, end_date, naive_utc=True)
+            ).group_by(patient_day)
+        )
+    )
+    db.commit()
+
+
+def ensure_rollup():
+    """Заполняет пустые сводки при старте, если в базе уже есть данные"""
+    db = SessionLocal()
+    try:
+        rollup_empty = db.query(DailyStatsRollup.id).first() is None
+        has_appointments = db.query(Appointment.id).first() is not None
+        if rollup_empty and has_appointments:
+            rebuild_rollup(db)
+            logger.info("✓ Daily stats rollup rebuilt on startup")
+    except Exception as e:
+        db.rollback()
+        logger.error(f"✗ Error rebuilding daily stats rollup: {e}")
+    finally:
+        db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Daily stats rollup maintenance")
+    parser.add_argument("command", choices=["backfill"], help="backfill - пересчитать сводки")
+    parser.add_argument("--from", dest="start_date", type=date.fromisoformat, help="Первый день (YYYY-MM-DD)")
+    parser.add_argument("--to", dest="end_date", type=date.fromisoformat, help="Последний день (YYYY-MM-DD)")
+    args = parser.parse_args()
+
+    # Регистрируем все модели, чтобы связи между ними разрешились
+    import app.db.base  # noqa: F401
+
+    db = SessionLocal()
+    try:
+        rebuild_rollup(db, args.start_date, args.end_date)
+        rows = db.query(DailyStatsRollup).count()
+        print(f"✓ Daily stats rollup rebuilt. {rows} rows.")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,356 @@
+"""
+Колоночный снимок записей в памяти воркера для произвольных срезов статистики.
+
+Записи хранятся массивами NumPy (id, врач, день, код статуса, стоимость в тийинах),
+срез по периоду / врачу / статусу считается векторными масками и np.bincount
+без запросов к БД.
+
+Снимок догружает по водяному знаку updated_at задача планировщика (каждые
+stats_snapshot_refresh_seconds), запрос статистики только читает готовые колонки.
+Строки читаются пачками по LOAD_BATCH_SIZE, каждая пачка сразу становится массивами NumPy.
+Удаления по updated_at не видны: удаленные в этом воркере записи отмечает хук сводки
+(rollup_remove_patient), снимок убирает их при следующем обновлении; удаления в других
+воркерах находит сверка числа строк с таблицей раз в stats_snapshot_reconcile_seconds.
+NumPy - зависимость из requirements.txt. Если его нет в окружении, снимок не помещается
+в stats_snapshot_max_bytes или не обновлялся дольше stats_snapshot_max_staleness_seconds -
+срез считается в SQL по дневной сводке.
+"""
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from itertools import islice
+from threading import Lock
+from typing import Dict, List, NamedTuple, Optional, Tuple
+import logging
+import time
+from sqlalchemy import event, func
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.db.session import SessionLocal
+from app.models.appointment import Appointment
+from app.schemas.stats import AnalyticsSlice, AnalyticsSliceGroup
+from app.utils.date_buckets import clinic_date
+from app.utils.stats_aggregation import rollup_slice
+from app.utils.stats_rollup import DELETED_APPOINTMENTS_KEY
+
+try:
+    import numpy as np
+except ImportError:  # Окружение без NumPy - срезы считаются в SQL
+    np = None
+
+logger = logging.getLogger(__name__)
+
+EPOCH = date(1970, 1, 1)
+# id int64 + doctor_id int32 + day int32 + status int16 + cost int64
+BYTES_PER_ROW = 8 + 4 + 4 + 2 + 8
+# Транзакция, начатая раньше водяного знака, может закоммититься позже -
+# догружаем с запасом, повторное применение строки ничего не меняет
+WATERMARK_OVERLAP = timedelta(minutes=5)
+LOAD_BATCH_SIZE = 10000
+
+
+class SnapshotColumns(NamedTuple):
+    """Неизменяемый набор колонок; обновление собирает новый набор и подменяет ссылку"""
+    ids: "np.ndarray"
+    doctor_ids: "np.ndarray"
+    days: "np.ndarray"  # Дни от 1970-01-01 в таймзоне клиники
+    statuses: "np.ndarray"
+    cost_cents: "np.ndarray"  # NULL стоимость хранится как 0
+
+    @property
+    def nbytes(self) -> int:
+        return sum(column.nbytes for column in self)
+
+
+def _day_number(day: date) -> int:
+    return (day - EPOCH).days
+
+
+def _cents(cost) -> int:
+    return int((Decimal(cost) * 100).to_integral_value())
+
+
+class StatsSnapshot:
+    def __init__(self, max_bytes: int, max_staleness_seconds: float, reconcile_seconds: float):
+        self.max_bytes = max_bytes
+        self.max_staleness_seconds = max_staleness_seconds
+        self.reconcile_seconds = reconcile_seconds
+        self.full_loads = 0
+        self.incremental_loads = 0
+        self.disabled_reason: Optional[str] = None if np is not None else "numpy is not installed"
+        self._columns: Optional[SnapshotColumns] = None
+        self._watermark: Optional[datetime] = None
+        self._refreshed_at: Optional[float] = None
+        self._reconciled_at: Optional[float] = None
+        self._deleted_ids: List[int] = []
+        self._deleted_lock = Lock()
+        self._status_codes: Dict[str, int] = {}
+        self._status_names: List[str] = []
+        self._refresh_lock = Lock()
+
+    def discard(self, appointment_ids: List[int]):
+        """Записи удалены (после коммита): уйдут из снимка при следующем обновлении"""
+        with self._deleted_lock:
+            self._deleted_ids.extend(appointment_ids)
+
+    def _take_deleted(self) -> List[int]:
+        with self._deleted_lock:
+            deleted, self._deleted_ids = self._deleted_ids, []
+        return deleted
+
+    def _status_code(self, status: Optional[str]) -> int:
+        status = status or "scheduled"
+        if status not in self._status_codes:
+            self._status_codes[status] = len(self._status_names)
+            self._status_names.append(status)
+        return self._status_codes[status]
+
+    def _batch_columns(self, batch: list) -> SnapshotColumns:
+        count = len(batch)
+        return SnapshotColumns(
+            np.fromiter((row.id for row in batch), dtype=np.int64, count=count),
+            np.fromiter((row.doctor_id for row in batch), dtype=np.int32, count=count),
+            np.fromiter((_day_number(clinic_date(row.date)) for row in batch), dtype=np.int32, count=count),
+            np.fromiter((self._status_code(row.status) for row in batch), dtype=np.int16, count=count),
+            np.fromiter(
+                (_cents(row.cost) if row.cost is not None else 0 for row in batch), dtype=np.int64, count=count
+            )
+        )
+
+    def _load_rows(self, db: Session, since: Optional[datetime], max_rows: Optional[int] = None):
+        """
+        Колонки записей (изменённых после since или всех) и новый водяной знак.
+        Больше max_rows строк - (None, since): чтение прекращается, не дойдя до конца таблицы
+        """
+        query = db.query(
+            Appointment.id, Appointment.doctor_id, Appointment.date,
+            Appointment.status, Appointment.cost, Appointment.updated_at
+        ).filter(Appointment.date.isnot(None), Appointment.doctor_id.isnot(None))
+        if since is not None:
+            query = query.filter(Appointment.updated_at >= since - WATERMARK_OVERLAP)
+
+        # Пустая пачка задает типы колонок, если строк нет
+        chunks = [self._batch_columns([])]
+        loaded = 0
+        watermark = since
+        rows = iter(query.yield_per(LOAD_BATCH_SIZE))
+        while True:
+            batch = list(islice(rows, LOAD_BATCH_SIZE))
+            if not batch:
+                break
+            loaded += len(batch)
+            if max_rows is not None and loaded > max_rows:
+                return None, since
+            chunks.append(self._batch_columns(batch))
+            for row in batch:
+                if row.updated_at is not None and (watermark is None or row.updated_at > watermark):
+                    watermark = row.updated_at
+
+        columns = SnapshotColumns(*(np.concatenate(parts) for parts in zip(*chunks)))
+        return columns, watermark
+
+    def _source_count(self, db: Session) -> int:
+        return db.query(func.count(Appointment.id)).filter(
+            Appointment.date.isnot(None), Appointment.doctor_id.isnot(None)
+        ).scalar()
+
+    def _full_load(self, db: Session) -> Optional[SnapshotColumns]:
+        max_rows = self.max_bytes // BYTES_PER_ROW
+        columns, watermark = self._load_rows(db, None, max_rows)
+        if columns is None:
+            self.disabled_reason = f"more than {max_rows} rows exceed stats_snapshot_max_bytes"
+            logger.warning(f"⚠️ Stats snapshot disabled: {self.disabled_reason}")
+            return None
+        self._watermark = watermark
+        self._reconciled_at = time.monotonic()
+        order = np.argsort(columns.ids)
+        self.full_loads += 1
+        return SnapshotColumns(*(column[order] for column in columns))
+
+    def _incremental_load(self, db: Session, current: SnapshotColumns) -> Optional[SnapshotColumns]:
+        changed, watermark = self._load_rows(db, self._watermark)
+        columns = current
+        if len(changed.ids):
+            positions = np.searchsorted(current.ids, changed.ids)
+            existing = positions < len(current.ids)
+            existing[existing] = current.ids[positions[existing]] == changed.ids[existing]
+
+            # Изменённые записи - на место, новые - в конец с пересортировкой по id
+            columns = SnapshotColumns(*(column.copy() for column in current))
+            for column, changed_column in zip(columns, changed):
+                column[positions[existing]] = changed_column[existing]
+            if not existing.all():
+                new = ~existing
+                columns = SnapshotColumns(*(
+                    np.concatenate([column, changed_column[new]]) for column, changed_column in zip(columns, changed)
+                ))
+                order = np.argsort(columns.ids, kind="stable")
+                columns = SnapshotColumns(*(column[order] for column in columns))
+
+        # Удаления из других воркеров: точный COUNT(*) только раз в reconcile_seconds
+        if self._reconciled_at is None or time.monotonic() - self._reconciled_at > self.reconcile_seconds:
+            if len(columns.ids) != self._source_count(db):
+                return self._full_load(db)
+            self._reconciled_at = time.monotonic()
+
+        self._watermark = watermark
+        self.incremental_loads += 1
+        if columns.nbytes > self.max_bytes:
+            self.disabled_reason = f"{len(columns.ids)} rows exceed stats_snapshot_max_bytes"
+            logger.warning(f"⚠️ Stats snapshot disabled: {self.disabled_reason}")
+            return None
+        return columns
+
+    def refresh(self, db: Session):
+        """Догружает изменения (или строит снимок с нуля). Параллельный вызов не ждет"""
+        if np is None or not self._refresh_lock.acquire(blocking=False):
+            return
+        deleted = self._take_deleted()
+        try:
+            current = self._columns
+            started_at = time.monotonic()
+            self.disabled_reason = None
+            if current is None:
+                columns = self._full_load(db)
+            else:
+                columns = self._incremental_load(db, current)
+            if columns is not None and deleted:
+                keep = ~np.isin(columns.ids, deleted)
+                if not keep.all():
+                    columns = SnapshotColumns(*(column[keep] for column in columns))
+            self._columns = columns
+            self._refreshed_at = started_at if columns is not None else None
+        except Exception as e:
+            # Удаления применятся при следующем обновлении
+            self.discard(deleted)
+            logger.error(f"✗ Error refreshing stats snapshot: {e}")
+        finally:
+            self._refresh_lock.release()
+
+    def age_seconds(self) -> Optional[float]:
+        if self._refreshed_at is None:
+            return None
+        return time.monotonic() - self._refreshed_at
+
+    def get(self) -> Optional[SnapshotColumns]:
+        """Свежий снимок или None, если срез нужно считать в SQL. В БД не ходит - снимок обновляет планировщик"""
+        if np is None:
+            return None
+        age = self.age_seconds()
+        if age is None or age > self.max_staleness_seconds:
+            return None
+        return self._columns
+
+    def slice(self, columns: SnapshotColumns, start_date: Optional[date], end_date: Optional[date],
+              doctor_id: Optional[int], status: Optional[str],
+              group_by: Optional[str]) -> List[Tuple[str, int, Decimal]]:
+        """Срез векторными масками: [(ключ группы, записи, выручка)], как у rollup_slice"""
+        mask = np.ones(len(columns.ids), dtype=bool)
+        if start_date is not None:
+            mask &= columns.days >= _day_number(start_date)
+        if end_date is not None:
+            mask &= columns.days <= _day_number(end_date)
+        if doctor_id is not None:
+            mask &= columns.doctor_ids == doctor_id
+        if status is not None:
+            if status not in self._status_codes:
+                mask[:] = False
+            else:
+                mask &= columns.statuses == self._status_codes[status]
+
+        cost_cents = columns.cost_cents[mask]
+        if group_by is None:
+            return [("all", int(mask.sum()), Decimal(int(cost_cents.sum())).scaleb(-2))]
+
+        keys = {"day": columns.days, "doctor": columns.doctor_ids, "status": columns.statuses}[group_by][mask]
+        if not len(keys):
+            return []
+        offset = int(keys.min())
+        counts = np.bincount(keys - offset)
+        revenue = np.bincount(keys - offset, weights=cost_cents)
+
+        groups = []
+        for index in np.flatnonzero(counts):
+            key = int(index) + offset
+            if group_by == "day":
+                label = (EPOCH + timedelta(days=key)).isoformat()
+            elif group_by == "status":
+                label = self._status_names[key]
+            else:
+                label = str(key)
+            groups.append((label, int(counts[index]), Decimal(int(round(revenue[index]))).scaleb(-2)))
+        if group_by == "status":
+            groups.sort()
+        return groups
+
+    def metrics(self) -> dict:
+        columns = self._columns
+        age = self.age_seconds()
+        return {
+            "enabled": columns is not None,
+            "disabled_reason": self.disabled_reason,
+            "rows": len(columns.ids) if columns is not None else 0,
+            "bytes": columns.nbytes if columns is not None else 0,
+            "max_bytes": self.max_bytes,
+            "age_seconds": round(age, 3) if age is not None else None,
+            "watermark": self._watermark,
+            "full_loads": self.full_loads,
+            "incremental_loads": self.incremental_loads
+        }
+
+
+stats_snapshot = StatsSnapshot(
+    settings.stats_snapshot_max_bytes,
+    settings.stats_snapshot_max_staleness_seconds,
+    settings.stats_snapshot_reconcile_seconds
+)
+
+
+@event.listens_for(SessionLocal, "after_commit")
+def _discard_deleted_appointments(session: Session):
+    deleted = session.info.pop(DELETED_APPOINTMENTS_KEY, None)
+    if deleted:
+        stats_snapshot.discard(deleted)
+
+
+@event.listens_for(SessionLocal, "after_rollback")
+def _forget_deleted_appointments(session: Session):
+    session.info.pop(DELETED_APPOINTMENTS_KEY, None)
+
+
+def refresh_stats_snapshot():
+    """Задача планировщика: догружает изменения записей в снимок"""
+    if np is None:
+        return
+    db = SessionLocal()
+    try:
+        stats_snapshot.refresh(db)
+    finally:
+        db.close()
+
+
+def analytics_slice(db: Session, start_date: Optional[date] = None, end_date: Optional[date] = None,
+                    doctor_id: Optional[int] = None, status: Optional[str] = None,
+                    group_by: Optional[str] = None) -> AnalyticsSlice:
+    """Срез из снимка в памяти, при недоступном или устаревшем снимке - из дневной сводки"""
+    columns = stats_snapshot.get()
+    if columns is not None:
+        source = "snapshot"
+        groups = stats_snapshot.slice(columns, start_date, end_date, doctor_id, status, group_by)
+    else:
+        source = "sql"
+        groups = rollup_slice(db, start_date, end_date, doctor_id, status, group_by)
+
+    return AnalyticsSlice(
+        source=source,
+        start_date=start_date,
+        end_date=end_date,
+        doctor_id=doctor_id,
+        status=status,
+        group_by=group_by,
+        appointments_count=sum(count for _, count, _ in groups),
+        revenue=sum((revenue for _, _, revenue in groups), Decimal(0)),
+        groups=[
+            AnalyticsSliceGroup(key=key, appointments_count=count, revenue=revenue)
+            for key, count, revenue in groups
+        ] if group_by is not None else []
+    )
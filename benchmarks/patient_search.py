@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк поиска пациентов: ILIKE '%...%' с B-tree индексом против GIN-индекса pg_trgm
+и нечеткий поиск по сходству слов (app/utils/patient_search.py).
+
+Создает временную таблицу bench_patients (по умолчанию 1M строк) в базе из DATABASE_URL
+и печатает EXPLAIN ANALYZE каждого варианта. Нужен PostgreSQL с расширением pg_trgm.
+
+    DATABASE_URL=postgresql://... python benchmarks/patient_search.py --rows 1000000 --search Karimov
+"""
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine, text
+from app.core.config import settings
+
+
+def explain(conn, title, sql, params):
+    print(f"\n=== {title} ===")
+    print(sql.strip())
+    rows = conn.execute(text(f"EXPLAIN (ANALYZE, BUFFERS) {sql}"), params).fetchall()
+    for (line,) in rows:
+        print("  " + line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Patient name search benchmark")
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--search", default="Karimov", help="Подстрока для ILIKE")
+    parser.add_argument("--typo", default="Karimv", help="Строка с опечаткой для нечеткого поиска")
+    args = parser.parse_args()
+
+    engine = create_engine(settings.database_url)
+    if engine.dialect.name != "postgresql":
+        sys.exit("PostgreSQL required")
+
+    search_sql = """
+        SELECT id, full_name FROM bench_patients
+        WHERE full_name ILIKE :pattern
+        ORDER BY id DESC LIMIT 100
+    """
+    fuzzy_sql = """
+        SELECT id, full_name FROM bench_patients
+        WHERE full_name ILIKE :pattern OR full_name %> :search
+        ORDER BY word_similarity(:search, full_name) DESC, id DESC LIMIT 100
+    """
+
+    with engine.connect() as conn:
+        conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+        print(f">>> Seeding {args.rows} rows...")
+        conn.execute(text("""
+            CREATE TEMP TABLE bench_patients AS
+            SELECT g AS id,
+                   (ARRAY['Karimov', 'Aliyev', 'Rakhimov', 'Yusupov', 'Tashkentov', 'Ivanov', 'Petrov',
+                          'Sidorov', 'Nazarov', 'Saidov', 'Umarov', 'Khodjaev'])[1 + (random() * 11)::int]
+                   || ' ' ||
+                   (ARRAY['Aziz', 'Bekzod', 'Dilshod', 'Farrukh', 'Jasur', 'Malika', 'Nodira', 'Olga',
+                          'Sardor', 'Timur', 'Zarina', 'Anna'])[1 + (random() * 11)::int]
+                   || ' ' || substr(md5(g::text), 1, 6) AS full_name,
+                   '+998 9' || lpad((random() * 99999999)::int::text, 8, '0') AS phone
+            FROM generate_series(1, :rows) AS g
+        """), {"rows": args.rows})
+        conn.execute(text("CREATE INDEX ON bench_patients (full_name)"))
+        conn.execute(text("ANALYZE bench_patients"))
+
+        params = {"pattern": f"%{args.search}%", "search": args.search}
+        explain(conn, "ILIKE, только B-tree - полный просмотр", search_sql, params)
+
+        conn.execute(text("CREATE INDEX ON bench_patients USING gin (full_name gin_trgm_ops)"))
+        conn.execute(text("ANALYZE bench_patients"))
+        explain(conn, "ILIKE + GIN pg_trgm - bitmap index scan", search_sql, params)
+
+        explain(conn, "Нечеткий поиск с опечаткой, ранжирование по сходству", fuzzy_sql,
+                {"pattern": f"%{args.typo}%", "search": args.typo})
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк подсказок пациентов (app/utils/patient_suggest.py): поиск по префиксу
+в отсортированных ключах (bisect) против линейного просмотра всех пациентов.
+
+База не нужна: пациенты генерируются в памяти.
+
+    python benchmarks/patient_suggest.py --patients 1000000 --queries 1000
+"""
+import argparse
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.utils.patient_suggest import BYTES_PER_PATIENT, PatientSuggestIndex, normalize_name
+
+LAST_NAMES = ["Karimov", "Aliyev", "Rakhimov", "Yusupov", "Tashkentov", "Ivanov", "Petrov",
+              "Sidorov", "Nazarov", "Saidov", "Umarov", "Khodjaev"]
+FIRST_NAMES = ["Aziz", "Bekzod", "Dilshod", "Farrukh", "Jasur", "Malika", "Nodira", "Olga",
+               "Sardor", "Timur", "Zarina", "Anna"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Patient suggest benchmark")
+    parser.add_argument("--patients", type=int, default=1_000_000)
+    parser.add_argument("--queries", type=int, default=1000)
+    parser.add_argument("--limit", type=int, default=10)
+    args = parser.parse_args()
+
+    random.seed(1)
+    rows = [
+        (i, f"{random.choice(LAST_NAMES)} {random.choice(FIRST_NAMES)} {i:x}",
+         f"+998 9{random.randint(0, 99999999):08d}")
+        for i in range(1, args.patients + 1)
+    ]
+    queries = [random.choice(rows)[1][:random.randint(2, 12)] for _ in range(args.queries // 2)]
+    queries += [random.choice(rows)[2][-random.randint(4, 9):] for _ in range(args.queries - len(queries))]
+
+    index = PatientSuggestIndex(args.patients * BYTES_PER_PATIENT)
+    tracemalloc.start()
+    started = time.perf_counter()
+    index.load(rows)
+    print(f"=== {args.patients} пациентов, построение индекса {time.perf_counter() - started:.2f} s ===")
+    print(f"  память индекса: {tracemalloc.get_traced_memory()[0] / args.patients:.0f} байт на пациента "
+          f"(BYTES_PER_PATIENT = {BYTES_PER_PATIENT})")
+    tracemalloc.stop()
+
+    timings = []
+    for q in queries:
+        started = time.perf_counter()
+        index.suggest(q, args.limit)
+        timings.append((time.perf_counter() - started) * 1000)
+    timings.sort()
+    print(f"  bisect: p50 {timings[len(timings) // 2]:.3f} ms, p99 {timings[int(len(timings) * 0.99)]:.3f} ms")
+
+    started = time.perf_counter()
+    sample = queries[:20]
+    for q in sample:
+        prefix = normalize_name(q)
+        [row for row in rows if normalize_name(row[1]).startswith(prefix)][:args.limit]
+    print(f"  линейный просмотр: {(time.perf_counter() - started) * 1000 / len(sample):.1f} ms на запрос")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк POST /queue/bulk против серии POST /queue/.
+
+Создает в базе из DATABASE_URL врача и --patients пациентов, ставит их в очередь
+сначала по одному, затем одним bulk-запросом, и печатает время и число SQL-запросов.
+Тестовые пациенты и врач удаляются в конце (очередь - каскадом).
+Запускать на отдельной базе, не на рабочей.
+
+    DATABASE_URL=postgresql://... python benchmarks/queue_bulk.py --patients 500
+"""
+import argparse
+import os
+import sys
+import time
+import uuid
+from datetime import date
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+from app.main import app
+from app.db.session import Base, SessionLocal, engine
+from app.models.patient import Patient as PatientModel
+from app.models.queue import Queue as QueueModel
+from app.models.user import User
+from app.utils.dependencies import get_current_user
+from app.utils.queue_counter import reset_queue_counter
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk queue enqueue benchmark")
+    parser.add_argument("--patients", type=int, default=500)
+    args = parser.parse_args()
+
+    Base.metadata.create_all(bind=engine)
+    suffix = uuid.uuid4().hex[:8]
+
+    db = SessionLocal()
+    doctor = User(username=f"bench_doctor_{suffix}", full_name="Bench Doctor", email=f"bench_{suffix}@example.com",
+                  hashed_password="-", role="doctor")
+    patients = [
+        PatientModel(full_name=f"Bench Patient {i}", birth_date=date(1990, 1, 1), gender="male",
+                     phone=f"+000{i:07d}", patient_uid=f"BENCH-{suffix}-{i}")
+        for i in range(args.patients)
+    ]
+    db.add(doctor)
+    db.add_all(patients)
+    db.commit()
+    doctor_id = doctor.id
+    patient_ids = [patient.id for patient in patients]
+    db.close()
+
+    def bench_user():
+        session = SessionLocal()
+        try:
+            return session.get(User, doctor_id)
+        finally:
+            session.close()
+
+    app.dependency_overrides[get_current_user] = bench_user
+    client = TestClient(app)
+    queries = {"count": 0}
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def count_queries(*args, **kwargs):
+        queries["count"] += 1
+
+    def clear_queue():
+        session = SessionLocal()
+        try:
+            session.query(QueueModel).filter(QueueModel.doctor_id == doctor_id).delete()
+            reset_queue_counter(session, doctor_id, date.today())
+            session.commit()
+        finally:
+            session.close()
+
+    def timed(title, func):
+        queries["count"] = 0
+        started = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - started
+        print(f"  {title:<20} {elapsed * 1000:10.1f} ms  {queries['count']:6d} SQL")
+
+    items = [{"patient_id": patient_id, "doctor_id": doctor_id} for patient_id in patient_ids]
+    try:
+        print(f"=== {args.patients} пациентов в очередь одного врача ===")
+        timed("POST /queue/ x N", lambda: [client.post("/queue/", json=item).raise_for_status() for item in items])
+        clear_queue()
+        timed("POST /queue/bulk", lambda: client.post("/queue/bulk", json={"items": items}).raise_for_status())
+    finally:
+        clear_queue()
+        session = SessionLocal()
+        try:
+            session.query(PatientModel).filter(PatientModel.id.in_(patient_ids)).delete(synchronize_session=False)
+            session.query(User).filter(User.id == doctor_id).delete()
+            session.commit()
+        finally:
+            session.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк очереди в памяти (app/utils/queue_engine.py): DoctorQueue против
+наивного списка записей с перенумерацией после каждого удаления
+(как было в таблице queue до неизменяемых талонов).
+
+База не нужна.
+
+    python benchmarks/queue_engine.py --entries 2000 --removes 500
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.utils.queue_engine import DoctorQueue
+
+
+def timed(title, func):
+    started = time.perf_counter()
+    func()
+    print(f"  {title:<40} {(time.perf_counter() - started) * 1000:10.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="In-memory doctor queue benchmark")
+    parser.add_argument("--entries", type=int, default=2000, help="Талонов в очереди одного врача")
+    parser.add_argument("--removes", type=int, default=500, help="Удалений из середины очереди")
+    parser.add_argument("--reads", type=int, default=1000, help="Поисков позиции")
+    args = parser.parse_args()
+
+    random.seed(1)
+    tickets = list(range(1, args.entries + 1))
+    removed = random.sample(tickets, args.removes)
+    lookups = [random.choice(tickets) for _ in range(args.reads)]
+
+    print(f"=== DoctorQueue: {args.entries} талонов ===")
+    doctor_queue = DoctorQueue()
+    timed("добавление", lambda: [doctor_queue.add(t, {"id": t, "priority": 0}) for t in tickets])
+    timed("позиция (bisect)", lambda: [doctor_queue.position(t) for t in lookups])
+    timed("удаление (bisect + del)", lambda: [doctor_queue.remove(t) for t in removed])
+    timed("список для GET", doctor_queue.listing)
+
+    print(f"\n=== Список с перенумерацией: {args.entries} записей ===")
+    entries = []
+
+    def naive_add():
+        for t in tickets:
+            entries.append({"id": t, "queue_number": len(entries) + 1})
+
+    def naive_position():
+        for t in lookups:
+            next((e["queue_number"] for e in entries if e["id"] == t), None)
+
+    def naive_remove():
+        for t in removed:
+            index = next(i for i, e in enumerate(entries) if e["id"] == t)
+            del entries[index]
+            for e in entries[index:]:
+                e["queue_number"] -= 1
+
+    timed("добавление", naive_add)
+    timed("позиция (линейный поиск)", naive_position)
+    timed("удаление (поиск + перенумерация)", naive_remove)
+    timed("список для GET", lambda: [dict(e) for e in entries])
+
+    assert [e["queue_number"] for e in doctor_queue.listing()] == [e["queue_number"] for e in entries]
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк фильтров по дате: func.date(column) против полуоткрытого диапазона [start, end).
+
+Создает временную таблицу bench_appointments (по умолчанию 5M строк) в базе из DATABASE_URL,
+строит индексы как в миграции 7b1e4d2c9a30 и печатает EXPLAIN ANALYZE обоих вариантов.
+Нужен PostgreSQL.
+
+    DATABASE_URL=postgresql://... python benchmarks/stats_date_range.py --rows 5000000
+"""
+import argparse
+import os
+import sys
+from datetime import timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine, text
+from app.core.config import settings
+from app.utils.date_buckets import date_range_bounds, clinic_today
+
+
+def explain(conn, title, sql, params):
+    print(f"\n=== {title} ===")
+    print(sql.strip())
+    rows = conn.execute(text(f"EXPLAIN (ANALYZE, BUFFERS) {sql}"), params).fetchall()
+    for (line,) in rows:
+        print("  " + line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Date range predicate benchmark")
+    parser.add_argument("--rows", type=int, default=5_000_000)
+    parser.add_argument("--doctors", type=int, default=200)
+    parser.add_argument("--days", type=int, default=7, help="Ширина окна запроса в днях")
+    args = parser.parse_args()
+
+    engine = create_engine(settings.database_url)
+    if engine.dialect.name != "postgresql":
+        sys.exit("PostgreSQL required")
+
+    end_date = clinic_today()
+    start_date = end_date - timedelta(days=args.days - 1)
+    start, end = date_range_bounds(start_date, end_date)
+
+    with engine.connect() as conn:
+        print(f">>> Seeding {args.rows} rows...")
+        conn.execute(text("""
+            CREATE TEMP TABLE bench_appointments AS
+            SELECT g AS id,
+                   (g % :doctors) + 1 AS doctor_id,
+                   now() - (random() * interval '5 years') AS date,
+                   (ARRAY['scheduled', 'done', 'paid'])[1 + g % 3] AS status,
+                   round((random() * 500)::numeric, 2) AS cost
+            FROM generate_series(1, :rows) AS g
+        """), {"rows": args.rows, "doctors": args.doctors})
+        conn.execute(text("CREATE INDEX ON bench_appointments (date)"))
+        conn.execute(text("CREATE INDEX ON bench_appointments (doctor_id, date)"))
+        conn.execute(text("ANALYZE bench_appointments"))
+
+        explain(conn, "func.date() - индекс не используется", """
+            SELECT count(*) FROM bench_appointments
+            WHERE date(date) >= :start_date AND date(date) <= :end_date
+        """, {"start_date": start_date, "end_date": end_date})
+
+        explain(conn, "[start, end) - index scan по (date)", """
+            SELECT count(*) FROM bench_appointments
+            WHERE date >= :start AND date < :end
+        """, {"start": start, "end": end})
+
+        explain(conn, "[start, end) + врач - index scan по (doctor_id, date)", """
+            SELECT count(*) FROM bench_appointments
+            WHERE doctor_id = 1 AND date >= :start AND date < :end
+        """, {"start": start, "end": end})
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+Общие фикстуры тестов: приложение на временной SQLite, чистые таблицы на каждый тест,
+пользователь запроса без JWT и счетчик SQL-запросов.
+"""
+import os
+import tempfile
+from contextlib import contextmanager
+from datetime import date
+
+# Настройки читаются при импорте app - база задается до него
+os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(tempfile.mkdtemp(prefix="clinic-tests-"), "test.db")
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+
+from app.main import app
+from app.db.session import Base, SessionLocal, engine
+from app.models.patient import Patient
+from app.models.user import User
+from app.utils.dependencies import get_current_user
+from app.utils.stats_cache import invalidate_stats_cache
+
+
+@pytest.fixture(autouse=True)
+def tables():
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    invalidate_stats_cache()
+    yield
+    app.dependency_overrides.pop(get_current_user, None)
+
+
+@pytest.fixture
+def db():
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+
+
+@pytest.fixture
+def client():
+    return TestClient(app)
+
+
+@pytest.fixture
+def make_user(db):
+    counter = {"n": 0}
+
+    def make(role: str, full_name: str = None) -> User:
+        counter["n"] += 1
+        user = User(username=f"{role}{counter['n']}", full_name=full_name or f"{role.title()} {counter['n']}",
+                    email=f"{role}{counter['n']}@clinic.test", hashed_password="x", role=role)
+        db.add(user)
+        db.commit()
+        return user
+    return make
+
+
+@pytest.fixture
+def make_patients(db):
+    def make(count: int, prefix: str = "Patient") -> list:
+        patients = [
+            Patient(full_name=f"{prefix} {i}", birth_date=date(1990, 1, 1), gender="m",
+                    phone=f"+998 90 {i:07d}", phone_digits=f"99890{i:07d}")
+            for i in range(count)
+        ]
+        db.add_all(patients)
+        db.commit()
+        return patients
+    return make
+
+
+@pytest.fixture
+def login():
+    """login(user) - дальнейшие запросы выполняются от имени user"""
+    def set_user(user: User):
+        # Отсоединенная копия: проверка авторизации не добавляет запросов к подсчитываемым
+        session = SessionLocal()
+        try:
+            current = session.get(User, user.id)
+            session.expunge(current)
+        finally:
+            session.close()
+        app.dependency_overrides[get_current_user] = lambda: current
+    return set_user
+
+
+@pytest.fixture
+def count_queries():
+    """with count_queries() as counter: ... counter["n"] - число выполненных SQL-запросов"""
+    @contextmanager
+    def counting():
+        counter = {"n": 0}
+
+        def before_cursor_execute(*args, **kwargs):
+            counter["n"] += 1
+        event.listen(engine, "before_cursor_execute", before_cursor_execute)
+        try:
+            yield counter
+        finally:
+            event.remove(engine, "before_cursor_execute", before_cursor_execute)
+    return counting
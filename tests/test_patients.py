@@ -0,0 +1,98 @@
+from datetime import date
+
+import app.routes.patients as patients_routes
+from app.models.queue import Queue
+from app.utils.patient_suggest import BYTES_PER_PATIENT, PatientSuggestIndex
+
+
+def add_to_queue(db, doctor, patients):
+    db.add_all(
+        Queue(patient_id=patient.id, doctor_id=doctor.id, ticket_number=ticket, queue_date=date.today())
+        for ticket, patient in enumerate(patients, start=1)
+    )
+    db.commit()
+
+
+def test_doctor_queue_numbers_with_skip_and_cursor(db, client, login, make_user, make_patients):
+    doctor = make_user("doctor")
+    login(make_user("reception"))
+    patients = make_patients(30)
+    # В очереди каждый третий пациент; список идет от новых к старым
+    queued = patients[::3]
+    add_to_queue(db, doctor, queued)
+    expected = {patient.id: number for number, patient in enumerate(queued, start=1)}
+
+    first = client.get(f"/patients/?doctor_id={doctor.id}&limit=10")
+    assert first.status_code == 200
+    skipped = client.get(f"/patients/?doctor_id={doctor.id}&limit=10&skip=10")
+    assert skipped.status_code == 200
+    by_cursor = client.get(f"/patients/?doctor_id={doctor.id}&limit=10&cursor={first.json()['next_cursor']}")
+    assert by_cursor.status_code == 200
+
+    assert by_cursor.json()["patients"] == skipped.json()["patients"]
+    listed = first.json()["patients"] + skipped.json()["patients"]
+    assert [p["id"] for p in listed] == [p.id for p in reversed(patients)][:20]
+    for patient in listed:
+        assert patient["queue_number"] == expected.get(patient["id"])
+
+
+def test_doctor_queue_listing_query_count_is_constant(db, client, login, make_user, make_patients, count_queries):
+    doctor = make_user("doctor")
+    login(make_user("reception"))
+    patients = make_patients(100)
+    add_to_queue(db, doctor, patients)
+    doctor_id = doctor.id
+
+    counts = []
+    for limit in (5, 50, 100):
+        with count_queries() as counter:
+            response = client.get(f"/patients/?doctor_id={doctor_id}&limit={limit}")
+        assert response.status_code == 200
+        assert len(response.json()["patients"]) == limit
+        counts.append(counter["n"])
+    assert counts[0] == counts[1] == counts[2]
+
+
+def test_suggest_falls_back_to_db_until_index_is_built(db, client, login, make_user, make_patients, monkeypatch):
+    login(make_user("reception"))
+    make_patients(5, prefix="Karimov")
+    make_patients(5, prefix="Aliyev")
+    index = PatientSuggestIndex(max_bytes=1024 * 1024)
+    monkeypatch.setattr(patients_routes, "patient_suggest_index", index)
+
+    from_db = client.get("/patients/suggest?q=karimov&limit=3")
+    index.rebuild()
+    from_index = client.get("/patients/suggest?q=karimov&limit=3")
+
+    assert from_db.status_code == from_index.status_code == 200
+    assert len(from_db.json()) == len(from_index.json()) == 3
+    assert all(patient["full_name"].startswith("Karimov") for patient in from_db.json() + from_index.json())
+
+
+def test_suggest_index_over_memory_budget_stays_disabled(db, make_patients):
+    make_patients(10)
+    index = PatientSuggestIndex(max_bytes=5 * BYTES_PER_PATIENT)
+    index.rebuild()
+
+    assert not index.ready
+    assert index.disabled_reason
+    assert index.suggest("patient", 3) is None
+    assert index.sync() == 0
+
+
+def test_suggest_sync_skips_deletes_and_reconcile_removes_them(db, make_patients, count_queries):
+    patients = make_patients(3, prefix="Karimov")
+    remaining_ids = sorted(patient.id for patient in patients[1:])
+    index = PatientSuggestIndex(max_bytes=1024 * 1024)
+    index.rebuild()
+    # Удаление в другом воркере: индекс этого воркера о нем не знает
+    db.delete(patients[0])
+    db.commit()
+
+    with count_queries() as counter:
+        index.sync()
+    assert counter["n"] == 1
+    assert len(index) == 3
+
+    assert index.reconcile() == 1
+    assert sorted(patient["id"] for patient in index.suggest("karimov", 10)) == remaining_ids
@@ -0,0 +1,75 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+
+from app.models.queue import Queue
+from app.utils.queue_cleanup import run_queue_cleanup
+from app.utils.queue_engine import queue_engine, verify_queue_engine
+from app.utils.queue_events import queue_broker
+
+PARALLEL_ADDS = 300
+
+
+def test_parallel_adds_get_gapless_unique_tickets(db, client, login, make_user, make_patients):
+    doctor_id = make_user("doctor").id
+    login(make_user("reception"))
+    patient_ids = [patient.id for patient in make_patients(PARALLEL_ADDS)]
+
+    def add(patient_id):
+        return client.post("/queue/", json={"patient_id": patient_id, "doctor_id": doctor_id})
+
+    with ThreadPoolExecutor(max_workers=32) as pool:
+        responses = list(pool.map(add, patient_ids))
+
+    assert [response.status_code for response in responses] == [200] * PARALLEL_ADDS
+    tickets = sorted(
+        ticket for (ticket,) in db.query(Queue.ticket_number).filter(
+            Queue.doctor_id == doctor_id, Queue.queue_date == date.today()
+        )
+    )
+    assert tickets == list(range(1, PARALLEL_ADDS + 1))
+
+
+def test_verify_rebuilds_engine_after_missed_event(db, make_user, make_patients):
+    doctor_id = make_user("doctor").id
+    patient_id = make_patients(1)[0].id
+    queue_engine.rebuild()
+    # Запись другого воркера, событие которой не дошло
+    db.add(Queue(patient_id=patient_id, doctor_id=doctor_id, ticket_number=1, queue_date=date.today()))
+    db.commit()
+    assert queue_engine.doctor_queue(doctor_id) == []
+
+    verify_queue_engine()
+
+    assert [entry["patient_id"] for entry in queue_engine.doctor_queue(doctor_id)] == [patient_id]
+
+
+def test_listen_reconnect_sends_resync_to_subscribers():
+    async def scenario():
+        subscription = queue_broker.subscribe(7)
+        try:
+            await asyncio.get_running_loop().run_in_executor(None, queue_broker.reconnected)
+            return await asyncio.wait_for(subscription.get(), timeout=5)
+        finally:
+            queue_broker.unsubscribe(subscription)
+
+    assert asyncio.run(scenario()) == {"type": "resync", "doctor_id": 7}
+
+
+def test_cleanup_metrics_record_last_run(db, client, login, make_user, make_patients):
+    doctor_id = make_user("doctor").id
+    patients = make_patients(3)
+    db.add_all(
+        Queue(patient_id=patient.id, doctor_id=doctor_id, ticket_number=ticket, queue_date=date.today() - timedelta(days=1))
+        for ticket, patient in enumerate(patients, start=1)
+    )
+    db.commit()
+
+    run_queue_cleanup(batch_size=2, pause_seconds=0)
+    login(make_user("admin"))
+    response = client.get("/queue/cleanup/metrics")
+
+    assert response.status_code == 200
+    last_run = response.json()["last_run"]
+    assert (last_run["archived"], last_run["batches"], last_run["error"]) == (3, 2, None)
+    assert last_run["seconds"] >= 0
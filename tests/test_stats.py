@@ -0,0 +1,82 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from app.models.appointment import Appointment
+import app.utils.stats_snapshot as stats_snapshot_module
+from app.utils.stats_aggregation import rollup_slice
+from app.utils.stats_rollup import rebuild_rollup, rollup_remove_patient
+from app.utils.stats_snapshot import StatsSnapshot
+
+
+def seed_doctors(db, make_user, patients, count):
+    now = datetime.now(timezone.utc)
+    for _ in range(count):
+        doctor = make_user("doctor")
+        db.add_all(
+            Appointment(doctor_id=doctor.id, patient_id=patient.id, date=now - timedelta(days=day),
+                        status=status, cost=150)
+            for day, (patient, status) in enumerate(zip(patients, ("scheduled", "done", "paid")))
+        )
+    db.commit()
+    rebuild_rollup(db)
+    db.commit()
+
+
+@pytest.mark.parametrize("url", ["/stats/doctors", "/stats/financial/doctors"])
+def test_doctor_stats_query_count_does_not_grow_with_doctors(db, client, login, make_user, make_patients,
+                                                             count_queries, url):
+    login(make_user("admin"))
+    patients = make_patients(3)
+
+    # N врачей, затем 2N
+    counts, seeded = [], 0
+    for doctors in (5, 10):
+        seed_doctors(db, make_user, patients, doctors - seeded)
+        seeded = doctors
+        with count_queries() as counter:
+            response = client.get(url)
+        assert response.status_code == 200
+        assert len(response.json()) == doctors
+        counts.append(counter["n"])
+    assert counts[0] == counts[1]
+
+
+def test_snapshot_loaded_in_batches_matches_rollup(db, make_user, make_patients, monkeypatch):
+    seed_doctors(db, make_user, make_patients(3), 4)
+    monkeypatch.setattr(stats_snapshot_module, "LOAD_BATCH_SIZE", 5)
+    snapshot = StatsSnapshot(max_bytes=1024 * 1024, max_staleness_seconds=60, reconcile_seconds=3600)
+    snapshot.refresh(db)
+
+    columns = snapshot.get()
+    assert len(columns.ids) == 12
+    for group_by in ("doctor", "status", "day"):
+        assert snapshot.slice(columns, None, None, None, None, group_by) == \
+            rollup_slice(db, None, None, None, None, group_by)
+
+
+def test_snapshot_over_memory_budget_is_disabled(db, make_user, make_patients):
+    seed_doctors(db, make_user, make_patients(3), 4)
+    snapshot = StatsSnapshot(max_bytes=10 * stats_snapshot_module.BYTES_PER_ROW, max_staleness_seconds=60,
+                             reconcile_seconds=3600)
+    snapshot.refresh(db)
+
+    assert snapshot.get() is None
+    assert snapshot.metrics()["disabled_reason"]
+
+
+def test_snapshot_drops_appointments_of_deleted_patient(db, make_user, make_patients, monkeypatch):
+    patients = make_patients(3)
+    seed_doctors(db, make_user, patients, 4)
+    snapshot = StatsSnapshot(max_bytes=1024 * 1024, max_staleness_seconds=60, reconcile_seconds=3600)
+    monkeypatch.setattr(stats_snapshot_module, "stats_snapshot", snapshot)
+    snapshot.refresh(db)
+
+    rollup_remove_patient(db, patients[0])
+    db.delete(patients[0])
+    db.commit()
+    snapshot.refresh(db)
+
+    columns = snapshot.get()
+    assert len(columns.ids) == 8
+    assert snapshot.slice(columns, None, None, None, None, "doctor") == rollup_slice(db, None, None, None, None, "doctor")